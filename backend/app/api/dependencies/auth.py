@@ -3,10 +3,28 @@
 This file exposes small helper functions (dependencies) that FastAPI can run
 before your endpoint handler. They validate the request and provide useful
 values, like the authenticated ``user_id``.
+
+Tokens are checked in-process by ``app.core.security`` (signature + expiry),
+so authenticating a request does not require a call to Supabase.
 """
 from fastapi import Header, HTTPException
 
-from app.utils.supabase import get_supabase
+from app.core.profiling import timed
+from app.core.security import TokenVerificationError, verify_access_token
+
+
+async def user_id_from_token(token: str) -> str:
+    """Verify a raw JWT and return the user id, or raise HTTP 401.
+
+    Shared by every route that authenticates a caller, so all of them use the
+    same verification path and the same verified-token cache.
+    """
+    try:
+        # Counted as "auth" in profiled requests' Server-Timing
+        with timed("auth"):
+            return await verify_access_token(token)
+    except TokenVerificationError:
+        raise HTTPException(status_code=401, detail="Invalid or expired token") from None
 
 
 async def require_user_id(authorization: str | None = Header(default=None)) -> str:
@@ -21,23 +39,5 @@ async def require_user_id(authorization: str | None = Header(default=None)) -> s
         raise HTTPException(status_code=401, detail="Not authenticated")
     # 2) Extract the token (the string after "Bearer ")
     token = authorization.split(" ", 1)[1]
-
-    # 3) Get a Supabase client
-    supabase = get_supabase()
-    if supabase is None:
-        raise HTTPException(status_code=500, detail="Supabase not configured")
-
-    try:
-        # 4) Ask Supabase to decode the JWT and return the user object
-        res = supabase.auth.get_user(jwt=token)  # type: ignore[call-arg]
-        user = getattr(res, "user", None)
-        user_id = getattr(user, "id", None)
-        # 5) Validate we received a user id
-        if not user_id:
-            raise ValueError("Missing user id")
-        # 6) Return the user id as a string
-        return str(user_id)
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-
-
+    # 3) Verify it locally (cached after the first check) and return the id
+    return await user_id_from_token(token)
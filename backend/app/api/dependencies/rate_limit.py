@@ -0,0 +1,32 @@
+"""Rate-limit check for expensive routes (HTTP 429 with ``Retry-After``).
+
+Routes call ``enforce_rate_limit`` once they know who is asking and how many
+days the request covers, and before doing any expensive work:
+
+    await enforce_rate_limit("export", user_id, days=(end_dt - start_dt).days)
+
+The buckets and their settings live in ``app.services.ratelimit``.
+"""
+import math
+
+from fastapi import HTTPException
+
+from app.services.ratelimit import RateLimitedError, get_rate_limiter
+
+
+async def enforce_rate_limit(group: str, user_id: str, days: float = 1.0) -> None:
+    """Spend the request's tokens, or raise HTTP 429 telling the client when to retry."""
+    limiter = get_rate_limiter()
+    if limiter is None:
+        return
+    try:
+        await limiter.admit(group, user_id, days)
+    except RateLimitedError as exc:
+        # Retry-After is whole seconds; round up so an early retry is not rejected again
+        retry_after = max(1, math.ceil(exc.retry_after))
+        scope = "your" if exc.scope == "user" else "the shared"
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many {group} requests ({scope} limit). Retry in {retry_after} s.",
+            headers={"Retry-After": str(retry_after)},
+        ) from exc
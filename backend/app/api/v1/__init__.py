@@ -1,13 +1,24 @@
 # app/api/v1/__init__.py
 from fastapi import APIRouter
+
+from app.api.v1.routes.analytics import router as analytics_router
+from app.api.v1.routes.export import router as export_router
 from app.api.v1.routes.health import router as health_router
-from app.api.v1.routes.ping_db import router as ping_db_router
 from app.api.v1.routes.insights import router as insights_router
-from app.api.v1.routes.export import router as export_router
+from app.api.v1.routes.inventory import router as inventory_router
+from app.api.v1.routes.ping_db import router as ping_db_router
+from app.api.v1.routes.schedules import router as schedules_router
+from app.api.v1.routes.sync import router as sync_router
+from app.api.v1.routes.tracking import router as tracking_router
 
 api_router = APIRouter()
 api_router.include_router(health_router, tags=["health"])
 api_router.include_router(ping_db_router, tags=["debug"])
 api_router.include_router(insights_router, tags=["insights"])
 api_router.include_router(export_router, tags=["export"])
+api_router.include_router(tracking_router, tags=["tracking"])
+api_router.include_router(sync_router, tags=["sync"])
+api_router.include_router(analytics_router, tags=["analytics"])
+api_router.include_router(inventory_router, tags=["inventory"])
+api_router.include_router(schedules_router, tags=["schedules"])
 
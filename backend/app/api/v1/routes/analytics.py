@@ -0,0 +1,66 @@
+"""Tracking analytics endpoint.
+
+``GET /analytics?start=&end=`` returns trends for every tracked metric
+(including blood pressure parsed from ``bp_am``/``bp_pm``) and, per
+peptide, how each metric compares on the days it was logged vs the days it
+was not. The math lives in ``app.services.analytics``.
+"""
+from datetime import UTC, datetime, timedelta
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from app.api.dependencies.auth import require_user_id
+from app.api.dependencies.rate_limit import enforce_rate_limit
+from app.core.config import get_settings
+from app.core.responses import FastJSONResponse
+from app.services.analytics import AnalyticsService
+from app.services.postgrest import PostgrestError
+from app.services.repository import get_repositories
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+
+def _parse_time(value: str) -> datetime:
+    dt = datetime.fromisoformat(value)
+    return dt if dt.tzinfo is not None else dt.replace(tzinfo=UTC)
+
+
+@router.get("")
+async def tracking_analytics(
+    user_id: str = Depends(require_user_id),
+    start: str | None = Query(default=None, description="ISO date or datetime (default: 90 days ago)"),
+    end: str | None = Query(default=None, description="ISO date or datetime (default: now)"),
+    window: int = Query(default=7, ge=1, le=90, description="Rolling mean window in days"),
+    series: bool = Query(default=True, description="Include per-day series for charts"),
+):
+    # 1) Get the async data-access layer
+    repos = get_repositories()
+    if repos is None:
+        raise HTTPException(status_code=500, detail="Supabase not configured")
+    settings = get_settings()
+
+    # 2) Parse the range (a plain end date includes that whole day)
+    try:
+        end_dt = _parse_time(end) if end else datetime.now(UTC)
+        if end and len(end) == 10:
+            end_dt += timedelta(days=1, microseconds=-1)
+        start_dt = _parse_time(start) if start else end_dt - timedelta(days=90)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid start/end format. Use ISO 8601.") from None
+    if start_dt > end_dt or end_dt - start_dt > timedelta(days=settings.ANALYTICS_MAX_DAYS):
+        raise HTTPException(
+            status_code=400, detail=f"start must be before end, at most {settings.ANALYTICS_MAX_DAYS} days apart"
+        )
+
+    # 3) Admission by range length (429 when over the limit)
+    await enforce_rate_limit("analytics", user_id, days=(end_dt - start_dt).days)
+
+    # 4) Load the user's cached columns (fetching only new rows) and analyse
+    try:
+        result = await AnalyticsService(repos, page_size=settings.EXPORT_PAGE_SIZE).analyze(
+            user_id, start_dt, end_dt, window=window, series=series
+        )
+    except PostgrestError as exc:
+        raise HTTPException(status_code=500, detail=f"Failed to read tracking: {exc.message}") from exc
+    # NumPy arrays go straight to orjson/MessagePack (no jsonable_encoder pass)
+    return FastJSONResponse(result)
@@ -2,61 +2,80 @@
 
 Exports the user's daily tracking data to CSV over a date range. The client
 must authenticate, and we pull only rows for that user.
+
+Rows are read in keyset-paginated pages and encoded as they arrive, so the
+first bytes go out immediately and memory does not grow with the range.
+
+``/export/csv`` is the original CSV download. ``/export`` picks the format
+from ``?format=`` or the ``Accept`` header (CSV, NDJSON, Arrow IPC, Parquet)
+and can gzip any of them with ``?compress=gzip``. Both share the ``export``
+rate limit, where a request costs more the longer its date range. If the
+database fails once the download has started, the connection is dropped,
+so the client sees a failed download rather than a file missing rows.
 """
+import logging
+from collections.abc import AsyncIterator
 from datetime import datetime, timedelta
-from io import StringIO
-import csv
-from typing import Any, Dict, List, Optional
+from typing import Any, Literal
 
-from fastapi import APIRouter, Depends, HTTPException, Header, Query
-from app.api.dependencies.auth import require_user_id
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
 from fastapi.responses import StreamingResponse
 
-from app.utils.supabase import get_supabase
-
+from app.api.dependencies.auth import require_user_id
+from app.api.dependencies.rate_limit import enforce_rate_limit
+from app.core.config import get_settings
+from app.core.metrics import EXPORT_BYTES, EXPORT_ROWS
+from app.services.export_formats import (
+    ExportFormatError,
+    encode_stream,
+    gzip_stream,
+    make_encoder,
+    negotiate_format,
+)
+from app.services.postgrest import PostgrestError
+from app.services.repository import get_repositories
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/export", tags=["export"])
 
-
-async def resolve_user_id(
-    authorization: Optional[str] = Header(default=None), token: Optional[str] = Query(default=None)
-) -> str:
-    """Resolve a user id from either the Authorization header or ``?token=``.
-
-    We support ``?token=`` for convenience on mobile's "open URL" flows where
-    adding custom headers can be tricky.
+# Columns included in exports (also the CSV header order)
+EXPORT_COLUMNS = (
+    "created_at",
+    "weight_lbs",
+    "waist_in",
+    "bp_am",
+    "bp_pm",
+    "body_fat_pct",
+    "muscle_mass_pct",
+    "resting_hr_bpm",
+    "energy",
+    "appetite",
+    "performance",
+    "peptide1_id",
+    "peptide2_id",
+    "peptide3_id",
+)
+
+
+def _span_days(start: datetime, end: datetime) -> int:
+    """Days between ``start`` and ``end``, even if only one of them has an offset."""
+    if (start.tzinfo is None) != (end.tzinfo is None):
+        start, end = start.replace(tzinfo=None), end.replace(tzinfo=None)
+    return max(0, (end - start).days)
+
+
+async def _open_export(
+    user_id: str, start: str | None, end: str | None
+) -> tuple[datetime, datetime, list[dict[str, Any]], AsyncIterator[list[dict[str, Any]]]]:
+    """Parse the date window, check the rate limit and start reading the user's rows.
+
+    The first page is fetched before any response is sent, so a database
+    error still becomes a proper HTTP 500.
     """
-    supabase = get_supabase()
-    if supabase is None:
-        raise HTTPException(status_code=500, detail="Supabase not configured")
-
-    bearer = None
-    if token:
-        bearer = token
-    elif authorization and authorization.lower().startswith("bearer "):
-        bearer = authorization.split(" ", 1)[1]
-
-    if not bearer:
-        raise HTTPException(status_code=401, detail="Missing token")
-
-    try:
-        user = supabase.auth.get_user(bearer).user  # type: ignore[attr-defined]
-        if not user or not getattr(user, "id", None):
-            raise ValueError("No user")
-        return str(user.id)
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-
-
-@router.get("/csv")
-async def export_csv(
-    user_id: str = Depends(require_user_id),
-    start: Optional[str] = Query(default=None, description="ISO date or datetime"),
-    end: Optional[str] = Query(default=None, description="ISO date or datetime"),
-):
-    # 1) Get Supabase client
-    supabase = get_supabase()
-    if supabase is None:
+    # 1) Get the async data-access layer
+    repos = get_repositories()
+    if repos is None:
         raise HTTPException(status_code=500, detail="Supabase not configured")
 
     # 2) Parse date range (default last 30 days)
@@ -70,55 +89,109 @@ async def export_csv(
         else:
             end_dt = datetime.utcnow()
     except Exception:
-        raise HTTPException(status_code=400, detail="Invalid start/end format. Use ISO 8601.")
-
-    # 3) Query user's daily_tracking rows within the date window
-    res = (
-        supabase.table("daily_tracking")
-        .select(
-            "created_at, weight_lbs, waist_in, bp_am, bp_pm, body_fat_pct, muscle_mass_pct, resting_hr_bpm, energy, appetite, performance, peptide1_id, peptide2_id, peptide3_id"
-        )
-        .gte("created_at", start_dt.isoformat())
-        .lte("created_at", end_dt.isoformat())
-        .eq("user_id", user_id)
-        .order("created_at", desc=False)
-        .execute()
+        raise HTTPException(status_code=400, detail="Invalid start/end format. Use ISO 8601.") from None
+
+    # 3) Admission: longer ranges cost more tokens (429 when over the limit)
+    await enforce_rate_limit("export", user_id, days=_span_days(start_dt, end_dt))
+
+    # 4) Start a keyset-paginated read and fetch the first page now
+    pages = repos.tracking.iter_pages(
+        user_id, start_dt, end_dt, columns=EXPORT_COLUMNS, page_size=get_settings().EXPORT_PAGE_SIZE
     )
-    if getattr(res, "error", None):
-        raise HTTPException(status_code=500, detail=f"Failed to read tracking: {res.error}")
-    rows: List[Dict[str, Any]] = res.data or []  # type: ignore[attr-defined]
-
-    # 4) Prepare CSV from the rows
-    headers = [
-        "created_at",
-        "weight_lbs",
-        "waist_in",
-        "bp_am",
-        "bp_pm",
-        "body_fat_pct",
-        "muscle_mass_pct",
-        "resting_hr_bpm",
-        "energy",
-        "appetite",
-        "performance",
-        "peptide1_id",
-        "peptide2_id",
-        "peptide3_id",
-    ]
-    buf = StringIO()
-    writer = csv.DictWriter(buf, fieldnames=headers)
-    writer.writeheader()
-    for r in rows:
-        writer.writerow({k: r.get(k, "") for k in headers})
-
-    # 5) Name the file using the date window
+    try:
+        first_page = await anext(pages, [])
+    except PostgrestError as exc:
+        raise HTTPException(status_code=500, detail=f"Failed to read tracking: {exc.message}") from exc
+    return start_dt, end_dt, first_page, pages  # type: ignore[return-value]
+
+
+async def _logged(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Pass chunks through; a mid-stream DB error is logged and aborts the download."""
+    try:
+        async for chunk in chunks:
+            yield chunk
+    except PostgrestError as exc:
+        # Headers are already sent, so we cannot switch to an error status.
+        # Re-raising makes the server drop the connection before the final
+        # chunk: the client sees a failed download, not a file missing rows
+        # (or an Arrow/Parquet file without its footer)
+        logger.error("Export aborted mid-stream: %s", exc.message)
+        raise
+
+
+async def _count_rows(
+    fmt: str, first_page: list[dict[str, Any]], pages: AsyncIterator[list[dict[str, Any]]]
+) -> AsyncIterator[list[dict[str, Any]]]:
+    """Pass later pages through, counting every row in ``export_rows_total``."""
+    counter = EXPORT_ROWS.labels(fmt)
+    counter.inc(len(first_page))
+    async for page in pages:
+        counter.inc(len(page))
+        yield page
+
+
+async def _count_bytes(chunks: AsyncIterator[bytes], fmt: str, compression: str) -> AsyncIterator[bytes]:
+    """Pass chunks through, counting response bytes in ``export_bytes_total``."""
+    counter = EXPORT_BYTES.labels(fmt, compression)
+    async for chunk in chunks:
+        counter.inc(len(chunk))
+        yield chunk
+
+
+@router.get("/csv")
+async def export_csv(
+    user_id: str = Depends(require_user_id),
+    start: str | None = Query(default=None, description="ISO date or datetime"),
+    end: str | None = Query(default=None, description="ISO date or datetime"),
+):
+    # 1) Validate the window and start reading pages
+    start_dt, end_dt, first_page, pages = await _open_export(user_id, start, end)
+    # 2) Name the file using the date window
     filename = f"daily_tracking_{start_dt.strftime('%Y%m%d')}_{end_dt.strftime('%Y%m%d')}.csv"
-    buf.seek(0)
-    # 6) Stream the CSV back to the client as a file download
+    # 3) Stream the CSV back page by page as a file download
+    encoder = make_encoder("csv", EXPORT_COLUMNS)
+    chunks = _logged(encode_stream(encoder, first_page, _count_rows("csv", first_page, pages)))
     return StreamingResponse(
-        iter([buf.getvalue()]),
-        media_type="text/csv",
+        _count_bytes(chunks, "csv", "none"),
+        media_type=encoder.media_type,
         headers={"Content-Disposition": f"attachment; filename={filename}"},
     )
 
 
+@router.get("")
+async def export_data(
+    user_id: str = Depends(require_user_id),
+    start: str | None = Query(default=None, description="ISO date or datetime"),
+    end: str | None = Query(default=None, description="ISO date or datetime"),
+    format: Literal["csv", "ndjson", "arrow", "parquet"] | None = Query(
+        default=None, description="Overrides the Accept header"
+    ),
+    compress: Literal["gzip"] | None = Query(default=None, description="Wrap the file in gzip"),
+    accept: str | None = Header(default=None),
+):
+    """Export tracking rows in a negotiated format, optionally gzip-compressed."""
+    # 1) Pick the format: explicit ?format= wins, then Accept, then CSV
+    fmt = format or negotiate_format(accept)
+    try:
+        encoder = make_encoder(fmt, EXPORT_COLUMNS)
+    except ExportFormatError as exc:
+        raise HTTPException(status_code=501, detail=str(exc)) from exc
+
+    # 2) Validate the window and start reading pages
+    start_dt, end_dt, first_page, pages = await _open_export(user_id, start, end)
+
+    # 3) Build the byte stream (and gzip it if asked)
+    chunks = _logged(encode_stream(encoder, first_page, _count_rows(fmt, first_page, pages)))
+    filename = f"daily_tracking_{start_dt.strftime('%Y%m%d')}_{end_dt.strftime('%Y%m%d')}.{encoder.extension}"
+    media_type = encoder.media_type
+    if compress == "gzip":
+        chunks = gzip_stream(chunks)
+        filename += ".gz"
+        media_type = "application/gzip"
+
+    # 4) Stream the file back as a download (rows/bytes go to /metrics)
+    return StreamingResponse(
+        _count_bytes(chunks, fmt, compress or "none"),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
@@ -0,0 +1,30 @@
+"""Inventory endpoints.
+
+``GET /inventory/forecast`` lists the caller's peptides with when each one
+runs out at the current pace and how much will expire unused. Results are
+precomputed (``app.services.forecast``) and only recomputed for this user
+when stale.
+"""
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.api.dependencies.auth import require_user_id
+from app.services.forecast import forecast_for_user
+from app.services.postgrest import PostgrestError
+from app.services.repository import get_repositories
+
+router = APIRouter(prefix="/inventory", tags=["inventory"])
+
+
+@router.get("/forecast")
+async def inventory_forecast(user_id: str = Depends(require_user_id)) -> dict[str, Any]:
+    # 1) Get the async data-access layer
+    repos = get_repositories()
+    if repos is None:
+        raise HTTPException(status_code=500, detail="Supabase not configured")
+    # 2) Stored forecasts (recomputed for this user only if out of date)
+    try:
+        return {"peptides": await forecast_for_user(repos, user_id)}
+    except PostgrestError as exc:
+        raise HTTPException(status_code=500, detail=f"Failed to read inventory: {exc.message}") from exc
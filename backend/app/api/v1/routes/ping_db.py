@@ -1,22 +1,35 @@
 """Simple database sanity check route.
 
 We read a single row from an example table to verify database access works.
-Change the table name if your database is empty.
+Change the table name if your database is empty. The check gets at most
+``PING_DB_TIMEOUT_SECONDS``: a stalled database answers 504 quickly instead
+of holding the request open.
 """
 from fastapi import APIRouter, HTTPException
-from app.utils.supabase import get_supabase
+
+from app.core.config import get_settings
+from app.core.deadlines import deadline_scope
+from app.services.postgrest import PostgrestError
+from app.services.repository import get_repositories
 
 router = APIRouter()
 
 @router.get("/ping-db")
-def ping_db():
-    # 1) Create a Supabase client
-    sb = get_supabase()
+async def ping_db():
+    # 1) Get the async data-access layer
+    repos = get_repositories()
+    if repos is None:
+        raise HTTPException(status_code=500, detail="Supabase not configured")
     try:
-        # 2) Try reading 1 profile row just to sanity check (adjust table if empty)
-        data = sb.table("profiles").select("*").limit(1).execute()
+        # 2) Try reading 1 profile row just to sanity check (adjust table if empty),
+        #    within the ping's own short time limit
+        with deadline_scope(get_settings().PING_DB_TIMEOUT_SECONDS):
+            rows = await repos.profiles.sample(limit=1)
         # 3) Return a small summary
-        return {"ok": True, "rows": len(data.data), "sample": data.data}
+        return {"ok": True, "rows": len(rows), "sample": rows}
+    except PostgrestError as e:
+        # 4) Unavailable (breaker open, timeout) keeps its 503/504; anything else is a 500
+        status = e.status_code if e.status_code in (503, 504) else 500
+        raise HTTPException(status_code=status, detail=e.message) from e
     except Exception as e:
-        # 4) Bubble up any error as HTTP 500
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail=str(e)) from e
@@ -0,0 +1,97 @@
+"""Dose schedule endpoints.
+
+Schedules are recurrence rules (see ``app.schemas.schedules``); the backend
+expands them into dose times on demand (``app.services.schedules``).
+
+- ``GET /schedules``: the caller's active schedules
+- ``POST /schedules``: add one
+- ``DELETE /schedules/{id}``: switch one off
+- ``GET /schedules/due?start=&end=``: the caller's doses in a window
+  (default: the next 24 hours)
+"""
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from app.api.dependencies.auth import require_user_id
+from app.core.config import get_settings
+from app.schemas.schedules import ScheduleIn
+from app.services.postgrest import PostgrestError
+from app.services.repository import get_repositories
+from app.services.schedules import ScheduleService
+
+router = APIRouter(prefix="/schedules", tags=["schedules"])
+
+
+def _parse_time(value: str) -> datetime:
+    dt = datetime.fromisoformat(value)
+    return dt if dt.tzinfo is not None else dt.replace(tzinfo=UTC)
+
+
+def _service() -> ScheduleService:
+    repos = get_repositories()
+    if repos is None:
+        raise HTTPException(status_code=500, detail="Supabase not configured")
+    return ScheduleService(repos)
+
+
+@router.get("")
+async def list_schedules(user_id: str = Depends(require_user_id)) -> dict[str, Any]:
+    service = _service()
+    try:
+        return {"schedules": await service.repos.schedules.list_for_user(user_id)}
+    except PostgrestError as exc:
+        raise HTTPException(status_code=500, detail=f"Failed to read schedules: {exc.message}") from exc
+
+
+@router.post("", status_code=201)
+async def create_schedule(schedule: ScheduleIn, user_id: str = Depends(require_user_id)) -> dict[str, Any]:
+    service = _service()
+    try:
+        # 1) Keep rules per user bounded (each one is expanded on every query)
+        existing = await service.repos.schedules.list_for_user(user_id)
+        if len(existing) >= get_settings().SCHEDULE_MAX_PER_USER:
+            raise HTTPException(status_code=409, detail="Too many active schedules; remove one first")
+        # 2) Store it (the reminder worker picks it up on its next window)
+        return await service.create(schedule.to_row(user_id))  # type: ignore[return-value]
+    except PostgrestError as exc:
+        raise HTTPException(status_code=500, detail=f"Failed to save schedule: {exc.message}") from exc
+
+
+@router.delete("/{schedule_id}", status_code=204)
+async def delete_schedule(schedule_id: str, user_id: str = Depends(require_user_id)) -> None:
+    service = _service()
+    try:
+        found = await service.deactivate(user_id, schedule_id)
+    except PostgrestError as exc:
+        raise HTTPException(status_code=500, detail=f"Failed to remove schedule: {exc.message}") from exc
+    if not found:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+
+
+@router.get("/due")
+async def due_doses(
+    user_id: str = Depends(require_user_id),
+    start: str | None = Query(default=None, description="ISO datetime (default: now)"),
+    end: str | None = Query(default=None, description="ISO datetime (default: start + 24h)"),
+) -> dict[str, Any]:
+    service = _service()
+    settings = get_settings()
+    # 1) Parse and bound the window
+    try:
+        start_dt = _parse_time(start) if start else datetime.now(UTC)
+        end_dt = _parse_time(end) if end else start_dt + timedelta(days=1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid start/end format. Use ISO 8601.") from None
+    if start_dt > end_dt or end_dt - start_dt > timedelta(days=settings.SCHEDULE_MAX_WINDOW_DAYS):
+        raise HTTPException(
+            status_code=400,
+            detail=f"start must be before end, at most {settings.SCHEDULE_MAX_WINDOW_DAYS} days apart",
+        )
+    # 2) Expand the user's rules over just this window
+    try:
+        doses = await service.due_for_user(user_id, start_dt, end_dt)
+    except PostgrestError as exc:
+        raise HTTPException(status_code=500, detail=f"Failed to read schedules: {exc.message}") from exc
+    return {"start": start_dt.isoformat(), "end": end_dt.isoformat(), "doses": doses}
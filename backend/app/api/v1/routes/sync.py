@@ -0,0 +1,56 @@
+"""Delta sync endpoint for the mobile app.
+
+``GET /sync`` returns the caller's tracking entries, inventory and insights
+that changed since ``?cursor=`` (all of them without a cursor), plus the
+cursor for next time. Send the previous response's ``ETag`` in
+``If-None-Match``: when nothing changed the answer is an empty
+``304 Not Modified``. See ``app.services.sync`` for the details.
+"""
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import Response
+
+from app.api.dependencies.auth import require_user_id
+from app.core.config import get_settings
+from app.core.responses import FastJSONResponse
+from app.services.postgrest import PostgrestError
+from app.services.repository import get_repositories
+from app.services.sync import SyncCursorError, changes_since
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+
+@router.get("")
+async def sync(
+    user_id: str = Depends(require_user_id),
+    cursor: str | None = Query(default=None, description="Cursor from the previous sync; omit for a full sync"),
+    limit: int | None = Query(default=None, ge=1, le=5000, description="Max rows per table"),
+    if_none_match: str | None = Header(default=None),
+):
+    # 1) Get the async data-access layer
+    repos = get_repositories()
+    if repos is None:
+        raise HTTPException(status_code=500, detail="Supabase not configured")
+    settings = get_settings()
+
+    # 2) Read what changed after the cursor (a few small keyset queries)
+    try:
+        result = await changes_since(
+            repos,
+            user_id,
+            cursor,
+            limit=limit or settings.SYNC_PAGE_SIZE,
+            settle_seconds=settings.SYNC_SETTLE_SECONDS,
+        )
+    except SyncCursorError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except PostgrestError as exc:
+        raise HTTPException(status_code=500, detail=f"Failed to read changes: {exc.message}") from exc
+
+    # 3) Same answer as last time -> 304 with no body. Weak comparison: a
+    #    compressed or MessagePack copy carries the same tag as W/"..."
+    etag = result.pop("etag")
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(result, headers=headers)
@@ -0,0 +1,80 @@
+"""Tracking write endpoints.
+
+``POST /tracking/bulk`` ingests many ``daily_tracking`` rows in one request:
+an app coming back online with a queue of entries, or an import from another
+app. Send NDJSON (``Content-Type: application/x-ndjson``, one row per line)
+or a JSON array (``application/json``). The body is processed as it
+streams in, in chunks, so large uploads use little memory.
+
+Rows are idempotent: each one's id is derived from the user and its
+``idempotency_key`` (or ``created_at``), so retrying a request never creates
+duplicates. The response lists a result per row.
+"""
+import logging
+from typing import Any, Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+
+from app.api.dependencies.auth import require_user_id
+from app.core.config import get_settings
+from app.services.ingest import IngestFormatError, ingest_tracking, iter_json_array, iter_ndjson
+from app.services.postgrest import PostgrestError
+from app.services.repository import get_repositories
+from app.services.rollups import RollupService
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/tracking", tags=["tracking"])
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/json-seq")
+
+
+@router.post("/bulk")
+async def bulk_ingest(
+    request: Request,
+    user_id: str = Depends(require_user_id),
+    results: Literal["all", "errors"] = Query(
+        default="all", description="'errors' lists only rows that were not stored (smaller response)"
+    ),
+) -> dict[str, Any]:
+    # 1) Get the async data-access layer
+    repos = get_repositories()
+    if repos is None:
+        raise HTTPException(status_code=500, detail="Supabase not configured")
+    settings = get_settings()
+
+    # 2) Pick a streaming parser from the Content-Type
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in NDJSON_TYPES:
+        items = iter_ndjson(request.stream(), settings.INGEST_MAX_ROW_BYTES)
+    elif content_type == "application/json":
+        items = iter_json_array(request.stream(), settings.INGEST_MAX_ROW_BYTES)
+    else:
+        raise HTTPException(status_code=415, detail="Send application/x-ndjson or a JSON array")
+
+    # 3) Validate and upsert chunk by chunk while the body streams in
+    try:
+        report = await ingest_tracking(
+            repos,
+            user_id,
+            items,
+            chunk_size=settings.INGEST_CHUNK_SIZE,
+            max_rows=settings.INGEST_MAX_ROWS,
+            include_ok=results == "all",
+        )
+    except IngestFormatError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    # 4) Fold the new rows into the insight rollups now (best effort: the
+    #    next insights request would do it anyway)
+    if report.counts["ok"]:
+        try:
+            await RollupService(
+                repos,
+                page_size=settings.EXPORT_PAGE_SIZE,
+                rebuild_seconds=settings.ROLLUP_REBUILD_SECONDS,
+                settle_seconds=settings.SYNC_SETTLE_SECONDS,
+            ).refresh(user_id)
+        except PostgrestError as exc:
+            logger.warning("Rollup refresh after ingest failed: %s", exc.message)
+    return report.to_dict()
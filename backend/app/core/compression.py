@@ -0,0 +1,194 @@
+"""Negotiated response compression (brotli or gzip), streamed bodies included.
+
+Phones on cellular connections pay for every byte, and JSON/CSV compress
+very well (typically 5-10x). ``CompressionMiddleware`` compresses a response
+when all of these hold:
+
+- the client accepts ``br`` or ``gzip`` (``Accept-Encoding``); brotli is
+  preferred when the optional ``brotli`` package is installed
+- the body is at least ``minimum_size`` bytes (tiny bodies get bigger)
+- it is not already compressed (``Content-Encoding`` set, gzip/zip/Parquet
+  downloads, images, ...) and not marked ``Cache-Control: no-transform``
+
+If you're new:
+- Streamed responses (e.g. the CSV export) are compressed chunk by chunk and
+  each chunk is flushed, so the client still receives data as it is
+  produced instead of after the whole file.
+- Only the first ``minimum_size`` bytes are held back to decide; a streamed
+  body shorter than that is sent unchanged.
+- A compressed body is no longer byte-identical, so a strong ``ETag`` is
+  turned into a weak one (``W/"..."``); ``If-None-Match`` still matches.
+"""
+import zlib
+from typing import Any
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.responses import header_qualities
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+# Media types whose bodies are compressed already (or must not be delayed)
+SKIP_MEDIA_TYPES = {
+    "application/gzip",
+    "application/x-gzip",
+    "application/zip",
+    "application/zstd",
+    "application/vnd.apache.parquet",
+    "application/vnd.apache.arrow.stream",  # IPC batches are zstd-compressed
+    "application/octet-stream",
+    "text/event-stream",
+}
+SKIP_MEDIA_PREFIXES = ("image/", "video/", "audio/", "font/")
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    """Return ``"br"``, ``"gzip"`` or ``None`` for an ``Accept-Encoding`` header."""
+    qualities = header_qualities(accept_encoding)
+    wildcard = qualities.get("*", 0.0)
+    offers = ["br", "gzip"] if brotli is not None else ["gzip"]
+    ranked = [(qualities.get(name, wildcard), -i, name) for i, name in enumerate(offers)]
+    quality, _, name = max(ranked)
+    return name if quality > 0 else None
+
+
+def is_compressible(headers: Headers) -> bool:
+    """False for bodies that are already compressed or must pass through as is."""
+    if "content-encoding" in headers or "content-range" in headers:
+        return False
+    if "no-transform" in headers.get("cache-control", "").lower():
+        return False
+    media_type = headers.get("content-type", "").split(";", 1)[0].strip().lower()
+    return media_type not in SKIP_MEDIA_TYPES and not media_type.startswith(SKIP_MEDIA_PREFIXES)
+
+
+class GzipCompressor:
+    """Incremental gzip: ``compress`` per chunk (flushed), ``finish`` at the end."""
+
+    def __init__(self, level: int) -> None:
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 = gzip container
+
+    def compress(self, data: bytes) -> bytes:
+        # Sync flush: everything so far can be decoded by the client now
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class BrotliCompressor:
+    """Same interface as ``GzipCompressor``, for brotli."""
+
+    def __init__(self, quality: int) -> None:
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware; see the module docstring for the rules."""
+
+    def __init__(
+        self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def compressor(self, encoding: str) -> Any:
+        return BrotliCompressor(self.brotli_quality) if encoding == "br" else GzipCompressor(self.gzip_level)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _Responder(self, encoding, send).send)
+
+
+class _Responder:
+    """Per-response state: pass through, buffer to decide, or compress."""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send) -> None:
+        self.middleware = middleware
+        self.encoding = encoding
+        self.downstream = send
+        self.start: Message | None = None
+        self.buffer: list[bytes] = []
+        self.buffered = 0
+        self.mode = "undecided"  # -> "passthrough" or "compress"
+        self.compressor: Any = None
+
+    async def send(self, message: Message) -> None:
+        kind = message["type"]
+        if kind == "http.response.start":
+            self.start = message
+            status = message["status"]
+            headers = Headers(raw=message["headers"])
+            if status < 200 or status in (204, 304) or not is_compressible(headers):
+                self.mode = "passthrough"
+                await self.downstream(message)
+            return
+        if kind != "http.response.body" or self.mode == "passthrough":
+            await self.downstream(message)
+            return
+
+        body: bytes = message.get("body", b"")
+        more_body: bool = message.get("more_body", False)
+        if self.mode == "compress":
+            # 3) Streaming: compress and flush each chunk as it arrives
+            data = self.compressor.compress(body) if more_body else self.compressor.finish(body)
+            if data or not more_body:
+                await self.downstream({"type": kind, "body": data, "more_body": more_body})
+            return
+
+        # 1) Hold the first bytes until we know whether compressing pays off
+        self.buffer.append(body)
+        self.buffered += len(body)
+        if self.buffered < self.middleware.minimum_size:
+            if more_body:
+                return
+            # Small body: send it unchanged
+            await self._send_start(compressed=False)
+            await self.downstream({"type": kind, "body": b"".join(self.buffer), "more_body": False})
+            return
+
+        # 2) Big enough: compress (in one go, or start a compressed stream)
+        data = b"".join(self.buffer)
+        self.buffer = []
+        self.compressor = self.middleware.compressor(self.encoding)
+        if more_body:
+            self.mode = "compress"
+            await self._send_start(compressed=True)
+            await self.downstream({"type": kind, "body": self.compressor.compress(data), "more_body": True})
+        else:
+            data = self.compressor.finish(data)
+            await self._send_start(compressed=True, length=len(data))
+            await self.downstream({"type": kind, "body": data, "more_body": False})
+
+    async def _send_start(self, compressed: bool, length: int | None = None) -> None:
+        assert self.start is not None
+        headers = MutableHeaders(raw=self.start["headers"])
+        headers.add_vary_header("Accept-Encoding")
+        if compressed:
+            headers["Content-Encoding"] = self.encoding
+            if length is None:
+                del headers["Content-Length"]  # streamed: length unknown up front
+            else:
+                headers["Content-Length"] = str(length)
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+        await self.downstream(self.start)
@@ -9,7 +9,6 @@ If you're new:
 - ``lru_cache`` is used so we only create and parse the settings once.
 """
 from functools import lru_cache
-from typing import List
 
 from pydantic import AnyHttpUrl, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -28,7 +27,7 @@ class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     ENVIRONMENT: str = "development"
 
-    BACKEND_CORS_ORIGINS: List[AnyHttpUrl] | List[str] = [
+    BACKEND_CORS_ORIGINS: list[AnyHttpUrl] | list[str] = [
         "http://localhost:3000",
         "http://localhost:19006",
         "http://localhost:8081",
@@ -41,6 +40,150 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str | None = None
     JWT_SECRET_KEY: str | None = None
 
+    # Auth: tokens are verified in-process (HS256 secret or JWKS public keys)
+    JWT_AUDIENCE: str | None = "authenticated"
+    JWT_JWKS_URL: str | None = None  # defaults to <SUPABASE_URL>/auth/v1/.well-known/jwks.json
+    JWT_JWKS_CACHE_SECONDS: int = 600
+    AUTH_TOKEN_CACHE_SIZE: int = 10_000
+
+    # Async Supabase (PostgREST) HTTP pool shared by all requests
+    SUPABASE_HTTP_MAX_CONNECTIONS: int = 20
+    SUPABASE_HTTP_MAX_KEEPALIVE: int = 10
+    SUPABASE_HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    SUPABASE_HTTP_TIMEOUT: float = 10.0
+    # Connections opened in the background at startup (see app.services.registry)
+    CLIENT_WARMUP_ENABLED: bool = True
+    SUPABASE_HTTP_WARM_CONNECTIONS: int = 2
+
+    # Exports stream daily_tracking in pages of this many rows
+    EXPORT_PAGE_SIZE: int = 1000
+
+    # Insight rollups are updated incrementally, which cannot see deleted
+    # tracking rows; each user's buckets are re-derived from raw rows when
+    # their last full rebuild is older than this
+    ROLLUP_REBUILD_SECONDS: int = 24 * 3600
+
+    # Bulk tracking ingest (POST /api/v1/tracking/bulk)
+    INGEST_CHUNK_SIZE: int = 500
+    INGEST_MAX_ROWS: int = 50_000
+    INGEST_MAX_ROW_BYTES: int = 64 * 1024
+
+    # Delta sync (GET /api/v1/sync): rows per table per response, and how far
+    # behind "now" the cursor stays so slow transactions are never skipped
+    # (rollup, forecast and analytics watermarks stay behind by the same amount)
+    SYNC_PAGE_SIZE: int = 500
+    SYNC_SETTLE_SECONDS: float = 5.0
+
+    # Tracking analytics (GET /api/v1/analytics): per-user NumPy column sets
+    # cached in an LRU, and the longest range one request may cover
+    ANALYTICS_CACHE_SIZE: int = 2000
+    ANALYTICS_CACHE_TTL_SECONDS: int = 15 * 60
+    ANALYTICS_MAX_DAYS: int = 3 * 366
+
+    # Inventory forecasts (GET /api/v1/inventory/forecast): dose rate window,
+    # "low" threshold, and how old a stored forecast may be before the
+    # endpoint recomputes it
+    FORECAST_LOOKBACK_DAYS: int = 28
+    FORECAST_LOW_DAYS: int = 7
+    FORECAST_MAX_AGE_SECONDS: int = 6 * 60 * 60
+
+    # Dose schedules: how often a loaded schedule index checks for schedules
+    # written by other processes, and the longest window one "due" request
+    # may ask for
+    SCHEDULE_REFRESH_SECONDS: int = 10
+    SCHEDULE_MAX_WINDOW_DAYS: int = 92
+    SCHEDULE_MAX_PER_USER: int = 50
+
+    # Where caches keep entries (app.services.cache): "memory" (per process),
+    # "sqlite" (one file shared by the workers on a host) or "redis" (shared
+    # by every host; size bounds come from the server's maxmemory policy)
+    CACHE_BACKEND: str = "memory"
+    CACHE_SQLITE_PATH: str = "cache.sqlite3"
+    CACHE_SQLITE_MMAP_BYTES: int = 64 * 1024 * 1024
+    CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    CACHE_REDIS_PREFIX: str = "peptide:"
+    CACHE_REDIS_POOL_SIZE: int = 8
+    CACHE_REDIS_TIMEOUT_SECONDS: float = 0.25
+
+    # Upstream resilience (app.core.deadlines, app.services.resilience): time a
+    # request may take until its response starts (0 = no deadline), concurrent
+    # calls per upstream, and circuit breakers (open after N failures in a row,
+    # try again after the reset time). The DB ping gets its own short limit
+    REQUEST_DEADLINE_SECONDS: float = 30.0
+    SUPABASE_MAX_CONCURRENT_CALLS: int = 20
+    OPENAI_MAX_CONCURRENT_CALLS: int = 16
+    BREAKER_FAILURE_THRESHOLD: int = 5
+    BREAKER_RESET_SECONDS: float = 30.0
+    PING_DB_TIMEOUT_SECONDS: float = 2.0
+
+    # Identical concurrent reads and insight generations share one upstream
+    # call (app.services.singleflight)
+    SINGLE_FLIGHT_ENABLED: bool = True
+
+    # Token-bucket rate limits (app.services.ratelimit): "<capacity>/<seconds>"
+    # per user and for everyone, per route group; a request costs one token
+    # per *_DAYS_PER_TOKEN days of its date range. Backend "memory" (per
+    # process) or "sqlite" (shared by the workers on a host)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"
+    RATE_LIMIT_SQLITE_PATH: str = "rate_limits.sqlite3"
+    RATE_LIMIT_INSIGHTS_USER: str = "20/3600"
+    RATE_LIMIT_INSIGHTS_GLOBAL: str = "600/60"
+    RATE_LIMIT_INSIGHTS_DAYS_PER_TOKEN: int = 90
+    RATE_LIMIT_EXPORT_USER: str = "60/3600"
+    RATE_LIMIT_EXPORT_GLOBAL: str = "3000/60"
+    RATE_LIMIT_EXPORT_DAYS_PER_TOKEN: int = 30
+    RATE_LIMIT_ANALYTICS_USER: str = "120/60"
+    RATE_LIMIT_ANALYTICS_GLOBAL: str = "6000/60"
+    RATE_LIMIT_ANALYTICS_DAYS_PER_TOKEN: int = 365
+
+    # Insight results cached by (user, summary hash); see app.services.insights
+    INSIGHT_CACHE_TTL_SECONDS: int = 6 * 60 * 60
+    INSIGHT_CACHE_SIZE: int = 5000
+    # How old a stored insights row may be and still be reused for the same summary
+    INSIGHT_REHYDRATE_MAX_AGE_SECONDS: int = 36 * 60 * 60
+
+    # OpenAI request timeout (seconds) and optional API base URL (proxies,
+    # compatible providers, or the local stand-in used by backend/benchmarks)
+    OPENAI_TIMEOUT_SECONDS: float = 20.0
+    OPENAI_BASE_URL: str | None = None
+
+    # Background insight jobs (POST /insights/jobs); backend: "memory" or "sqlite"
+    INSIGHT_JOB_BACKEND: str = "memory"
+    INSIGHT_JOB_SQLITE_PATH: str = "insight_jobs.sqlite3"
+    INSIGHT_JOB_WORKERS: int = 4
+    INSIGHT_JOB_DEADLINE_SECONDS: float = 30.0
+    INSIGHT_JOB_MAX_ATTEMPTS: int = 3
+    INSIGHT_JOB_BACKOFF_SECONDS: float = 0.5
+    # How long a sqlite job stays owned by its worker without a renewal (renewed
+    # every third of it); a crashed worker's jobs are re-queued after it
+    INSIGHT_JOB_LEASE_SECONDS: float = 30.0
+
+    # Prometheus request metrics middleware (GET /metrics always works)
+    METRICS_ENABLED: bool = True
+
+    # On-demand request profiling (app/core/profiling.py). Off = the middleware
+    # is not installed at all. A request is profiled when it sends
+    # "X-Profile: <PROFILING_ADMIN_TOKEN>" (empty = header never accepted) or is
+    # picked at PROFILING_SAMPLE_RATE (0..1); at most PROFILING_MAX_CONCURRENT
+    # at once. The newest PROFILING_MAX_PROFILES profiles are kept in PROFILING_DIR
+    PROFILING_ENABLED: bool = False
+    PROFILING_ADMIN_TOKEN: str = ""
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_INTERVAL_MS: float = 5.0
+    PROFILING_MAX_CONCURRENT: int = 4
+    PROFILING_DIR: str = "profiles"
+    PROFILING_MAX_PROFILES: int = 200
+
+    # Response wire format (app/core/responses.py, app/core/compression.py):
+    # gzip/brotli for bodies of at least RESPONSE_COMPRESSION_MIN_BYTES, and
+    # MessagePack for clients sending "Accept: application/msgpack"
+    RESPONSE_COMPRESSION_ENABLED: bool = True
+    RESPONSE_COMPRESSION_MIN_BYTES: int = 1024
+    RESPONSE_GZIP_LEVEL: int = 6
+    RESPONSE_BROTLI_QUALITY: int = 4
+    RESPONSE_MSGPACK_ENABLED: bool = True
+
     @field_validator("BACKEND_CORS_ORIGINS", mode="before")
     @classmethod
     def assemble_cors_origins(cls, v):
@@ -0,0 +1,109 @@
+"""Per-request deadlines that every upstream call made for the request shares.
+
+Each upstream client has its own timeout (``SUPABASE_HTTP_TIMEOUT``,
+``OPENAI_TIMEOUT_SECONDS``), but a route can make several calls in a row: a
+request that waited 9 s for Supabase should not then give OpenAI another
+20 s. ``DeadlineMiddleware`` gives each request ``REQUEST_DEADLINE_SECONDS``
+until its response starts, and ``call_timeout`` turns "what is left" into
+the timeout of the next call:
+
+    timeout = call_timeout(settings.SUPABASE_HTTP_TIMEOUT)  # min(default, time left)
+
+If you're new:
+- The deadline lives in a ``ContextVar``, so it follows the request through
+  ``await``s and into tasks it starts, without being passed as an argument.
+- It only bounds the time until the response *starts*. A streamed export
+  that is already sending rows keeps going with the per-call timeouts.
+- ``deadline_scope(seconds)`` tightens the deadline for one block (e.g. the
+  database ping); it never extends the request's own deadline.
+"""
+import time
+from collections.abc import Awaitable, Callable, Iterator, MutableMapping
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+
+class DeadlineExceededError(Exception):
+    """The request ran out of time before an upstream call could start."""
+
+
+class Deadline:
+    """A monotonic point in time (``at``), or ``None`` for no deadline."""
+
+    __slots__ = ("at",)
+
+    def __init__(self, at: float | None) -> None:
+        self.at = at
+
+    def remaining(self) -> float | None:
+        return None if self.at is None else self.at - time.monotonic()
+
+
+_current: ContextVar[Deadline | None] = ContextVar("request_deadline", default=None)
+
+
+def remaining() -> float | None:
+    """Seconds left for the current request (``None`` without a deadline)."""
+    deadline = _current.get()
+    return deadline.remaining() if deadline is not None else None
+
+
+def call_timeout(default: float) -> float:
+    """Timeout for the next upstream call: ``default``, or less if time is short.
+
+    Raises ``DeadlineExceededError`` when no time is left at all.
+    """
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceededError("request deadline exceeded")
+    return min(default, left)
+
+
+@contextmanager
+def deadline_scope(seconds: float) -> Iterator[Deadline]:
+    """Run a block with at most ``seconds`` left (tighter than any outer deadline)."""
+    at = time.monotonic() + seconds
+    outer = _current.get()
+    if outer is not None and outer.at is not None:
+        at = min(at, outer.at)
+    deadline = Deadline(at)
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+Scope = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[MutableMapping[str, Any]]]
+Send = Callable[[MutableMapping[str, Any]], Awaitable[None]]
+
+
+class DeadlineMiddleware:
+    """Pure ASGI middleware: a deadline per HTTP request until its response starts."""
+
+    def __init__(self, app: Callable[[Scope, Receive, Send], Awaitable[None]], seconds: float) -> None:
+        self.app = app
+        self.seconds = seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with deadline_scope(self.seconds) as deadline:
+
+            async def send_wrapper(message: MutableMapping[str, Any]) -> None:
+                if message["type"] == "http.response.start":
+                    # Streaming bodies run in tasks that share this object
+                    deadline.at = None
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                # Background tasks started by the request must not inherit it
+                deadline.at = None
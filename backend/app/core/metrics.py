@@ -0,0 +1,186 @@
+"""Prometheus metrics: request latency, upstream calls and export volume.
+
+Everything here is exposed at ``GET /metrics`` in the Prometheus text format
+(see ``app/main.py``). What we record:
+
+- every HTTP request, labelled by method, *route template* (for example
+  ``/api/v1/insights/jobs/{job_id}``, never the raw path, so label values
+  stay few) and status code: a counter and a latency histogram, plus an
+  in-flight gauge
+- every call to an upstream service (Supabase REST/auth, the JWKS endpoint,
+  OpenAI): a latency histogram by operation and outcome, plus an error
+  counter
+- upstream calls refused before they went out (circuit open, no free
+  concurrency slot, no time left) or that timed out, and circuit breaker
+  state changes, per upstream
+- rows and bytes streamed by the export endpoints, by format
+- cache lookups (hit/miss), evictions and backend errors, by cache name
+- single-flight calls by group and role: a ``follower`` shared an identical
+  call already in progress instead of reaching the upstream again
+- rate-limit decisions by route group: admitted, rejected (by the caller's
+  own bucket or the global one) or admitted because the backend failed
+
+If you're new:
+- A *histogram* counts observations into fixed latency buckets; Prometheus
+  computes percentiles (p50/p95/p99) from them at query time.
+- Recording a sample is a dictionary lookup and a few additions, so this is
+  cheap enough to leave on in production. Set ``METRICS_ENABLED=false`` to
+  skip the middleware entirely.
+- With several worker processes, set ``PROMETHEUS_MULTIPROC_DIR`` to an empty
+  directory so ``/metrics`` reports the sum across all workers.
+"""
+import os
+import time
+from collections.abc import Awaitable, Callable, Iterator, MutableMapping
+from contextlib import contextmanager
+from typing import Any
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Latency buckets (seconds): fine-grained around typical API latencies
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests handled", ("method", "route", "status")
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time from request start until the response body is fully sent",
+    ("method", "route", "status"),
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests currently being handled", ("method",), multiprocess_mode="livesum"
+)
+
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds",
+    "Latency of calls to upstream services",
+    ("upstream", "operation", "outcome"),
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_ERRORS = Counter(
+    "upstream_errors_total", "Failed upstream calls", ("upstream", "operation", "kind")
+)
+UPSTREAM_REJECTIONS = Counter(
+    "upstream_rejections_total", "Upstream calls refused or timed out by the resilience layer", ("upstream", "reason")
+)
+BREAKER_TRANSITIONS = Counter(
+    "circuit_breaker_transitions_total", "Circuit breaker state changes, by new state", ("upstream", "state")
+)
+
+EXPORT_ROWS = Counter("export_rows_total", "Tracking rows streamed by export endpoints", ("format",))
+EXPORT_BYTES = Counter(
+    "export_bytes_total", "Response bytes streamed by export endpoints", ("format", "compression")
+)
+
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by result (hit or miss)", ("cache", "result"))
+CACHE_EVICTIONS = Counter("cache_evictions_total", "Entries dropped to keep a cache within its size", ("cache",))
+CACHE_ERRORS = Counter("cache_errors_total", "Failed calls to a shared cache backend", ("cache",))
+
+SINGLE_FLIGHT_CALLS = Counter(
+    "singleflight_calls_total", "Calls that ran (leader) or joined (follower) an identical call", ("group", "role")
+)
+
+RATE_LIMIT_DECISIONS = Counter(
+    "rate_limit_decisions_total", "Admission decisions for rate-limited routes", ("group", "decision")
+)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+@contextmanager
+def track_upstream(upstream: str, operation: str) -> Iterator[dict[str, str]]:
+    """Time one upstream call.
+
+    The caller may set ``outcome`` on the yielded dict (default ``"ok"``,
+    e.g. ``"http_5xx"`` for an error status). An exception records
+    ``outcome="error"`` and propagates unchanged. Any outcome other than
+    ``"ok"`` also counts in ``upstream_errors_total`` (``kind`` is the
+    exception class, or the outcome itself).
+
+    Example::
+
+        with track_upstream("openai", "chat.completions"):
+            await client.chat.completions.create(...)
+    """
+    state = {"outcome": "ok"}
+    started = time.perf_counter()
+    try:
+        yield state
+    except BaseException as exc:
+        state["outcome"] = "error"
+        state["kind"] = type(exc).__name__
+        raise
+    finally:
+        outcome = state["outcome"]
+        UPSTREAM_LATENCY.labels(upstream, operation, outcome).observe(time.perf_counter() - started)
+        if outcome != "ok":
+            UPSTREAM_ERRORS.labels(upstream, operation, state.get("kind", outcome)).inc()
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Return ``(body, content_type)`` for the ``/metrics`` response."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        # One process serves the scrape, so merge every worker's files
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+Scope = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[MutableMapping[str, Any]]]
+Send = Callable[[MutableMapping[str, Any]], Awaitable[None]]
+
+
+def _route_label(scope: Scope) -> str:
+    # FastAPI stores the matched route in the scope while routing, so by the
+    # time the response starts we can read its path *template*
+    route = scope.get("route")
+    return getattr(route, "path_format", None) or getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request count, latency and in-flight.
+
+    Written against raw ASGI (not ``BaseHTTPMiddleware``) so streaming
+    responses are not buffered and the added cost stays a few microseconds.
+    """
+
+    def __init__(self, app: Callable[[Scope, Receive, Send], Awaitable[None]]) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = "500"  # if the app raises before responding
+        started = time.perf_counter()
+        # The route is only known after routing, so in-flight is per method
+        in_flight = HTTP_IN_FLIGHT.labels(method)
+        in_flight.inc()
+
+        async def send_wrapper(message: MutableMapping[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            route = _route_label(scope)
+            HTTP_REQUESTS.labels(method, route, status).inc()
+            HTTP_LATENCY.labels(method, route, status).observe(time.perf_counter() - started)
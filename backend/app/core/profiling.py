@@ -0,0 +1,404 @@
+"""On-demand request profiling: a Server-Timing breakdown and a flamegraph.
+
+When one export or insight call is slow in production, ``/metrics`` shows
+*that* it was slow, not *where* the time went. With ``PROFILING_ENABLED=true``
+``ProfilingMiddleware`` profiles selected requests:
+
+- requests sending ``X-Profile: <PROFILING_ADMIN_TOKEN>`` (an admin
+  reproducing a slow call). Their response gets a ``Server-Timing`` header
+  and an ``X-Profile-Id`` naming the stored files
+- a random ``PROFILING_SAMPLE_RATE`` share of all requests (files only)
+
+For each one we record:
+
+- time per phase: ``auth`` (token check), ``db`` (Supabase calls, waiting for
+  a bulkhead slot included), ``model`` (OpenAI), ``serialize`` (rendering
+  JSON or MessagePack) and ``compute`` (everything else). Code marks its
+  phase with ``with timed("db"): ...``
+- a wall-clock sampling profile of the request's tasks every
+  ``PROFILING_INTERVAL_MS``, stored as ``<id>.folded`` (collapsed stacks, one
+  ``frame;frame;frame count`` line per stack) next to ``<id>.json`` (route,
+  status, durations, phases). Only the newest ``PROFILING_MAX_PROFILES`` are
+  kept in ``PROFILING_DIR``
+
+View a profile with any collapsed-stack tool, e.g.
+``flamegraph.pl profiles/<id>.folded > slow.svg`` or speedscope.
+
+If you're new:
+- Disabled (the default), the middleware is not installed and ``timed()``
+  returns a shared no-op after one ``ContextVar`` lookup.
+- The sampler is a background thread. For a task that is running it reads
+  the thread's real stack; for a task that is waiting it follows the chain
+  of awaited coroutines and ends the stack with ``(waiting)``, so time spent
+  waiting on Supabase or OpenAI shows up under the ``await`` that waits.
+  Tasks the request starts (streaming, background work) are sampled too,
+  through a task factory installed once at startup when profiling is on
+  (``install_task_factory``, from ``app.main``'s lifespan); work handed to
+  threads shows up as waiting. Single-flight work serves several requests,
+  so it is in no request's samples, but its phase times count for every
+  request that waited for it (``shared_phases``).
+- Time inside a phase counts for the outermost one only (a Supabase token
+  check is ``auth``, not ``db``); concurrent calls add up, so ``db`` can be
+  more than the total. The header covers the time until the response
+  starts; the ``.json`` file also covers a streamed body.
+"""
+import asyncio
+import hmac
+import json
+import logging
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Awaitable, Callable, MutableMapping
+from contextlib import nullcontext
+from contextvars import Context, ContextVar
+from types import FrameType
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_DEPTH = 128
+WAITING = "(waiting)"
+
+# The profiled request's phase times ({phase: [seconds, calls]}) and the phase
+# being timed right now (None outside any phase)
+_timing: ContextVar[tuple[dict[str, list[float]], str | None] | None] = ContextVar(
+    "server_timing", default=None
+)
+# The profile that tasks started from the current context belong to
+_profile: ContextVar[Optional["Profile"]] = ContextVar("request_profile", default=None)
+
+_NOOP = nullcontext()
+
+
+class _Phase:
+    __slots__ = ("timings", "name", "started", "token")
+
+    def __init__(self, timings: dict[str, list[float]], name: str) -> None:
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.token = _timing.set((self.timings, self.name))
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc: Any) -> None:
+        spent = self.timings.setdefault(self.name, [0.0, 0])
+        spent[0] += time.perf_counter() - self.started
+        spent[1] += 1
+        _timing.reset(self.token)
+
+
+def shared_phases(context: Context) -> dict[str, list[float]]:
+    """Record the phase times of work run in ``context`` (shared by several requests).
+
+    Such work belongs to no request's profile; every request that waited for
+    it adds its times with ``add_phases`` afterwards.
+    """
+    timings: dict[str, list[float]] = {}
+    context.run(_timing.set, (timings, None))
+    return timings
+
+
+def add_phases(timings: dict[str, list[float]]) -> None:
+    """Add shared work's phase times to the current profiled request, if any."""
+    current = _timing.get()
+    if current is None or current[1] is not None:
+        # Not profiled, or waiting inside a phase (that one counts the wait)
+        return
+    for name, (seconds, calls) in timings.items():
+        spent = current[0].setdefault(name, [0.0, 0])
+        spent[0] += seconds
+        spent[1] += calls
+
+
+def timed(phase: str) -> Any:
+    """Context manager adding the block's time to ``phase`` of a profiled request."""
+    current = _timing.get()
+    if current is None or current[1] is not None:
+        # Not profiled, or inside another phase (the outer one gets the time)
+        return _NOOP
+    return _Phase(current[0], phase)
+
+
+def _label(frame: FrameType) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_qualname}"
+
+
+def _waiting_stack(task: "asyncio.Task[Any]") -> list[str]:
+    # Follow what each suspended coroutine awaits, outermost first
+    stack: list[str] = []
+    coro: Any = task.get_coro()
+    while coro is not None and len(stack) < MAX_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        stack.append(_label(frame))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    stack.append(WAITING)
+    return stack
+
+
+def _running_stack(frame: FrameType | None, task: "asyncio.Task[Any]") -> list[str]:
+    # The thread's stack from the innermost frame up to the task's own coroutine
+    root = getattr(task.get_coro(), "cr_frame", None)
+    stack: list[str] = []
+    while frame is not None and len(stack) < MAX_DEPTH:
+        stack.append(_label(frame))
+        if frame is root:
+            stack.reverse()
+            return stack
+        frame = frame.f_back
+    return _waiting_stack(task)
+
+
+class Profile:
+    """One profiled request: phase times, sampled stacks and the tasks it runs."""
+
+    def __init__(self, method: str, path: str, reason: str) -> None:
+        self.started_at = time.time()
+        # Sorts by start time (to the microsecond), so pruning drops the oldest
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(self.started_at))
+        self.id = f"{stamp}{int(self.started_at % 1 * 1e6):06d}-{secrets.token_hex(4)}"
+        self.method = method
+        self.path = path
+        self.reason = reason  # "header" or "sampled"
+        self.started = time.perf_counter()
+        self.response_started: float | None = None
+        self.finished: float | None = None
+        self.status = 500  # if the app raises before responding
+        self.route: str | None = None
+        self.timings: dict[str, list[float]] = {}
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.loop = asyncio.get_running_loop()
+        self.thread_id = threading.get_ident()
+        self.tasks: list[asyncio.Task[Any]] = []
+
+    def sample(self, frames: dict[int, FrameType]) -> None:
+        """Record every live task's stack (called from the sampler thread)."""
+        running = asyncio.current_task(self.loop)
+        for task in list(self.tasks):
+            if task.done():
+                continue
+            if task is running:
+                stack = _running_stack(frames.get(self.thread_id), task)
+            else:
+                stack = _waiting_stack(task)
+            self.stacks[";".join(stack)] += 1
+        self.samples += 1
+
+    def phases(self, until: float) -> dict[str, dict[str, float]]:
+        """Milliseconds (and calls) per phase; ``compute`` and ``total`` up to ``until``."""
+        total = until - self.started
+        result = {name: {"ms": round(s * 1000, 1), "calls": calls} for name, (s, calls) in self.timings.items()}
+        measured = sum(s for s, _ in self.timings.values())
+        result["compute"] = {"ms": round(max(0.0, total - measured) * 1000, 1)}
+        result["total"] = {"ms": round(total * 1000, 1)}
+        return result
+
+    def server_timing(self) -> str:
+        """The ``Server-Timing`` header value for the time so far."""
+        parts = []
+        for name, item in self.phases(time.perf_counter()).items():
+            calls = item.get("calls")
+            desc = f';desc="{int(calls)} call{"s" if calls != 1 else ""}"' if calls is not None else ""
+            parts.append(f"{name};dur={item['ms']}{desc}")
+        return ", ".join(parts)
+
+    def summary(self, interval: float) -> dict[str, Any]:
+        end = self.finished or time.perf_counter()
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "reason": self.reason,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.started_at)),
+            "response_start_ms": (
+                round((self.response_started - self.started) * 1000, 1) if self.response_started else None
+            ),
+            "duration_ms": round((end - self.started) * 1000, 1),
+            "phases": self.phases(end),
+            "samples": self.samples,
+            "interval_ms": interval * 1000,
+        }
+
+
+class Sampler:
+    """Background thread sampling the tasks of every active profile."""
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._active: dict[int, Profile] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def add(self, profile: Profile) -> None:
+        with self._lock:
+            self._active[id(profile)] = profile
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+            self._thread.start()
+        self._wake.set()
+
+    def remove(self, profile: Profile) -> None:
+        # Waits for a sample in progress, so the profile is not touched after this
+        with self._lock:
+            self._active.pop(id(profile), None)
+
+    def _run(self) -> None:
+        while True:
+            if not self._active:
+                # Sleep until the next profiled request (check again after clearing)
+                self._wake.clear()
+                if not self._active:
+                    self._wake.wait()
+                continue
+            time.sleep(self.interval)
+            with self._lock:
+                frames = sys._current_frames()
+                for profile in list(self._active.values()):
+                    profile.sample(frames)
+
+
+class ProfileStore:
+    """Writes profiles to a folder and keeps only the newest ``max_profiles``."""
+
+    def __init__(self, directory: str, max_profiles: int) -> None:
+        self.directory = directory
+        self.max_profiles = max(1, max_profiles)
+
+    def save(self, profile: Profile, interval: float) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, profile.id)
+        with open(base + ".folded", "w") as fh:
+            for stack, count in sorted(profile.stacks.items()):
+                fh.write(f"{stack} {count}\n")
+        with open(base + ".json", "w") as fh:
+            json.dump(profile.summary(interval), fh, indent=2)
+        self._prune()
+
+    def _prune(self) -> None:
+        # Names start with a UTC timestamp, so sorting them sorts by age
+        names = sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith(".json"))
+        for name in names[: max(0, len(names) - self.max_profiles)]:
+            for ext in (".json", ".folded"):
+                try:
+                    os.remove(os.path.join(self.directory, name + ext))
+                except FileNotFoundError:
+                    pass  # another worker pruned it first
+
+
+def install_task_factory(loop: asyncio.AbstractEventLoop) -> None:
+    """Make tasks started by a profiled request part of its profile.
+
+    Call once per event loop, at startup; without it only the request's own
+    task is sampled. Installing twice is harmless.
+    """
+    previous = loop.get_task_factory()
+    if getattr(previous, "profiling", False):
+        return
+
+    def factory(loop: asyncio.AbstractEventLoop, coro: Any, **kwargs: Any) -> "asyncio.Future[Any]":
+        if previous is not None:
+            task = previous(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        context = kwargs.get("context")
+        profile = context.get(_profile) if context is not None else _profile.get()
+        if profile is not None and profile.finished is None:
+            profile.tasks.append(task)
+        return task
+
+    factory.profiling = True  # type: ignore[attr-defined]
+    loop.set_task_factory(factory)
+
+
+Scope = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[MutableMapping[str, Any]]]
+Send = Callable[[MutableMapping[str, Any]], Awaitable[None]]
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware profiling requests picked by admin header or sampling."""
+
+    def __init__(
+        self,
+        app: Callable[[Scope, Receive, Send], Awaitable[None]],
+        admin_token: str = "",
+        sample_rate: float = 0.0,
+        interval_ms: float = 5.0,
+        max_concurrent: int = 4,
+        directory: str = "profiles",
+        max_profiles: int = 200,
+    ) -> None:
+        self.app = app
+        self.admin_token = admin_token.encode()
+        self.sample_rate = sample_rate
+        self.interval = max(0.001, interval_ms / 1000)
+        self.max_concurrent = max_concurrent
+        self.store = ProfileStore(directory, max_profiles)
+        self.sampler = Sampler(self.interval)
+        self.active = 0
+
+    def _select(self, scope: Scope) -> str | None:
+        # 1) An admin asked for it (compared in constant time)
+        if self.admin_token:
+            for name, value in scope["headers"]:
+                if name == b"x-profile":
+                    if hmac.compare_digest(value, self.admin_token):
+                        return "header"
+                    break
+        # 2) Random sampling, within the concurrency budget
+        if self.sample_rate > 0 and self.active < self.max_concurrent and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        reason = self._select(scope) if scope["type"] == "http" else None
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(scope["method"], scope["path"], reason)
+        current = asyncio.current_task()
+        if current is not None:
+            profile.tasks.append(current)
+        timing_token = _timing.set((profile.timings, None))
+        profile_token = _profile.set(profile)
+        self.active += 1
+        self.sampler.add(profile)
+
+        async def send_wrapper(message: MutableMapping[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                profile.response_started = time.perf_counter()
+                if reason == "header":
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", profile.server_timing().encode()))
+                    headers.append((b"x-profile-id", profile.id.encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.sampler.remove(profile)
+            self.active -= 1
+            profile.finished = time.perf_counter()
+            route = scope.get("route")
+            profile.route = getattr(route, "path_format", None) or getattr(route, "path", None)
+            _profile.reset(profile_token)
+            _timing.reset(timing_token)
+            try:
+                # The response is already sent: the client does not wait for this
+                await asyncio.to_thread(self.store.save, profile, self.interval)
+            except OSError as exc:
+                logger.warning("Could not store profile %s: %s", profile.id, exc)
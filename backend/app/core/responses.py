@@ -0,0 +1,153 @@
+"""Fast JSON responses, with MessagePack as an opt-in alternative.
+
+``FastJSONResponse`` is the app's ``default_response_class``: whatever a
+route returns is serialized with ``orjson``, which is several times faster
+than the standard library ``json`` module and understands datetimes, UUIDs
+and NumPy values directly.
+
+Clients that send ``Accept: application/msgpack`` get the same data as
+MessagePack instead (smaller, and quicker to parse on a phone). The choice
+is made once per request by ``NegotiationMiddleware`` and applies to every
+route that returns plain data; file downloads (exports) are not affected.
+
+If you're new:
+- "Content negotiation" means the client lists the formats it understands
+  in the ``Accept`` header and the server picks one. Responses carry
+  ``Vary: Accept`` so caches keep the JSON and MessagePack copies apart.
+- ``msgpack`` is optional: without the package every client gets JSON.
+- For plain dicts FastAPI first runs ``jsonable_encoder`` over the data,
+  which costs far more than serializing it. Routes with large answers (e.g.
+  ``/sync``) return ``FastJSONResponse(data)`` themselves to skip that pass.
+"""
+import contextvars
+import uuid
+from collections.abc import Mapping
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from starlette.background import BackgroundTask
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.profiling import timed
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+# Names clients use for MessagePack; the response echoes the one they sent
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+# Media type negotiated for the current request (None: negotiation is off)
+_representation: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "response_representation", default=None
+)
+
+
+def header_qualities(value: str | None) -> dict[str, float]:
+    """Parse an ``Accept``-style header into ``{token: q}`` (``q=0`` means "never")."""
+    qualities: dict[str, float] = {}
+    for part in (value or "").split(","):
+        token, *params = part.split(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, raw = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(raw)
+                except ValueError:
+                    quality = 0.0
+        qualities[token] = quality
+    return qualities
+
+
+def negotiate_representation(accept: str | None) -> str:
+    """Pick JSON or MessagePack for an ``Accept`` header (JSON unless asked)."""
+    if msgpack is None or not accept:
+        return JSON_MEDIA_TYPE
+    qualities = header_qualities(accept)
+    named = [t for t in MSGPACK_MEDIA_TYPES if qualities.get(t, 0.0) > 0]
+    if not named:
+        return JSON_MEDIA_TYPE
+    best = max(named, key=lambda t: qualities[t])
+    # "application/msgpack, */*" is how a MessagePack-capable client asks
+    # for it, so a tie goes to MessagePack
+    json_quality = max(qualities.get(t, 0.0) for t in (JSON_MEDIA_TYPE, "application/*", "*/*"))
+    return best if qualities[best] >= json_quality else JSON_MEDIA_TYPE
+
+
+def _fallback(value: Any) -> Any:
+    """Convert values neither serializer handles natively."""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if hasattr(value, "tolist"):  # NumPy arrays and scalars (MessagePack)
+        return value.tolist()
+    raise TypeError(f"Type is not serializable: {type(value).__name__}")
+
+
+def dumps_json(content: Any) -> bytes:
+    return orjson.dumps(content, default=_fallback, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def dumps_msgpack(content: Any) -> bytes:
+    return msgpack.packb(content, default=_fallback)
+
+
+class FastJSONResponse(JSONResponse):
+    """``orjson`` JSON, or MessagePack when the request negotiated it."""
+
+    def __init__(
+        self,
+        content: Any,
+        status_code: int = 200,
+        headers: Mapping[str, str] | None = None,
+        media_type: str | None = None,
+        background: BackgroundTask | None = None,
+    ) -> None:
+        # Read before rendering: ``render`` (called by the base class) uses it
+        self._negotiated = _representation.get()
+        super().__init__(content, status_code, headers, media_type, background)
+        if self._negotiated is not None:
+            self.headers.add_vary_header("Accept")
+            etag = self.headers.get("etag")
+            if self._negotiated != JSON_MEDIA_TYPE and etag and not etag.startswith("W/"):
+                # Same data in another format: only weakly equal to the JSON copy
+                self.headers["etag"] = f"W/{etag}"
+
+    def render(self, content: Any) -> bytes:
+        with timed("serialize"):
+            if self._negotiated is not None and self._negotiated != JSON_MEDIA_TYPE:
+                self.media_type = self._negotiated
+                return dumps_msgpack(content)
+            return dumps_json(content)
+
+
+class NegotiationMiddleware:
+    """Choose JSON or MessagePack from ``Accept`` for ``FastJSONResponse``."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _representation.set(negotiate_representation(Headers(scope=scope).get("accept")))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _representation.reset(token)
@@ -0,0 +1,169 @@
+"""In-process verification of Supabase access tokens (JWTs).
+
+Supabase signs every access token. Instead of asking Supabase "who is this?"
+on each request (a network round-trip), we check the signature locally:
+
+- ``HS256`` tokens are verified with ``JWT_SECRET_KEY`` (the project's JWT
+  secret from the Supabase dashboard).
+- Asymmetric tokens (``RS256``/``ES256``) are verified against the project's
+  public JWKS key set, which we download once and keep cached.
+- If neither is configured, we fall back to Supabase's ``/auth/v1/user``.
+
+Verified tokens are remembered in the ``auth_tokens`` cache (see
+``app.services.cache``) keyed by the token's SHA-256 hash, and each entry
+expires when the token's own ``exp`` passes. A repeat request with the same
+token is then a cache lookup (a dictionary read with the default backend).
+"""
+import asyncio
+import hashlib
+import time
+from typing import Any
+
+import httpx
+import jwt
+
+from app.core.config import get_settings
+from app.core.metrics import track_upstream
+from app.services.cache import Cache, get_cache
+
+# Allow small clock differences between Supabase and this server
+CLOCK_SKEW_SECONDS = 30
+# Do not hammer the JWKS endpoint when tokens carry unknown key ids
+JWKS_MIN_REFETCH_SECONDS = 5
+# Signature algorithms we accept (never trust an arbitrary ``alg`` header)
+HMAC_ALGORITHMS = {"HS256", "HS384", "HS512"}
+ASYMMETRIC_ALGORITHMS = {"RS256", "RS384", "RS512", "ES256", "ES384", "PS256", "EdDSA"}
+
+
+class TokenVerificationError(Exception):
+    """Raised when a bearer token is malformed, expired or not trusted."""
+
+
+class _JWKSCache:
+    """Cached public keys (by ``kid``) for asymmetric token verification."""
+
+    def __init__(self) -> None:
+        self._keys: dict[str, jwt.PyJWK] = {}
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get_key(self, url: str, kid: str | None, max_age: int) -> jwt.PyJWK:
+        # 1) Serve from cache while fresh and the key id is known
+        if time.monotonic() - self._fetched_at < max_age and kid in self._keys:
+            return self._keys[kid]
+        async with self._lock:
+            # 2) Refetch when stale, or when an unknown kid shows up (key
+            #    rotation) - but not more than once every few seconds
+            age = time.monotonic() - self._fetched_at
+            if age >= max_age or (kid not in self._keys and age > JWKS_MIN_REFETCH_SECONDS):
+                await self._refresh(url)
+        key = self._keys.get(kid or "")
+        if key is None and not kid and len(self._keys) == 1:
+            key = next(iter(self._keys.values()))
+        if key is None:
+            raise TokenVerificationError("Unknown signing key")
+        return key
+
+    async def _refresh(self, url: str) -> None:
+        with track_upstream("supabase_jwks", "GET jwks"):
+            async with httpx.AsyncClient(timeout=5.0) as client:
+                resp = await client.get(url)
+                resp.raise_for_status()
+                payload = resp.json()
+        keys: dict[str, jwt.PyJWK] = {}
+        for jwk in payload.get("keys", []):
+            try:
+                keys[jwk.get("kid", "")] = jwt.PyJWK(jwk)
+            except jwt.PyJWTError:
+                # Skip key types this install cannot use
+                continue
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+
+
+_jwks = _JWKSCache()
+
+
+def get_token_cache() -> Cache[str]:
+    """Return the verified-token cache (user id by token hash)."""
+    return get_cache("auth_tokens", get_settings().AUTH_TOKEN_CACHE_SIZE)
+
+
+def _jwks_url() -> str | None:
+    settings = get_settings()
+    if settings.JWT_JWKS_URL:
+        return settings.JWT_JWKS_URL
+    if settings.SUPABASE_URL:
+        return settings.SUPABASE_URL.rstrip("/") + "/auth/v1/.well-known/jwks.json"
+    return None
+
+
+def _decode(token: str, key: Any, algorithm: str) -> dict[str, Any]:
+    settings = get_settings()
+    options = {"require": ["exp", "sub"], "verify_aud": bool(settings.JWT_AUDIENCE)}
+    return jwt.decode(
+        token,
+        key,
+        algorithms=[algorithm],
+        audience=settings.JWT_AUDIENCE or None,
+        leeway=CLOCK_SKEW_SECONDS,
+        options=options,
+    )
+
+
+async def _verify_remotely(token: str) -> dict[str, Any]:
+    """Fallback: ask Supabase Auth to validate the token."""
+    from app.services.postgrest import get_postgrest
+
+    db = get_postgrest()
+    if db is None:
+        raise TokenVerificationError("Supabase not configured")
+    user = await db.get_auth_user(token)
+    user_id = user.get("id")
+    if not user_id:
+        raise TokenVerificationError("Missing user id")
+    # The token was accepted upstream, so its (unverified) exp is trustworthy
+    claims = jwt.decode(token, options={"verify_signature": False})
+    claims["sub"] = str(user_id)
+    return claims
+
+
+async def verify_access_token(token: str) -> str:
+    """Verify a Supabase access token and return the user id (``sub`` claim).
+
+    Raises ``TokenVerificationError`` when the token cannot be trusted.
+    """
+    settings = get_settings()
+    cache = get_token_cache()
+    # 1) Fast path: token already verified and not yet expired
+    cache_key = hashlib.sha256(token.encode()).hexdigest()
+    cached = await cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # 2) Read the (unverified) header to decide how to check the signature
+    try:
+        header = jwt.get_unverified_header(token)
+    except jwt.PyJWTError as exc:
+        raise TokenVerificationError("Malformed token") from exc
+    algorithm = header.get("alg", "")
+
+    try:
+        if algorithm in HMAC_ALGORITHMS and settings.JWT_SECRET_KEY:
+            claims = _decode(token, settings.JWT_SECRET_KEY, algorithm)
+        elif algorithm in ASYMMETRIC_ALGORITHMS and _jwks_url():
+            key = await _jwks.get_key(_jwks_url(), header.get("kid"), settings.JWT_JWKS_CACHE_SECONDS)
+            claims = _decode(token, key.key, algorithm)
+        else:
+            claims = await _verify_remotely(token)
+    except TokenVerificationError:
+        raise
+    except Exception as exc:  # noqa: BLE001 - any failure means "not trusted"
+        raise TokenVerificationError("Invalid or expired token") from exc
+
+    user_id = claims.get("sub")
+    if not user_id:
+        raise TokenVerificationError("Missing user id")
+    # 3) Remember the result until the token itself expires
+    await cache.set(cache_key, str(user_id), float(claims.get("exp", 0)))
+    return str(user_id)
@@ -0,0 +1 @@
+"""Background jobs: an async job queue and the work that runs on it."""
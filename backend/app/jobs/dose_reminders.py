@@ -0,0 +1,120 @@
+"""Reminder fan-out: every user's doses due in the next few minutes.
+
+Run from the ``backend`` folder. Preferably as one long-lived worker::
+
+    python -m app.jobs.dose_reminders --watch --minutes 5
+
+or once per window from a scheduler (each run reads every schedule)::
+
+    python -m app.jobs.dose_reminders --minutes 5
+    python -m app.jobs.dose_reminders --start 2024-06-01T08:00:00Z --minutes 60
+
+Due doses are printed as NDJSON on stdout (one per line: ``schedule_id``,
+``user_id``, ``peptide_id``, ``title``, ``due_at``) for a push sender to
+consume; a short JSON report per window goes to stderr.
+
+If you're new:
+- All active schedules are read into a ``ScheduleIndex`` once; each window
+  is then answered from its timeline.
+- With ``--watch`` the process keeps that index: at the start of every next
+  window it only reads schedules written since the previous one, so the
+  database is not scanned again every few minutes.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from datetime import UTC, datetime, timedelta
+from typing import Any, TextIO
+
+from app.services.repository import Repositories, get_repositories
+from app.services.schedules import ScheduleService
+
+# Windows are closed at the start and open at the end: the next one starts
+# just after the previous end, so a dose on the boundary is sent once
+EPSILON = 0.001
+
+
+async def watch(
+    repos: Repositories,
+    start: datetime,
+    minutes: int,
+    page_size: int,
+    out: TextIO,
+    windows: int | None = None,
+) -> list[dict[str, Any]]:
+    """Print the doses of consecutive windows from ``start`` on.
+
+    Sleeps until each window begins (windows in the past run at once).
+    Stops after ``windows`` windows, or never when ``None``; returns the
+    per-window reports.
+    """
+    service = ScheduleService(repos, page_size=page_size)
+    length = timedelta(minutes=minutes).total_seconds()
+    window_start = start.timestamp()
+    reports: list[dict[str, Any]] = []
+    while windows is None or len(reports) < windows:
+        await asyncio.sleep(max(window_start - time.time(), 0.0))
+        # 1) Apply schedules written since the last window (all on the first)
+        started = time.perf_counter()
+        index = await service.index(max_age=0)
+        loaded = time.perf_counter()
+        # 2) One timeline lookup for the whole window
+        window_end = window_start + length
+        doses = index.due(window_start, window_end - EPSILON)
+        for dose in doses:
+            out.write(json.dumps(dose) + "\n")
+        out.flush()
+        report = {
+            "start": datetime.fromtimestamp(window_start, UTC).isoformat(),
+            "end": datetime.fromtimestamp(window_end, UTC).isoformat(),
+            "schedules": len(index),
+            "due": len(doses),
+            "users": len({d["user_id"] for d in doses}),
+            "load_seconds": round(loaded - started, 4),
+            "query_seconds": round(time.perf_counter() - loaded, 4),
+        }
+        print(json.dumps(report), file=sys.stderr, flush=True)
+        reports.append(report)
+        window_start = window_end
+    return reports
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Print every dose due in a window (NDJSON).")
+    parser.add_argument("--start", help="Window start, ISO 8601 (default: now)")
+    parser.add_argument("--minutes", type=int, default=5, help="Window length in minutes")
+    parser.add_argument("--page-size", type=int, default=5000, help="Rows per schedule read page")
+    parser.add_argument(
+        "--watch", action="store_true", help="Keep running and print each following window as it starts"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr, format="%(asctime)s %(levelname)s %(message)s")
+    repos = get_repositories()
+    if repos is None:
+        print("Supabase not configured (SUPABASE_URL / SUPABASE_SERVICE_ROLE_KEY)", file=sys.stderr)
+        return 2
+    start = datetime.fromisoformat(args.start) if args.start else datetime.now(UTC)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=UTC)
+
+    async def run() -> None:
+        from app.services.registry import get_registry
+
+        try:
+            await watch(repos, start, args.minutes, args.page_size, sys.stdout, None if args.watch else 1)
+        finally:
+            await get_registry().aclose()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
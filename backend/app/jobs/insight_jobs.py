@@ -0,0 +1,67 @@
+"""Insight generation as a background job.
+
+``POST /insights/jobs`` submits work here and returns a job id right away;
+``GET /insights/jobs/{job_id}`` reports status and, once done, the result.
+Identical in-flight requests (same user and window) share one job.
+
+If a job runs past ``INSIGHT_JOB_DEADLINE_SECONDS`` it completes with the
+default (mock) tips instead of leaving the client waiting.
+"""
+from typing import Any
+
+from app.core.config import get_settings
+from app.jobs.queue import JobRunner, MemoryJobStore, SQLiteJobStore
+from app.services.insights import build_insight, fallback_insight
+from app.services.repository import get_repositories
+
+_runner: JobRunner | None = None
+
+
+async def run_insight_job(payload: dict[str, Any]) -> dict[str, Any]:
+    """Job handler: build insights for ``payload["user_id"]`` over ``payload["days"]``."""
+    repos = get_repositories()
+    if repos is None:
+        raise RuntimeError("Supabase not configured")
+    return await build_insight(repos, payload["user_id"], payload["days"])
+
+
+def insight_fallback(payload: dict[str, Any]) -> dict[str, Any]:
+    """Result used when a job misses its deadline."""
+    return fallback_insight()
+
+
+def job_key(user_id: str, days: int) -> str:
+    """De-duplication key: one in-flight job per user and window."""
+    return f"insights:{user_id}:{days}"
+
+
+async def get_insight_runner() -> JobRunner:
+    """Return the process-wide insight job runner, starting it on first use."""
+    global _runner
+    if _runner is None:
+        settings = get_settings()
+        if settings.INSIGHT_JOB_BACKEND == "sqlite":
+            store: Any = SQLiteJobStore(
+                settings.INSIGHT_JOB_SQLITE_PATH, lease_seconds=settings.INSIGHT_JOB_LEASE_SECONDS
+            )
+        else:
+            store = MemoryJobStore()
+        _runner = JobRunner(
+            store,
+            run_insight_job,
+            insight_fallback,
+            workers=settings.INSIGHT_JOB_WORKERS,
+            deadline=settings.INSIGHT_JOB_DEADLINE_SECONDS,
+            max_attempts=settings.INSIGHT_JOB_MAX_ATTEMPTS,
+            backoff=settings.INSIGHT_JOB_BACKOFF_SECONDS,
+        )
+        await _runner.start()
+    return _runner
+
+
+async def shutdown_insight_runner() -> None:
+    """Stop the workers (called on application shutdown)."""
+    global _runner
+    if _runner is not None:
+        await _runner.stop()
+        _runner = None
@@ -0,0 +1,246 @@
+"""Nightly batch: precompute insights for every active user.
+
+Run from the ``backend`` folder::
+
+    python -m app.jobs.insights_batch --days 7 --concurrency 8 --rpm 120
+
+What it does, in stages (each one is timed in the final report):
+
+1. fetch: read every user's ``daily_tracking`` rows for the window with a
+   few large keyset-paginated queries (not one query per user)
+2. compute: turn those rows into NumPy columns and compute every user's
+   summary at once with ``bincount`` (grouped sums/counts)
+3. model: ask the model for tips, at most ``--concurrency`` calls at a time
+   and no more than ``--rpm`` calls per minute
+4. write: store results in ``insights`` with chunked bulk inserts
+
+Summaries match the request-time ones exactly, so when a user opens the app
+``/insights/generate`` finds the stored answer and skips the model call.
+The report is printed as JSON on stdout.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+import numpy as np
+
+from app.services.insights import InsightGenerationError, build_prompt, request_tips
+from app.services.postgrest import PostgrestError
+from app.services.repository import Repositories, get_repositories
+from app.services.rollups import ROLLUP_METRICS, build_summary
+
+logger = logging.getLogger("app.jobs.insights_batch")
+
+
+class RateBudget:
+    """Token bucket: allows ``per_minute`` acquisitions per minute on average."""
+
+    def __init__(self, per_minute: float) -> None:
+        if per_minute <= 0:
+            raise ValueError("per_minute must be positive")
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate)  # allow at most ~1s worth of burst
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class TrackingColumns:
+    """Column-wise accumulation of many users' rows as NumPy arrays."""
+
+    def __init__(self) -> None:
+        self.user_index: dict[str, int] = {}
+        self._codes: list[np.ndarray] = []
+        self._values: dict[str, list[np.ndarray]] = {m: [] for m in ROLLUP_METRICS}
+        self.rows = 0
+
+    def add_page(self, page: list[dict[str, Any]]) -> None:
+        index = self.user_index
+        self._codes.append(
+            np.fromiter((index.setdefault(r["user_id"], len(index)) for r in page), dtype=np.int64, count=len(page))
+        )
+        for metric in ROLLUP_METRICS:
+            self._values[metric].append(np.array([r.get(metric) for r in page], dtype=np.float64))
+        self.rows += len(page)
+
+    def summaries(self, days: int) -> dict[str, dict[str, Any]]:
+        """Every user's summary, computed with grouped (vectorized) sums."""
+        n = len(self.user_index)
+        if n == 0:
+            return {}
+        codes = np.concatenate(self._codes)
+        entries = np.bincount(codes, minlength=n)
+        means: dict[str, np.ndarray] = {}
+        for metric in ROLLUP_METRICS:
+            values = np.concatenate(self._values[metric])  # None -> NaN
+            present = ~np.isnan(values)
+            sums = np.bincount(codes[present], weights=values[present], minlength=n)
+            counts = np.bincount(codes[present], minlength=n)
+            means[metric] = np.divide(sums, counts, out=np.full(n, np.nan), where=counts > 0)
+        result: dict[str, dict[str, Any]] = {}
+        for user_id, i in self.user_index.items():
+            user_means = {m: (None if np.isnan(means[m][i]) else float(means[m][i])) for m in ROLLUP_METRICS}
+            result[user_id] = build_summary(int(entries[i]), user_means, days)
+        return result
+
+
+async def run_batch(
+    repos: Repositories,
+    days: int = 7,
+    concurrency: int = 8,
+    rpm: float = 120,
+    chunk_size: int = 500,
+    page_size: int = 5000,
+    limit_users: int | None = None,
+    dry_run: bool = False,
+) -> dict[str, Any]:
+    """Run all stages and return the report dict."""
+    if min(days, concurrency, chunk_size, page_size) < 1:
+        # A zero semaphore or chunk size would hang or loop forever
+        raise ValueError("days, concurrency, chunk_size and page_size must be at least 1")
+    timings: dict[str, float] = {"fetch": 0.0, "compute": 0.0, "model": 0.0, "write": 0.0}
+    started = time.perf_counter()
+
+    # 1) fetch: bulk keyset-paginated read of the window for all users
+    today = datetime.now(UTC).date()
+    start = datetime.combine(today - timedelta(days=days - 1), datetime.min.time(), tzinfo=UTC)
+    columns = TrackingColumns()
+    t = time.perf_counter()
+    async for page in repos.tracking.iter_pages(
+        None, start, None, columns=("id", "user_id", "created_at", *ROLLUP_METRICS), page_size=page_size
+    ):
+        columns.add_page(page)  # type: ignore[arg-type]
+    timings["fetch"] = time.perf_counter() - t
+
+    # 2) compute: vectorized per-user summaries
+    t = time.perf_counter()
+    summaries = columns.summaries(days)
+    user_ids = list(summaries)[:limit_users] if limit_users else list(summaries)
+    timings["compute"] = time.perf_counter() - t
+
+    # 3 + 4) model calls under a concurrency limit and rate budget, written
+    #        back in chunks so memory stays bounded
+    semaphore = asyncio.Semaphore(concurrency)
+    budget = RateBudget(rpm)
+    failures = 0
+    write_failures = 0
+    inserted = 0
+
+    async def one(user_id: str) -> dict[str, Any] | None:
+        nonlocal failures
+        async with semaphore:
+            await budget.acquire()
+            try:
+                tips = await request_tips(build_prompt(summaries[user_id], days))
+            except InsightGenerationError as exc:
+                failures += 1
+                logger.warning("Model call failed for %s: %s", user_id, exc)
+                return None
+        return {"user_id": user_id, "summary": summaries[user_id], "tips": tips}
+
+    if not dry_run:
+        for i in range(0, len(user_ids), chunk_size):
+            t = time.perf_counter()
+            results = await asyncio.gather(*(one(u) for u in user_ids[i : i + chunk_size]))
+            timings["model"] += time.perf_counter() - t
+            rows = [r for r in results if r is not None]
+            t = time.perf_counter()
+            try:
+                await repos.insights.insert_many(rows)  # type: ignore[arg-type]
+                inserted += len(rows)
+            except PostgrestError as exc:
+                # One failed chunk must not lose the rest of the night's work
+                write_failures += len(rows)
+                logger.warning("Insert of %d insights failed: %s", len(rows), exc.message)
+            timings["write"] += time.perf_counter() - t
+            logger.info("Processed %d/%d users", min(i + chunk_size, len(user_ids)), len(user_ids))
+
+    total = time.perf_counter() - started
+    return {
+        "window_days": days,
+        "rows_read": columns.rows,
+        "active_users": len(summaries),
+        "users_processed": 0 if dry_run else len(user_ids),
+        "insights_written": inserted,
+        "model_failures": failures,
+        "write_failures": write_failures,
+        "timings_s": {k: round(v, 4) for k, v in timings.items()} | {"total": round(total, 4)},
+        "throughput": {
+            "rows_per_s_fetch": round(columns.rows / timings["fetch"], 1) if timings["fetch"] else None,
+            "users_per_s_compute": round(len(summaries) / timings["compute"], 1) if timings["compute"] else None,
+            "users_per_s_overall": round(len(user_ids) / total, 2) if total and not dry_run else None,
+        },
+    }
+
+
+def _positive_float(value: str) -> float:
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be greater than 0, got {value}")
+    return number
+
+
+def _positive_int(value: str) -> int:
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be greater than 0, got {value}")
+    return number
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Precompute insights for all active users.")
+    parser.add_argument("--days", type=_positive_int, default=7, help="Summary window in days (default 7)")
+    parser.add_argument("--concurrency", type=_positive_int, default=8, help="Max concurrent model calls")
+    parser.add_argument("--rpm", type=_positive_float, default=120, help="Max model calls per minute")
+    parser.add_argument("--chunk-size", type=_positive_int, default=500, help="Rows per bulk insert")
+    parser.add_argument("--page-size", type=_positive_int, default=5000, help="Rows per tracking page")
+    parser.add_argument("--limit-users", type=_positive_int, default=None, help="Only process the first N users")
+    parser.add_argument("--dry-run", action="store_true", help="Fetch and compute only; no model calls or writes")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr, format="%(asctime)s %(levelname)s %(message)s")
+    repos = get_repositories()
+    if repos is None:
+        print("Supabase not configured (SUPABASE_URL / SUPABASE_SERVICE_ROLE_KEY)", file=sys.stderr)
+        return 2
+
+    async def run() -> dict[str, Any]:
+        from app.services.registry import get_registry
+
+        try:
+            return await run_batch(
+                repos,
+                days=args.days,
+                concurrency=args.concurrency,
+                rpm=args.rpm,
+                chunk_size=args.chunk_size,
+                page_size=args.page_size,
+                limit_users=args.limit_users,
+                dry_run=args.dry_run,
+            )
+        finally:
+            await get_registry().aclose()
+
+    report = asyncio.run(run())
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""Incremental refresh of inventory forecasts (see ``app.services.forecast``).
+
+Run from the ``backend`` folder, e.g. every 15 minutes from a scheduler::
+
+    python -m app.jobs.inventory_forecast           # only users with new writes
+    python -m app.jobs.inventory_forecast --full    # every user with inventory (nightly)
+
+Users are recomputed in batches of ``--batch-users``: each batch is a few
+bulk reads, one vectorized pass and one bulk upsert. A short JSON report is
+printed on stdout.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from typing import Any
+
+from app.services.forecast import ForecastService
+from app.services.repository import get_repositories
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Refresh inventory depletion/expiry forecasts.")
+    parser.add_argument("--full", action="store_true", help="Recompute every user, not just changed ones")
+    parser.add_argument("--batch-users", type=int, default=200, help="Users per vectorized batch")
+    parser.add_argument("--page-size", type=int, default=5000, help="Rows per read page")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr, format="%(asctime)s %(levelname)s %(message)s")
+    repos = get_repositories()
+    if repos is None:
+        print("Supabase not configured (SUPABASE_URL / SUPABASE_SERVICE_ROLE_KEY)", file=sys.stderr)
+        return 2
+
+    async def run() -> dict[str, Any]:
+        from app.services.registry import get_registry
+
+        try:
+            service = ForecastService(repos, page_size=args.page_size)
+            return await service.refresh_changed(full=args.full, batch_users=args.batch_users)
+        finally:
+            await get_registry().aclose()
+
+    report = asyncio.run(run())
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,404 @@
+"""A small async job queue with a bounded worker pool.
+
+Slow work (like an OpenAI call) should not hold an HTTP request open. A route
+instead *submits* a job and immediately returns its id; a fixed number of
+worker tasks process jobs in the background, and clients poll for the result.
+
+Features:
+- bounded concurrency: ``workers`` tasks, so slow jobs cannot pile up
+- per-job deadline: when it passes, the job finishes with a fallback result
+- retries with exponential backoff for transient failures
+- de-duplication: submitting a job whose ``key`` is already queued/running
+  returns the existing job instead of starting a second one
+
+Job state lives in a *store*: ``MemoryJobStore`` (default, per process) or
+``SQLiteJobStore`` (a local file that survives restarts and is shared by the
+workers on a host). A SQLite job that starts running takes a *lease*: its
+row records which process runs it and until when. The runner renews the
+lease while the job runs, and a starting runner only re-queues jobs whose
+lease has expired (their process crashed), never jobs another live worker
+is still running.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+Handler = Callable[[dict[str, Any]], Awaitable[Any]]
+Fallback = Callable[[dict[str, Any]], Any]
+
+
+@dataclass
+class Job:
+    """One unit of background work and its outcome."""
+
+    id: str
+    key: str
+    owner: str
+    payload: dict[str, Any]
+    status: str = QUEUED
+    result: Any = None
+    error: str | None = None
+    attempts: int = 0
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    def to_public(self) -> dict[str, Any]:
+        """Fields safe to return to the job's owner."""
+        data = asdict(self)
+        data.pop("payload")
+        data.pop("owner")
+        data["job_id"] = data.pop("id")
+        return data
+
+
+class MemoryJobStore:
+    """In-process job store; finished jobs are kept for ``retention`` seconds."""
+
+    # Jobs never outlive the process, so there is no lease to renew
+    lease_seconds: float | None = None
+
+    def __init__(self, retention: float = 3600, max_jobs: int = 10_000) -> None:
+        self.retention = retention
+        self.max_jobs = max_jobs
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._active: dict[str, str] = {}  # key -> job id
+
+    async def create_or_get(self, key: str, owner: str, payload: dict[str, Any]) -> tuple[Job, bool]:
+        existing = self._active.get(key)
+        if existing is not None and existing in self._jobs:
+            return self._jobs[existing], False
+        job = Job(id=uuid.uuid4().hex, key=key, owner=owner, payload=payload)
+        self._jobs[job.id] = job
+        self._active[key] = job.id
+        self._prune()
+        return job, True
+
+    async def get(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    async def claim(self, job_id: str) -> Job | None:
+        job = self._jobs.get(job_id)
+        if job is None or job.status != QUEUED:
+            return None
+        job.status = RUNNING
+        job.updated_at = time.time()
+        return job
+
+    async def save(self, job: Job) -> None:
+        job.updated_at = time.time()
+        self._jobs[job.id] = job
+        if job.status not in ACTIVE_STATUSES and self._active.get(job.key) == job.id:
+            del self._active[job.key]
+
+    async def renew(self, job_id: str) -> bool:
+        return True
+
+    async def pending(self) -> list[str]:
+        return [j.id for j in self._jobs.values() if j.status in ACTIVE_STATUSES]
+
+    def _prune(self) -> None:
+        # Drop finished jobs past retention, and the oldest finished ones
+        # whenever the store is over its size bound
+        cutoff = time.time() - self.retention
+        over = len(self._jobs) - self.max_jobs
+        for job_id, job in list(self._jobs.items()):
+            if job.status in ACTIVE_STATUSES:
+                continue
+            if over > 0 or job.updated_at < cutoff:
+                del self._jobs[job_id]
+                over -= 1
+
+
+class SQLiteJobStore:
+    """Durable job store in a local SQLite file.
+
+    Queries are tiny, but still run in a thread so they never block the loop.
+    A running job's row holds a lease (``lease_owner``, ``lease_expires``)
+    that its runner renews every ``lease_seconds / 3``.
+    """
+
+    def __init__(self, path: str, retention: float = 24 * 3600, lease_seconds: float = 30.0) -> None:
+        self.path = path
+        self.retention = retention
+        self.lease_seconds = lease_seconds
+        # Unique per store instance, so two workers never mistake each other's leases
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = asyncio.Lock()
+        conn = self._connect()
+        try:
+            conn.execute(
+                """
+                create table if not exists jobs (
+                  id text primary key,
+                  key text not null,
+                  owner text not null,
+                  payload text not null,
+                  status text not null,
+                  result text,
+                  error text,
+                  attempts integer not null default 0,
+                  created_at real not null,
+                  updated_at real not null,
+                  lease_owner text,
+                  lease_expires real
+                )
+                """
+            )
+            # Files created before leases existed get the columns added
+            columns = {row["name"] for row in conn.execute("pragma table_info(jobs)")}
+            for column, kind in (("lease_owner", "text"), ("lease_expires", "real")):
+                if column not in columns:
+                    conn.execute(f"alter table jobs add column {column} {kind}")
+            conn.execute("create index if not exists jobs_key_status on jobs (key, status)")
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute("pragma journal_mode=wal")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> Job:
+        return Job(
+            id=row["id"],
+            key=row["key"],
+            owner=row["owner"],
+            payload=json.loads(row["payload"]),
+            status=row["status"],
+            result=json.loads(row["result"]) if row["result"] is not None else None,
+            error=row["error"],
+            attempts=row["attempts"],
+            created_at=row["created_at"],
+            updated_at=row["updated_at"],
+        )
+
+    async def _run(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        def work() -> Any:
+            conn = self._connect()
+            try:
+                return fn(conn)
+            finally:
+                conn.close()
+
+        async with self._lock:
+            return await asyncio.to_thread(work)
+
+    async def create_or_get(self, key: str, owner: str, payload: dict[str, Any]) -> tuple[Job, bool]:
+        def fn(conn: sqlite3.Connection) -> tuple[Job, bool]:
+            conn.execute("begin immediate")  # serialize with other processes
+            try:
+                row = conn.execute(
+                    "select * from jobs where key = ? and status in (?, ?) limit 1", (key, *ACTIVE_STATUSES)
+                ).fetchone()
+                if row is not None:
+                    conn.execute("commit")
+                    return self._to_job(row), False
+                job = Job(id=uuid.uuid4().hex, key=key, owner=owner, payload=payload)
+                conn.execute(
+                    "insert into jobs (id, key, owner, payload, status, attempts, created_at, updated_at)"
+                    " values (?, ?, ?, ?, ?, 0, ?, ?)",
+                    (job.id, key, owner, json.dumps(payload), QUEUED, job.created_at, job.updated_at),
+                )
+                conn.execute(
+                    "delete from jobs where status not in (?, ?) and updated_at < ?",
+                    (*ACTIVE_STATUSES, time.time() - self.retention),
+                )
+                conn.execute("commit")
+                return job, True
+            except BaseException:
+                conn.execute("rollback")
+                raise
+
+        return await self._run(fn)
+
+    async def get(self, job_id: str) -> Job | None:
+        row = await self._run(lambda c: c.execute("select * from jobs where id = ?", (job_id,)).fetchone())
+        return self._to_job(row) if row is not None else None
+
+    async def claim(self, job_id: str) -> Job | None:
+        def fn(conn: sqlite3.Connection) -> sqlite3.Row | None:
+            # Atomic: only one worker (in any process) can flip queued -> running,
+            # and it takes the lease in the same statement
+            now = time.time()
+            cur = conn.execute(
+                "update jobs set status = ?, updated_at = ?, lease_owner = ?, lease_expires = ?"
+                " where id = ? and status = ?",
+                (RUNNING, now, self.worker_id, now + self.lease_seconds, job_id, QUEUED),
+            )
+            if cur.rowcount != 1:
+                return None
+            return conn.execute("select * from jobs where id = ?", (job_id,)).fetchone()
+
+        row = await self._run(fn)
+        return self._to_job(row) if row is not None else None
+
+    async def save(self, job: Job) -> None:
+        job.updated_at = time.time()
+        await self._run(
+            lambda c: c.execute(
+                "update jobs set status = ?, result = ?, error = ?, attempts = ?, updated_at = ?,"
+                " lease_owner = null, lease_expires = null where id = ?",
+                (
+                    job.status,
+                    json.dumps(job.result) if job.result is not None else None,
+                    job.error,
+                    job.attempts,
+                    job.updated_at,
+                    job.id,
+                ),
+            )
+        )
+
+    async def renew(self, job_id: str) -> bool:
+        """Extend our lease on a running job; ``False`` if it is no longer ours."""
+        renewed = await self._run(
+            lambda c: c.execute(
+                "update jobs set lease_expires = ? where id = ? and status = ? and lease_owner = ?",
+                (time.time() + self.lease_seconds, job_id, RUNNING, self.worker_id),
+            ).rowcount
+        )
+        return renewed == 1
+
+    async def pending(self) -> list[str]:
+        def fn(conn: sqlite3.Connection) -> list[str]:
+            # Only jobs whose lease ran out (their process died) go back to the
+            # queue; another worker may still be running the others
+            conn.execute(
+                "update jobs set status = ?, lease_owner = null, lease_expires = null"
+                " where status = ? and (lease_expires is null or lease_expires < ?)",
+                (QUEUED, RUNNING, time.time()),
+            )
+            rows = conn.execute("select id from jobs where status = ? order by created_at", (QUEUED,))
+            return [r["id"] for r in rows]
+
+        return await self._run(fn)
+
+
+class JobRunner:
+    """Runs jobs from a store on a fixed pool of asyncio worker tasks."""
+
+    def __init__(
+        self,
+        store: Any,
+        handler: Handler,
+        fallback: Fallback,
+        workers: int = 4,
+        deadline: float = 30.0,
+        max_attempts: int = 3,
+        backoff: float = 0.5,
+    ) -> None:
+        self.store = store
+        self.handler = handler
+        self.fallback = fallback
+        self.workers = workers
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """Start the workers and re-queue any unfinished jobs from the store."""
+        if self._tasks:
+            return
+        for job_id in await self.store.pending():
+            self._queue.put_nowait(job_id)
+        self._tasks = [asyncio.create_task(self._worker(), name=f"job-worker-{i}") for i in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Cancel the workers (unfinished jobs stay queued in durable stores)."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, key: str, owner: str, payload: dict[str, Any]) -> Job:
+        """Queue a job, or return the in-flight job with the same ``key``."""
+        job, created = await self.store.create_or_get(key, owner, payload)
+        if created:
+            self._queue.put_nowait(job.id)
+        return job
+
+    async def get(self, job_id: str) -> Job | None:
+        return await self.store.get(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                job = await self.store.claim(job_id)
+                if job is not None:
+                    await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa: BLE001 - a broken job must not kill the worker
+                logger.exception("Job %s crashed", job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _heartbeat(self, job: Job, interval: float) -> None:
+        # Keep the lease alive while the job runs
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await self.store.renew(job.id):
+                    logger.warning("Lost the lease on job %s", job.id)
+                    return
+            except Exception:  # noqa: BLE001 - try again on the next beat
+                logger.exception("Could not renew the lease on job %s", job.id)
+
+    async def _run(self, job: Job) -> None:
+        heartbeat = None
+        if self.store.lease_seconds:
+            heartbeat = asyncio.create_task(self._heartbeat(job, self.store.lease_seconds / 3))
+        try:
+            await self._attempt(job)
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+        await self.store.save(job)
+
+    async def _attempt(self, job: Job) -> None:
+        deadline_at = time.monotonic() + self.deadline
+        while True:
+            job.attempts += 1
+            remaining = deadline_at - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise TimeoutError
+                job.result = await asyncio.wait_for(self.handler(job.payload), timeout=remaining)
+                job.status, job.error = SUCCEEDED, None
+                break
+            except TimeoutError:
+                # Out of time: answer with the fallback instead of an error
+                job.result = self.fallback(job.payload)
+                job.status, job.error = SUCCEEDED, "deadline exceeded; fallback result"
+                break
+            except Exception as exc:  # noqa: BLE001
+                job.error = str(exc)
+                if job.attempts >= self.max_attempts:
+                    job.status = FAILED
+                    break
+                # Exponential backoff with jitter, never past the deadline
+                delay = self.backoff * (2 ** (job.attempts - 1)) * (0.5 + random.random())
+                await asyncio.sleep(max(0.0, min(delay, deadline_at - time.monotonic())))
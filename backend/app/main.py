@@ -10,17 +10,56 @@ If you're new:
 - "Router" is how we group endpoints. We include all v1 routes below.
 """
 # app/main.py
-import os
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+import asyncio
+from contextlib import asynccontextmanager
+
 from dotenv import load_dotenv
+from fastapi import FastAPI, Response
+from fastapi.middleware.cors import CORSMiddleware
 
 # Load .env at startup (local dev). In production (Render), env comes from dashboard.
 load_dotenv()
 
 from app.api.v1 import api_router  # after load_dotenv to ensure env is ready
+from app.core.compression import CompressionMiddleware
+from app.core.config import get_settings
+from app.core.deadlines import DeadlineMiddleware
+from app.core.metrics import MetricsMiddleware, render_metrics
+from app.core.profiling import ProfilingMiddleware, install_task_factory
+from app.core.responses import FastJSONResponse, NegotiationMiddleware
+from app.jobs.insight_jobs import shutdown_insight_runner
+from app.services.cache import close_caches
+from app.services.ratelimit import close_rate_limiter
+from app.services.registry import get_registry
+from app.services.resilience import degraded, upstream_stats
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs once at startup (before yield) and once at shutdown (after yield)
+    registry = get_registry()
+    # Open Supabase/OpenAI connections in the background: the port is bound
+    # right away, and the first request finds warm connections
+    registry.start_warmup()
+    # Profiled requests also sample the tasks they start (only when profiling is on)
+    if settings.PROFILING_ENABLED:
+        install_task_factory(asyncio.get_running_loop())
+    yield
+    # Stop background workers, then close every client cleanly
+    await shutdown_insight_runner()
+    await close_caches()
+    await close_rate_limiter()
+    await registry.aclose()
 
-app = FastAPI(title="Peptide API", version="1.0.0")
+
+# Route return values are serialized with orjson (or MessagePack on request)
+app = FastAPI(
+    title="Peptide API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
+settings = get_settings()
 
 # CORS: allow your Expo dev URL and local hosts so the app can call this API
 ALLOWED_ORIGINS = [
@@ -36,14 +75,54 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Wire format: MessagePack for clients that ask for it, and gzip/brotli for
+# larger bodies, streamed exports included (see app/core/compression.py)
+if settings.RESPONSE_MSGPACK_ENABLED:
+    app.add_middleware(NegotiationMiddleware)
+if settings.RESPONSE_COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.RESPONSE_COMPRESSION_MIN_BYTES,
+        gzip_level=settings.RESPONSE_GZIP_LEVEL,
+        brotli_quality=settings.RESPONSE_BROTLI_QUALITY,
+    )
+# Per-request deadline shared by every upstream call (app/core/deadlines.py)
+if settings.REQUEST_DEADLINE_SECONDS > 0:
+    app.add_middleware(DeadlineMiddleware, seconds=settings.REQUEST_DEADLINE_SECONDS)
+# Request count/latency/in-flight per route for /metrics (added last so it
+# wraps everything, including CORS preflights)
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+# Opt-in profiling of requests picked by admin header or sampling (outermost,
+# so its Server-Timing total covers every other middleware); when off it is
+# not installed at all (app/core/profiling.py)
+if settings.PROFILING_ENABLED:
+    app.add_middleware(
+        ProfilingMiddleware,
+        admin_token=settings.PROFILING_ADMIN_TOKEN,
+        sample_rate=settings.PROFILING_SAMPLE_RATE,
+        interval_ms=settings.PROFILING_INTERVAL_MS,
+        max_concurrent=settings.PROFILING_MAX_CONCURRENT,
+        directory=settings.PROFILING_DIR,
+        max_profiles=settings.PROFILING_MAX_PROFILES,
+    )
 
 # Expose /health at the root AND under /api/v1 if you want both:
 # Small built-in health endpoint at the root for quick checks
 @app.get("/health")
 def root_health():
     # 1) If this handler runs, the app is alive
-    # 2) Return a tiny JSON payload used by uptime checks
-    return {"ok": True, "service": "fastapi"}
+    # 2) Return a tiny JSON payload used by uptime checks, with each upstream's
+    #    circuit breaker state ("open" = failing fast; details in /api/v1/health)
+    breakers = {name: u["breaker"]["state"] for name, u in upstream_stats().items()}
+    return {"ok": True, "service": "fastapi", "status": "degraded" if degraded() else "ok", "breakers": breakers}
+
+
+# Prometheus scrape endpoint (text format); see app/core/metrics.py
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 # Mount all versioned routes at /api/v1 (see app/api/v1)
 app.include_router(api_router, prefix="/api/v1")
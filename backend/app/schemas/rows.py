@@ -0,0 +1,109 @@
+"""Typed shapes of the database rows returned by the repository layer.
+
+These are ``TypedDict``s rather than Pydantic models: rows stay plain dicts
+(cheap to build and serialize), but editors and type checkers still know
+which keys exist. ``total=False`` because queries often select a subset of
+columns.
+"""
+from typing import Any, TypedDict
+
+
+class TrackingRow(TypedDict, total=False):
+    id: str
+    user_id: str
+    created_at: str
+    weight_lbs: float | None
+    waist_in: float | None
+    bp_am: str | None
+    bp_pm: str | None
+    body_fat_pct: float | None
+    muscle_mass_pct: float | None
+    resting_hr_bpm: float | None
+    energy: float | None
+    appetite: float | None
+    performance: float | None
+    peptide1_id: str | None
+    peptide2_id: str | None
+    peptide3_id: str | None
+    notes: str | None
+    updated_at: str
+
+
+class InsightRow(TypedDict, total=False):
+    id: str
+    user_id: str
+    created_at: str
+    summary: dict[str, Any]
+    tips: list[Any]
+
+
+class ProfileRow(TypedDict, total=False):
+    id: str
+    email: str | None
+    created_at: str
+
+
+class PeptideRow(TypedDict, total=False):
+    id: str
+    user_id: str
+    name: str
+    units_remaining: float | None
+    units_per_dose: float | None
+    expires_on: str | None
+    created_at: str
+    updated_at: str
+
+
+class RollupRow(TypedDict, total=False):
+    user_id: str
+    period: str  # "day" or "week"
+    bucket_start: str  # ISO date (Monday for weeks)
+    entries: int
+    metrics: dict[str, dict[str, float]]
+    updated_at: str
+
+
+class RollupWatermarkRow(TypedDict, total=False):
+    user_id: str
+    last_updated_at: str
+    last_id: str
+    rebuilt_at: str
+    updated_at: str
+
+
+class ForecastRow(TypedDict, total=False):
+    peptide_id: str
+    user_id: str
+    computed_at: str
+    doses_per_day: float
+    units_per_dose: float | None
+    units_per_dose_source: str | None  # "configured", "estimated" or None
+    days_left: float | None
+    depletion_date: str | None
+    expiry_waste_units: float | None
+    status: str
+    snapshot_units: float | None
+    snapshot_at: str | None
+
+
+class ForecastWatermarkRow(TypedDict, total=False):
+    source: str  # table name
+    last_updated_at: str
+    last_id: str
+
+
+class ScheduleRow(TypedDict, total=False):
+    id: str
+    user_id: str
+    peptide_id: str | None
+    title: str
+    freq: str  # "daily" or "weekly"
+    interval: int  # every N days / weeks
+    weekdays: list[int] | None  # ISO weekdays (1 = Monday) for weekly rules
+    times: list[str]  # local "HH:MM"
+    timezone: str  # IANA name, e.g. "Europe/Berlin"
+    starts_on: str  # ISO date
+    until: str | None  # ISO date, inclusive
+    active: bool
+    created_at: str
+    updated_at: str
@@ -0,0 +1,84 @@
+"""Request model for dose schedules (``POST /api/v1/schedules``).
+
+A schedule is a compact recurrence rule, not a list of events: "every 2
+days at 08:00", or "Mondays and Thursdays at 08:00 and 20:00, every other
+week". Times are local to ``timezone`` so reminders stay at 08:00 across
+daylight-saving changes. ``app.services.schedules`` expands rules into
+concrete dose times on demand.
+"""
+import uuid
+from datetime import date, time
+from typing import Literal
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+
+from app.schemas.rows import ScheduleRow
+
+
+class ScheduleIn(BaseModel):
+    """One recurrence rule as sent by a client."""
+
+    model_config = ConfigDict(extra="forbid")
+
+    title: str = Field(min_length=1, max_length=200)
+    peptide_id: uuid.UUID | None = None
+    freq: Literal["daily", "weekly"] = "daily"
+    interval: int = Field(default=1, ge=1, le=365)
+    # ISO weekdays (1 = Monday .. 7 = Sunday); weekly rules default to the
+    # weekday of ``starts_on``
+    weekdays: list[int] | None = Field(default=None, min_length=1, max_length=7)
+    times: list[time] = Field(min_length=1, max_length=24)
+    timezone: str = "UTC"
+    starts_on: date
+    until: date | None = None
+
+    @field_validator("weekdays")
+    @classmethod
+    def _check_weekdays(cls, value: list[int] | None) -> list[int] | None:
+        if value is None:
+            return None
+        if any(not 1 <= d <= 7 for d in value):
+            raise ValueError("weekdays are ISO numbers: 1 (Monday) to 7 (Sunday)")
+        return sorted(set(value))
+
+    @field_validator("times")
+    @classmethod
+    def _check_times(cls, value: list[time]) -> list[time]:
+        # Minute precision, no offsets: the rule's timezone applies
+        return sorted({t.replace(second=0, microsecond=0, tzinfo=None) for t in value})
+
+    @field_validator("timezone")
+    @classmethod
+    def _check_timezone(cls, value: str) -> str:
+        try:
+            ZoneInfo(value)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"unknown timezone {value!r}") from None
+        return value
+
+    @model_validator(mode="after")
+    def _check_rule(self) -> "ScheduleIn":
+        if self.until is not None and self.until < self.starts_on:
+            raise ValueError("until must not be before starts_on")
+        if self.freq == "daily" and self.weekdays is not None:
+            raise ValueError("weekdays only apply to weekly schedules")
+        if self.freq == "weekly" and self.weekdays is None:
+            self.weekdays = [self.starts_on.isoweekday()]
+        return self
+
+    def to_row(self, user_id: str) -> ScheduleRow:
+        return ScheduleRow(
+            id=str(uuid.uuid4()),
+            user_id=user_id,
+            peptide_id=str(self.peptide_id) if self.peptide_id else None,
+            title=self.title,
+            freq=self.freq,
+            interval=self.interval,
+            weekdays=self.weekdays,
+            times=[t.strftime("%H:%M") for t in self.times],
+            timezone=self.timezone,
+            starts_on=self.starts_on.isoformat(),
+            until=self.until.isoformat() if self.until else None,
+            active=True,
+        )
@@ -0,0 +1,62 @@
+"""Request models for writing ``daily_tracking`` rows.
+
+Used by the bulk ingest endpoint (``POST /api/v1/tracking/bulk``). The
+owner (``user_id``) always comes from the caller's token, never the body.
+
+Every row gets a *deterministic* id derived from the user and an
+idempotency key, so sending the same row twice (a retry, or re-syncing an
+offline queue) updates it instead of creating a duplicate.
+"""
+import uuid
+from datetime import UTC, datetime
+
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+from app.schemas.rows import TrackingRow
+
+# Fixed namespace for uuid5 row ids (never change it: ids would no longer match)
+TRACKING_ID_NAMESPACE = uuid.UUID("8e9df015-e892-480d-ac7c-b5233edf9373")
+
+
+class TrackingIn(BaseModel):
+    """One daily tracking entry as sent by a client."""
+
+    model_config = ConfigDict(extra="forbid")
+
+    # Client-chosen key that identifies this entry across retries (e.g. the
+    # id of the entry in the app's offline queue). Defaults to ``created_at``.
+    idempotency_key: str | None = Field(default=None, min_length=1, max_length=200)
+    created_at: datetime
+    # Accepted so rows copied from the app still validate; must be the caller
+    user_id: uuid.UUID | None = None
+
+    weight_lbs: float | None = Field(default=None, ge=0, le=2000)
+    waist_in: float | None = Field(default=None, ge=0, le=200)
+    bp_am: str | None = Field(default=None, max_length=20)
+    bp_pm: str | None = Field(default=None, max_length=20)
+    body_fat_pct: float | None = Field(default=None, ge=0, le=100)
+    muscle_mass_pct: float | None = Field(default=None, ge=0, le=100)
+    resting_hr_bpm: float | None = Field(default=None, ge=0, le=300)
+    energy: float | None = Field(default=None, ge=0, le=10)
+    appetite: float | None = Field(default=None, ge=0, le=10)
+    performance: float | None = Field(default=None, ge=0, le=10)
+    peptide1_id: uuid.UUID | None = None
+    peptide2_id: uuid.UUID | None = None
+    peptide3_id: uuid.UUID | None = None
+    notes: str | None = Field(default=None, max_length=2000)
+
+    @field_validator("created_at")
+    @classmethod
+    def _assume_utc(cls, value: datetime) -> datetime:
+        # Naive timestamps are taken as UTC (Postgres would use the server zone)
+        return value if value.tzinfo is not None else value.replace(tzinfo=UTC)
+
+    def row_id(self, user_id: str) -> str:
+        """Deterministic row id: the same user + key always maps to the same id."""
+        key = self.idempotency_key or f"created_at:{self.created_at.astimezone(UTC).isoformat()}"
+        return str(uuid.uuid5(TRACKING_ID_NAMESPACE, f"{user_id}:{key}"))
+
+    def to_row(self, user_id: str) -> TrackingRow:
+        """Database row with every column present (bulk upserts need equal keys)."""
+        data = self.model_dump(mode="json", exclude={"idempotency_key", "user_id"})
+        return TrackingRow(id=self.row_id(user_id), user_id=user_id, **data)  # type: ignore[typeddict-item]
@@ -0,0 +1,334 @@
+"""Time-series analytics over a user's ``daily_tracking`` rows, with NumPy.
+
+Used by ``GET /api/v1/analytics``. For a date range it reports, per metric:
+
+- count, mean, min, max
+- the linear trend (least-squares slope, units per day)
+- this week vs the week before (``week_over_week``)
+- daily means and a trailing rolling mean (for charts)
+
+and, per peptide, every metric's mean on the days it was logged vs the
+days it was not.
+
+If you're new:
+- Rows are turned into *column arrays* once: one float matrix (rows x
+  metrics, ``NaN`` = missing), one timestamp array and one peptide-id
+  matrix. Every statistic is then a handful of whole-array operations
+  instead of Python loops, so a year of data takes a few milliseconds.
+- ``bp_am``/``bp_pm`` are strings like ``"120/80"``; they are parsed into
+  systolic and diastolic columns (anything unparseable becomes ``NaN``).
+- Column sets are kept per user in the ``analytics`` cache, always in
+  process memory (they are NumPy arrays). Like rollups, a watermark
+  remembers the last ``(updated_at, id)`` loaded, so a request only fetches
+  rows written since then and merges them in. It stays
+  ``SYNC_SETTLE_SECONDS`` behind now, so rows committed late are not skipped
+  (recent rows are read again and replace themselves by id).
+- Deletes are not seen until the cache entry expires. The expiry is set
+  once, on the cold load, and merges keep it, so a deleted row is gone at
+  most ``ANALYTICS_CACHE_TTL_SECONDS`` later even for a user who writes
+  every few minutes.
+"""
+import asyncio
+import time
+import weakref
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import UTC, date, datetime, timedelta
+from typing import Any
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.services.cache import Cache, get_cache
+from app.services.repository import Cursor, Repositories, settled_cursor
+from app.services.rollups import ROLLUP_METRICS
+
+BP_COLUMNS = ("bp_am", "bp_pm")
+PEPTIDE_COLUMNS = ("peptide1_id", "peptide2_id", "peptide3_id")
+# Every analysed metric, in column order of ``ColumnSet.values``
+METRICS = (
+    *ROLLUP_METRICS,
+    "bp_am_systolic",
+    "bp_am_diastolic",
+    "bp_pm_systolic",
+    "bp_pm_diastolic",
+)
+LOAD_COLUMNS = ("id", "created_at", "updated_at", *ROLLUP_METRICS, *BP_COLUMNS, *PEPTIDE_COLUMNS)
+
+DAY_SECONDS = 86_400
+DECIMALS = 3
+
+
+def parse_bp(values: Sequence[str | None]) -> tuple[np.ndarray, np.ndarray]:
+    """Parse ``"120/80"`` strings into (systolic, diastolic) float arrays.
+
+    Whitespace around the numbers is allowed; anything else (missing,
+    ``"120"``, ``"abc/80"``, implausible values) becomes ``NaN``.
+    """
+    text = np.char.strip(np.array([v or "" for v in values], dtype=str))
+    parts = np.char.partition(text, "/") if text.size else np.empty((0, 3), dtype=str)
+    high, low = np.char.strip(parts[:, 0]), np.char.strip(parts[:, 2])
+    valid = (parts[:, 1] == "/") & np.char.isdigit(high) & np.char.isdigit(low)
+    systolic = np.where(valid, high, "nan").astype(np.float64)
+    diastolic = np.where(valid, low, "nan").astype(np.float64)
+    plausible = (systolic >= 50) & (systolic <= 300) & (diastolic >= 20) & (diastolic <= 200)
+    systolic[~plausible] = np.nan
+    diastolic[~plausible] = np.nan
+    return systolic, diastolic
+
+
+def _timestamp(value: str) -> float:
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=UTC)
+    return dt.timestamp()
+
+
+@dataclass(frozen=True)
+class ColumnSet:
+    """One user's tracking rows as NumPy columns, sorted by ``created_at``."""
+
+    ids: np.ndarray  # row ids (object)
+    timestamps: np.ndarray  # created_at, Unix seconds (float64)
+    values: np.ndarray  # rows x METRICS (float64, NaN = missing)
+    peptides: np.ndarray  # rows x 3 peptide ids (object, None = empty)
+    watermark: Cursor | None = None  # last (updated_at, id) loaded
+    loaded_at: float = 0.0  # time of the full (cold) load, kept by merges
+
+    @classmethod
+    def from_rows(
+        cls, rows: Sequence[dict[str, Any]], watermark: Cursor | None = None, loaded_at: float = 0.0
+    ) -> "ColumnSet":
+        n = len(rows)
+        numeric = np.array([[r.get(m) for m in ROLLUP_METRICS] for r in rows], dtype=np.float64)
+        blood_pressure = [np.column_stack(parse_bp([r.get(c) for r in rows])) for c in BP_COLUMNS]
+        values = np.hstack([numeric.reshape(n, len(ROLLUP_METRICS)), *blood_pressure])
+        peptides = np.array([[r.get(c) for c in PEPTIDE_COLUMNS] for r in rows], dtype=object)
+        columns = cls(
+            ids=np.array([r["id"] for r in rows], dtype=object),
+            timestamps=np.fromiter((_timestamp(r["created_at"]) for r in rows), dtype=np.float64, count=n),
+            values=values,
+            peptides=peptides.reshape(n, len(PEPTIDE_COLUMNS)),
+            watermark=watermark,
+            loaded_at=loaded_at,
+        )
+        return columns.sorted()
+
+    def sorted(self) -> "ColumnSet":
+        order = np.argsort(self.timestamps, kind="stable")
+        return ColumnSet(
+            self.ids[order],
+            self.timestamps[order],
+            self.values[order],
+            self.peptides[order],
+            self.watermark,
+            self.loaded_at,
+        )
+
+    def merge(self, newer: "ColumnSet") -> "ColumnSet":
+        """Rows of ``newer`` replace rows with the same id; the rest are added."""
+        keep = ~np.isin(self.ids, newer.ids)
+        merged = ColumnSet(
+            np.concatenate([self.ids[keep], newer.ids]),
+            np.concatenate([self.timestamps[keep], newer.timestamps]),
+            np.vstack([self.values[keep], newer.values]),
+            np.vstack([self.peptides[keep], newer.peptides]),
+            newer.watermark or self.watermark,
+            self.loaded_at,
+        )
+        return merged.sorted()
+
+
+def _rounded(values: np.ndarray) -> np.ndarray:
+    return np.round(values, DECIMALS)
+
+
+def _scalar(value: Any) -> float | None:
+    number = float(value)
+    return None if np.isnan(number) else round(number, DECIMALS)
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    return np.divide(numerator, denominator, out=np.full(np.shape(numerator), np.nan), where=denominator > 0)
+
+
+def analyze(
+    columns: ColumnSet, start: datetime, end: datetime, window: int = 7, series: bool = True
+) -> dict[str, Any]:
+    """All statistics for rows with ``start <= created_at <= end``.
+
+    Pure and synchronous: everything below is whole-array NumPy work.
+    ``NaN`` in the arrays (``null`` in JSON) means "no data".
+    """
+    start_ts, end_ts = start.timestamp(), end.timestamp()
+    # 1) Slice the range out of the sorted columns
+    lo = np.searchsorted(columns.timestamps, start_ts, side="left")
+    hi = np.searchsorted(columns.timestamps, end_ts, side="right")
+    ts = columns.timestamps[lo:hi]
+    values = columns.values[lo:hi]
+    peptides = columns.peptides[lo:hi]
+    present = ~np.isnan(values)
+    filled = np.where(present, values, 0.0)
+
+    # 2) Per-day sums and counts (rows are sorted, so each day is a contiguous run)
+    first_day = int(start_ts // DAY_SECONDS)
+    n_days = int(end_ts // DAY_SECONDS) - first_day + 1
+    day_sums = np.zeros((n_days, len(METRICS)))
+    day_counts = np.zeros((n_days, len(METRICS)))
+    if ts.size:
+        days, run_starts = np.unique((ts // DAY_SECONDS).astype(np.int64) - first_day, return_index=True)
+        day_sums[days] = np.add.reduceat(filled, run_starts, axis=0)
+        day_counts[days] = np.add.reduceat(present.astype(np.float64), run_starts, axis=0)
+
+    # 3) Trailing rolling mean over ``window`` days, from cumulative sums
+    cum_sums = np.vstack([np.zeros(len(METRICS)), np.cumsum(day_sums, axis=0)])
+    cum_counts = np.vstack([np.zeros(len(METRICS)), np.cumsum(day_counts, axis=0)])
+    back = np.maximum(np.arange(1, n_days + 1) - window, 0)
+    rolling = _ratio(cum_sums[1:] - cum_sums[back], cum_counts[1:] - cum_counts[back])
+
+    # 4) Least-squares slope per metric (x = days since start)
+    x = ((ts - start_ts) / DAY_SECONDS)[:, None]
+    n = present.sum(axis=0)
+    sum_x, sum_y = (x * present).sum(axis=0), filled.sum(axis=0)
+    sum_xx, sum_xy = (x * x * present).sum(axis=0), (x * filled).sum(axis=0)
+    denominator = n * sum_xx - sum_x * sum_x
+    slope = _ratio(n * sum_xy - sum_x * sum_y, np.where(n >= 2, denominator, 0.0))
+
+    # 5) Week over week: the last 7 days of the range vs the 7 before
+    current = _ratio(day_sums[-7:].sum(axis=0), day_counts[-7:].sum(axis=0))
+    previous = _ratio(day_sums[-14:-7].sum(axis=0), day_counts[-14:-7].sum(axis=0))
+    change = current - previous
+    change_pct = _ratio(change * 100.0, np.abs(previous))
+
+    minimum = np.where(n > 0, np.min(np.where(present, values, np.inf), axis=0, initial=np.inf), np.nan)
+    maximum = np.where(n > 0, np.max(np.where(present, values, -np.inf), axis=0, initial=-np.inf), np.nan)
+    mean = _ratio(sum_y, n)
+    daily = _ratio(day_sums, day_counts)
+
+    metrics: dict[str, Any] = {}
+    for i, name in enumerate(METRICS):
+        entry: dict[str, Any] = {
+            "n": int(n[i]),
+            "mean": _scalar(mean[i]),
+            "min": _scalar(minimum[i]),
+            "max": _scalar(maximum[i]),
+            "slope_per_day": None if np.isnan(slope[i]) else round(float(slope[i]), 5),
+            "week_over_week": {
+                "current": _scalar(current[i]),
+                "previous": _scalar(previous[i]),
+                "change": _scalar(change[i]),
+                "change_pct": _scalar(change_pct[i]),
+            },
+        }
+        if series:
+            entry["daily"] = _rounded(daily[:, i])
+            entry["rolling_mean"] = _rounded(rolling[:, i])
+        metrics[name] = entry
+
+    result: dict[str, Any] = {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "entries": int(ts.size),
+        "window_days": window,
+        "metrics": metrics,
+        "peptides": _peptide_effects(peptides, values, present, filled),
+    }
+    if series:
+        first = date(1970, 1, 1) + timedelta(days=first_day)
+        result["dates"] = [(first + timedelta(days=d)).isoformat() for d in range(n_days)]
+    return result
+
+
+def _peptide_effects(
+    peptides: np.ndarray, values: np.ndarray, present: np.ndarray, filled: np.ndarray
+) -> list[dict[str, Any]]:
+    """Per peptide: each metric's mean on entries that logged it vs the rest."""
+    slots = peptides != None  # noqa: E711 - element-wise comparison
+    if not slots.any():
+        return []
+    # 1) One-hot matrix: rows x peptides, True when the row logged that peptide
+    codes_of_ids, codes = np.unique(peptides[slots].astype(str), return_inverse=True)
+    on = np.zeros((len(values), len(codes_of_ids)), dtype=np.float64)
+    on[np.nonzero(slots)[0], codes] = 1.0
+    # 2) Sums and counts for every (peptide, metric) pair in two matrix products
+    on_sums, on_counts = on.T @ filled, on.T @ present
+    off_sums, off_counts = filled.sum(axis=0) - on_sums, present.sum(axis=0) - on_counts
+    on_mean, off_mean = _ratio(on_sums, on_counts), _ratio(off_sums, off_counts)
+    entries_on = (on > 0).sum(axis=0)
+
+    effects: list[dict[str, Any]] = []
+    for p, peptide_id in enumerate(codes_of_ids):
+        effects.append(
+            {
+                "peptide_id": str(peptide_id),
+                "entries_on": int(entries_on[p]),
+                "entries_off": int(len(values) - entries_on[p]),
+                "metrics": {
+                    name: {
+                        "on": _scalar(on_mean[p, i]),
+                        "off": _scalar(off_mean[p, i]),
+                        "difference": _scalar(on_mean[p, i] - off_mean[p, i]),
+                    }
+                    for i, name in enumerate(METRICS)
+                },
+            }
+        )
+    return effects
+
+
+_load_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def get_column_cache() -> Cache[ColumnSet]:
+    """Return the per-user column cache (kept in this process: values are arrays)."""
+    return get_cache("analytics", get_settings().ANALYTICS_CACHE_SIZE, shared=False)
+
+
+class AnalyticsService:
+    """Loads (and caches) per-user column sets and analyses date ranges."""
+
+    def __init__(self, repos: Repositories, page_size: int = 1000) -> None:
+        self.repos = repos
+        self.page_size = page_size
+
+    async def columns(self, user_id: str) -> ColumnSet:
+        """The user's columns, brought up to date with rows written since the last load."""
+        cache = get_column_cache()
+        lock = _load_locks.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            cached = await cache.get(user_id)
+            # 1) Read rows written after the watermark (everything on a cold cache)
+            rows: list[dict[str, Any]] = []
+            async for page in self.repos.tracking.iter_pages(
+                user_id,
+                None,
+                None,
+                columns=LOAD_COLUMNS,
+                page_size=self.page_size,
+                after=cached.watermark if cached else None,
+                key="updated_at",
+            ):
+                rows.extend(page)  # type: ignore[arg-type]
+            if cached is not None and not rows:
+                return cached
+            # 2) Columnize the new rows and merge them into the cached set; the
+            #    watermark goes no further than the settle line
+            settings = get_settings()
+            watermark = (
+                settled_cursor((rows[-1]["updated_at"], rows[-1]["id"]), settings.SYNC_SETTLE_SECONDS)
+                if rows
+                else None
+            )
+            fresh = ColumnSet.from_rows(rows, watermark, loaded_at=time.time())
+            columns = cached.merge(fresh) if cached is not None else fresh
+            # The expiry stays anchored to the cold load: pushing it forward on
+            # every merge would keep deleted rows forever for active users
+            await cache.set(user_id, columns, columns.loaded_at + settings.ANALYTICS_CACHE_TTL_SECONDS)
+            return columns
+
+    async def analyze(
+        self, user_id: str, start: datetime, end: datetime, window: int = 7, series: bool = True
+    ) -> dict[str, Any]:
+        """Load the user's columns, then compute every statistic for the range."""
+        columns = await self.columns(user_id)
+        return analyze(columns, start, end, window=window, series=series)
@@ -0,0 +1,480 @@
+"""Caches with TTL and a size bound, shareable between worker processes.
+
+Every cache in the backend (verified tokens, insight answers, ...) goes
+through ``get_cache(name, maxsize)``. Where entries live is one setting,
+``CACHE_BACKEND``:
+
+- ``memory`` (default): a dictionary in each process (``app.utils.lru``).
+  Fastest, but every uvicorn worker keeps its own, cold, copy.
+- ``sqlite``: one local file (``CACHE_SQLITE_PATH``) shared by every worker
+  on the host. WAL mode and a memory-mapped file keep reads cheap.
+- ``redis``: a Redis (or compatible) server at ``CACHE_REDIS_URL``, shared by
+  every host. Size bounds are the server's job (``maxmemory`` with an LRU
+  policy); ``benchmarks.fakes.FakeRedis`` stands in for it locally.
+
+If you're new:
+- Values put in a shared backend must be JSON-serializable (they are
+  encoded with ``orjson``). ``get_cache(..., shared=False)`` keeps a cache
+  in process memory whatever the setting, for values that are not.
+- A shared backend that is down or slow never fails a request: the call
+  counts as an error and a miss, and the caller recomputes the value.
+- Each cache counts hits, misses, sets, evictions and errors
+  (``cache_stats()``, ``GET /api/v1/health`` and ``cache_*`` metrics): a low
+  hit rate with many evictions means the cache is too small.
+"""
+import asyncio
+import contextlib
+import logging
+import socket
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Generic, TypeVar
+from urllib.parse import unquote, urlparse
+
+import orjson
+
+from app.core.config import get_settings
+from app.core.metrics import CACHE_ERRORS, CACHE_EVICTIONS, CACHE_REQUESTS
+from app.utils.lru import TTLCache
+
+logger = logging.getLogger(__name__)
+
+V = TypeVar("V")
+
+
+class CacheBackendError(Exception):
+    """A shared cache backend could not be reached or answered with an error."""
+
+
+class MemoryBackend:
+    """Per-process entries, one ``TTLCache`` per cache name."""
+
+    shared = False
+
+    def __init__(self) -> None:
+        self._caches: dict[str, TTLCache[Any]] = {}
+
+    def _cache(self, namespace: str, maxsize: int) -> TTLCache[Any]:
+        cache = self._caches.get(namespace)
+        if cache is None:
+            cache = self._caches[namespace] = TTLCache(maxsize=maxsize)
+        return cache
+
+    async def get(self, namespace: str, key: str) -> Any:
+        cache = self._caches.get(namespace)
+        return cache.get(key) if cache is not None else None
+
+    async def set(self, namespace: str, key: str, value: Any, expires_at: float, maxsize: int) -> int:
+        cache = self._cache(namespace, maxsize)
+        evicted = cache.evictions
+        cache.set(key, value, expires_at)
+        return cache.evictions - evicted
+
+    async def delete(self, namespace: str, key: str) -> None:
+        cache = self._caches.get(namespace)
+        if cache is not None:
+            cache.pop(key)
+
+    async def clear(self, namespace: str) -> None:
+        cache = self._caches.get(namespace)
+        if cache is not None:
+            cache.clear()
+
+    async def size(self, namespace: str) -> int | None:
+        cache = self._caches.get(namespace)
+        return len(cache) if cache is not None else 0
+
+    async def close(self) -> None:
+        self._caches.clear()
+
+
+class SQLiteBackend:
+    """Entries in a local SQLite file, shared by every process that opens it.
+
+    Least-recently-used order is approximate: a read refreshes an entry's
+    ``used_at`` at most every ``TOUCH_SECONDS``, so hot reads stay read-only.
+    Size bounds are enforced every ``EVICT_EVERY`` writes per cache name.
+    Queries run in a thread, so the event loop never waits on the file lock.
+    """
+
+    shared = True
+    TOUCH_SECONDS = 30.0
+    EVICT_EVERY = 64
+
+    def __init__(self, path: str, mmap_bytes: int = 64 * 1024 * 1024) -> None:
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.execute("pragma journal_mode=wal")
+        self._conn.execute("pragma synchronous=normal")  # a cache may lose its last writes on power loss
+        self._conn.execute(f"pragma mmap_size={int(mmap_bytes)}")
+        self._conn.execute(
+            """
+            create table if not exists cache_entries (
+              namespace text not null,
+              key text not null,
+              value blob not null,
+              expires_at real not null,
+              used_at real not null,
+              primary key (namespace, key)
+            ) without rowid
+            """
+        )
+        self._conn.execute("create index if not exists cache_entries_used on cache_entries (namespace, used_at)")
+        self._lock = threading.Lock()
+        self._writes: dict[str, int] = {}
+
+    async def _run(self, sql_fn: Any, *args: Any) -> Any:
+        def work() -> Any:
+            with self._lock:
+                try:
+                    return sql_fn(*args)
+                except sqlite3.Error as exc:
+                    raise CacheBackendError(f"sqlite: {exc}") from exc
+
+        return await asyncio.to_thread(work)
+
+    def _get(self, namespace: str, key: str) -> bytes | None:
+        row = self._conn.execute(
+            "select value, expires_at, used_at from cache_entries where namespace = ? and key = ?", (namespace, key)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at, used_at = row
+        now = time.time()
+        if expires_at <= now:
+            self._conn.execute("delete from cache_entries where namespace = ? and key = ?", (namespace, key))
+            return None
+        if used_at < now - self.TOUCH_SECONDS:
+            self._conn.execute(
+                "update cache_entries set used_at = ? where namespace = ? and key = ?", (now, namespace, key)
+            )
+        return value
+
+    def _set(self, namespace: str, key: str, value: bytes, expires_at: float, maxsize: int) -> int:
+        now = time.time()
+        self._conn.execute(
+            "insert or replace into cache_entries values (?, ?, ?, ?, ?)", (namespace, key, value, expires_at, now)
+        )
+        writes = self._writes[namespace] = self._writes.get(namespace, 0) + 1
+        if writes % self.EVICT_EVERY:
+            return 0
+        # Expired entries first, then the least recently used beyond maxsize
+        evicted = self._conn.execute(
+            "delete from cache_entries where namespace = ? and expires_at <= ?", (namespace, now)
+        ).rowcount
+        (count,) = self._conn.execute("select count(*) from cache_entries where namespace = ?", (namespace,)).fetchone()
+        if count > maxsize:
+            evicted += self._conn.execute(
+                """
+                delete from cache_entries where namespace = ? and key in (
+                  select key from cache_entries where namespace = ? order by used_at limit ?
+                )
+                """,
+                (namespace, namespace, count - maxsize),
+            ).rowcount
+        return evicted
+
+    async def get(self, namespace: str, key: str) -> bytes | None:
+        return await self._run(self._get, namespace, key)
+
+    async def set(self, namespace: str, key: str, value: bytes, expires_at: float, maxsize: int) -> int:
+        return await self._run(self._set, namespace, key, value, expires_at, maxsize)
+
+    async def delete(self, namespace: str, key: str) -> None:
+        await self._run(
+            self._conn.execute, "delete from cache_entries where namespace = ? and key = ?", (namespace, key)
+        )
+
+    async def clear(self, namespace: str) -> None:
+        await self._run(self._conn.execute, "delete from cache_entries where namespace = ?", (namespace,))
+
+    async def size(self, namespace: str) -> int | None:
+        def count() -> int:
+            return self._conn.execute(
+                "select count(*) from cache_entries where namespace = ?", (namespace,)
+            ).fetchone()[0]
+
+        return await self._run(count)
+
+    async def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class _RespConnection:
+    """One connection speaking the Redis protocol (RESP2)."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+
+    async def call(self, *args: Any) -> Any:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self.writer.write(b"".join(parts))
+        await self.writer.drain()
+        return await self._reply()
+
+    async def _reply(self) -> Any:
+        line = await self.reader.readline()
+        if not line:
+            raise CacheBackendError("redis: connection closed")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode()
+        if kind == b"-":
+            raise CacheBackendError(f"redis: {body.decode()}")
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            length = int(body)
+            return None if length < 0 else (await self.reader.readexactly(length + 2))[:-2]
+        if kind == b"*":
+            length = int(body)
+            return None if length < 0 else [await self._reply() for _ in range(length)]
+        raise CacheBackendError(f"redis: unexpected reply {line[:20]!r}")
+
+    def close(self) -> None:
+        try:
+            self.writer.close()
+        except RuntimeError:
+            # The loop that opened it is already closed: shut the socket directly
+            sock = self.writer.get_extra_info("socket")
+            if sock is not None:
+                with contextlib.suppress(OSError):
+                    sock.shutdown(socket.SHUT_RDWR)
+
+
+class RedisBackend:
+    """Entries in Redis, through a small pool of plain asyncio connections.
+
+    Only GET/SET/DEL/SCAN are used, so any Redis-compatible server works.
+    Keys are ``<CACHE_REDIS_PREFIX><cache name>:<key>``.
+    """
+
+    shared = True
+
+    def __init__(self, url: str, prefix: str = "peptide:", pool_size: int = 8, timeout: float = 0.25) -> None:
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.prefix = prefix
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._idle: list[_RespConnection] = []
+        self._slots: asyncio.Semaphore | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    async def _connect(self) -> _RespConnection:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        conn = _RespConnection(reader, writer)
+        if self.password:
+            await conn.call("AUTH", self.password)
+        if self.db:
+            await conn.call("SELECT", self.db)
+        return conn
+
+    async def _call(self, *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Connections belong to the loop that opened them (CLI jobs run their own)
+            self._close_idle()
+            self._loop, self._slots = loop, asyncio.Semaphore(self.pool_size)
+        assert self._slots is not None
+        async with self._slots:
+            conn = self._idle.pop() if self._idle else None
+            try:
+                if conn is None:
+                    conn = await asyncio.wait_for(self._connect(), self.timeout)
+                result = await asyncio.wait_for(conn.call(*args), self.timeout)
+            except (TimeoutError, OSError, asyncio.IncompleteReadError, CacheBackendError) as exc:
+                if conn is not None:
+                    conn.close()  # its stream may hold half a reply
+                if isinstance(exc, CacheBackendError):
+                    raise
+                raise CacheBackendError(f"redis: {exc!r}") from exc
+            self._idle.append(conn)
+            return result
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{self.prefix}{namespace}:{key}"
+
+    async def get(self, namespace: str, key: str) -> bytes | None:
+        return await self._call("GET", self._key(namespace, key))
+
+    async def set(self, namespace: str, key: str, value: bytes, expires_at: float, maxsize: int) -> int:
+        ttl_ms = int((expires_at - time.time()) * 1000)
+        if ttl_ms > 0:
+            await self._call("SET", self._key(namespace, key), value, "PX", ttl_ms)
+        return 0  # evictions happen on the server (maxmemory policy)
+
+    async def delete(self, namespace: str, key: str) -> None:
+        await self._call("DEL", self._key(namespace, key))
+
+    async def clear(self, namespace: str) -> None:
+        cursor = "0"
+        while True:
+            cursor_raw, keys = await self._call("SCAN", cursor, "MATCH", self._key(namespace, "*"), "COUNT", 500)
+            if keys:
+                await self._call("DEL", *keys)
+            cursor = cursor_raw.decode() if isinstance(cursor_raw, bytes) else str(cursor_raw)
+            if cursor == "0":
+                return
+
+    async def size(self, namespace: str) -> int | None:
+        return None  # would need a full SCAN
+
+    def _close_idle(self) -> None:
+        idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    async def close(self) -> None:
+        self._close_idle()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    sets: int = 0
+    evictions: int = 0
+    errors: int = 0
+
+    @property
+    def hit_rate(self) -> float | None:
+        lookups = self.hits + self.misses
+        return round(self.hits / lookups, 4) if lookups else None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {**asdict(self), "hit_rate": self.hit_rate}
+
+
+class Cache(Generic[V]):
+    """One named cache: ``get``/``set``/``pop``/``clear`` plus hit-rate stats."""
+
+    def __init__(self, name: str, backend: Any, maxsize: int) -> None:
+        self.name = name
+        self.backend = backend
+        self.maxsize = maxsize
+        self.stats = CacheStats()
+        self._failing = False
+
+    async def get(self, key: str) -> V | None:
+        """The cached value, or ``None`` if missing, expired or the backend failed."""
+        try:
+            raw = await self.backend.get(self.name, key)
+        except CacheBackendError as exc:
+            self._error(exc)
+            raw = None
+        else:
+            self._failing = False
+        if raw is None:
+            self.stats.misses += 1
+            CACHE_REQUESTS.labels(self.name, "miss").inc()
+            return None
+        self.stats.hits += 1
+        CACHE_REQUESTS.labels(self.name, "hit").inc()
+        return orjson.loads(raw) if self.backend.shared else raw
+
+    async def set(self, key: str, value: V, expires_at: float) -> None:
+        """Store ``value`` until ``expires_at`` (Unix seconds); best effort."""
+        if expires_at <= time.time():
+            return
+        data = orjson.dumps(value) if self.backend.shared else value
+        try:
+            evicted = await self.backend.set(self.name, key, data, expires_at, self.maxsize)
+        except CacheBackendError as exc:
+            self._error(exc)
+            return
+        self.stats.sets += 1
+        if evicted:
+            self.stats.evictions += evicted
+            CACHE_EVICTIONS.labels(self.name).inc(evicted)
+
+    async def pop(self, key: str) -> None:
+        try:
+            await self.backend.delete(self.name, key)
+        except CacheBackendError as exc:
+            self._error(exc)
+
+    async def clear(self) -> None:
+        try:
+            await self.backend.clear(self.name)
+        except CacheBackendError as exc:
+            self._error(exc)
+
+    async def describe(self) -> dict[str, Any]:
+        """Stats plus backend, bound and current size (``None`` when unknown)."""
+        try:
+            size = await self.backend.size(self.name)
+        except CacheBackendError:
+            size = None
+        return {"backend": type(self.backend).__name__, "maxsize": self.maxsize, "size": size, **self.stats.to_dict()}
+
+    def _error(self, exc: CacheBackendError) -> None:
+        self.stats.errors += 1
+        CACHE_ERRORS.labels(self.name).inc()
+        if not self._failing:  # log the first failure, not every request
+            logger.warning("Cache %r unavailable, treating as a miss: %s", self.name, exc)
+            self._failing = True
+
+
+_caches: dict[str, Cache[Any]] = {}
+_backends: dict[bool, Any] = {}
+
+
+def _make_backend(shared: bool) -> Any:
+    settings = get_settings()
+    kind = settings.CACHE_BACKEND.lower() if shared else "memory"
+    if kind == "sqlite":
+        return SQLiteBackend(settings.CACHE_SQLITE_PATH, mmap_bytes=settings.CACHE_SQLITE_MMAP_BYTES)
+    if kind == "redis":
+        return RedisBackend(
+            settings.CACHE_REDIS_URL,
+            prefix=settings.CACHE_REDIS_PREFIX,
+            pool_size=settings.CACHE_REDIS_POOL_SIZE,
+            timeout=settings.CACHE_REDIS_TIMEOUT_SECONDS,
+        )
+    if kind != "memory":
+        raise ValueError(f"Unknown CACHE_BACKEND {settings.CACHE_BACKEND!r} (memory, sqlite or redis)")
+    return MemoryBackend()
+
+
+def get_cache(name: str, maxsize: int, shared: bool = True) -> Cache[Any]:
+    """Return the process-wide cache called ``name`` (created on first use).
+
+    ``shared=False`` keeps it in process memory even when ``CACHE_BACKEND``
+    is shared (values that are large or not JSON-serializable). Asking for an
+    existing name with the other ``shared`` value is a ``ValueError``: the
+    first caller's backend would silently win otherwise.
+    """
+    backend = _backends.get(shared)
+    if backend is None:
+        backend = _backends[shared] = _make_backend(shared)
+    cache = _caches.get(name)
+    if cache is None:
+        cache = _caches[name] = Cache(name, backend, maxsize)
+    elif cache.backend is not backend:
+        raise ValueError(f"Cache {name!r} already exists with shared={not shared}")
+    return cache
+
+
+async def cache_stats() -> dict[str, dict[str, Any]]:
+    """Stats of every cache used so far in this process."""
+    return {name: await cache.describe() for name, cache in sorted(_caches.items())}
+
+
+async def close_caches() -> None:
+    """Close backend connections (app shutdown); caches are recreated on next use."""
+    backends: list[tuple[bool, Any]] = list(_backends.items())
+    _caches.clear()
+    _backends.clear()
+    for _, backend in backends:
+        await backend.close()
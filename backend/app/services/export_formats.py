@@ -0,0 +1,231 @@
+"""Streaming encoders for tracking exports (CSV, NDJSON, Arrow, Parquet).
+
+Every encoder turns pages of rows into bytes as they arrive, so an export of
+any length is produced with flat memory:
+
+- ``header()``: bytes to send before the first page (e.g. the CSV header)
+- ``encode(rows)``: bytes for one page
+- ``finish()``: trailing bytes (e.g. the Parquet footer)
+
+Arrow and Parquet use typed columns (UTC timestamps, floats, dictionary
+encoded peptide ids) so analysts can load them without reparsing text.
+``pyarrow`` is optional and only imported when one of those formats is used.
+
+``gzip_stream`` wraps any of these byte streams in streaming gzip.
+"""
+import csv
+import json
+import zlib
+from collections.abc import AsyncIterator, Sequence
+from io import StringIO
+from typing import Any
+
+Rows = list[dict[str, Any]]
+
+# Column groups of ``daily_tracking`` used to build typed (Arrow) schemas
+TIMESTAMP_COLUMNS = {"created_at"}
+TEXT_COLUMNS = {"bp_am", "bp_pm", "notes"}
+ID_COLUMNS = {"id", "user_id", "peptide1_id", "peptide2_id", "peptide3_id"}
+
+
+class ExportFormatError(Exception):
+    """Raised when a format cannot be produced (e.g. ``pyarrow`` missing)."""
+
+
+class CsvEncoder:
+    media_type = "text/csv"
+    extension = "csv"
+
+    def __init__(self, columns: Sequence[str]) -> None:
+        self.columns = tuple(columns)
+        self._buf = StringIO()
+        self._writer = csv.writer(self._buf)
+
+    def _drain(self) -> bytes:
+        chunk = self._buf.getvalue().encode("utf-8")
+        self._buf.seek(0)
+        self._buf.truncate()
+        return chunk
+
+    def header(self) -> bytes:
+        self._writer.writerow(self.columns)
+        return self._drain()
+
+    def encode(self, rows: Rows) -> bytes:
+        for r in rows:
+            self._writer.writerow([r.get(k) for k in self.columns])  # None -> empty cell
+        return self._drain()
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class NdjsonEncoder:
+    """One JSON object per line; easy to stream-parse line by line."""
+
+    media_type = "application/x-ndjson"
+    extension = "ndjson"
+
+    def __init__(self, columns: Sequence[str]) -> None:
+        self.columns = tuple(columns)
+
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, rows: Rows) -> bytes:
+        lines = [json.dumps({k: r.get(k) for k in self.columns}, separators=(",", ":")) for r in rows]
+        return ("\n".join(lines) + "\n").encode("utf-8") if lines else b""
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class _ChunkSink:
+    """Write-only file object that hands back whatever was written since last drain."""
+
+    def __init__(self) -> None:
+        self._buf = bytearray()
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data: Any) -> int:
+        view = memoryview(data)
+        self._buf += view
+        self._pos += len(view)
+        return len(view)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        chunk = bytes(self._buf)
+        self._buf.clear()
+        return chunk
+
+
+class ArrowEncoder:
+    """Arrow IPC stream (``parquet=False``) or Parquet file (``parquet=True``).
+
+    Each page becomes one record batch (Arrow) or row group (Parquet).
+    """
+
+    def __init__(self, columns: Sequence[str], parquet: bool = False) -> None:
+        try:
+            import pyarrow as pa
+        except ImportError as exc:  # pragma: no cover - optional dependency
+            raise ExportFormatError("Arrow/Parquet export requires the 'pyarrow' package") from exc
+        self._pa = pa
+        self.columns = tuple(columns)
+        self.parquet = parquet
+        self.media_type = "application/vnd.apache.parquet" if parquet else "application/vnd.apache.arrow.stream"
+        self.extension = "parquet" if parquet else "arrows"
+        self.schema = pa.schema([(name, self._column_type(name)) for name in self.columns])
+        self._sink = _ChunkSink()
+        if parquet:
+            import pyarrow.parquet as pq
+
+            self._writer = pq.ParquetWriter(self._sink, self.schema, compression="zstd")
+        else:
+            options = pa.ipc.IpcWriteOptions(compression="zstd")
+            self._writer = pa.ipc.new_stream(self._sink, self.schema, options=options)
+
+    def _column_type(self, name: str) -> Any:
+        pa = self._pa
+        if name in TIMESTAMP_COLUMNS:
+            return pa.timestamp("us", tz="UTC")
+        if name in ID_COLUMNS:
+            # Few distinct ids repeated on many rows: store each once
+            return pa.dictionary(pa.int32(), pa.string())
+        if name in TEXT_COLUMNS:
+            return pa.string()
+        return pa.float64()
+
+    def _to_array(self, name: str, values: list[Any], type_: Any) -> Any:
+        pa = self._pa
+        if name in TIMESTAMP_COLUMNS:
+            # ISO 8601 strings with offsets cast directly to UTC timestamps
+            return pa.array(values, type=pa.string()).cast(type_)
+        if name in ID_COLUMNS:
+            return pa.array(values, type=pa.string()).dictionary_encode()
+        if name in TEXT_COLUMNS:
+            return pa.array([None if v is None else str(v) for v in values], type=type_)
+        return pa.array([None if v is None else float(v) for v in values], type=type_)
+
+    def header(self) -> bytes:
+        return self._sink.drain()
+
+    def encode(self, rows: Rows) -> bytes:
+        if not rows:
+            return b""
+        arrays = [
+            self._to_array(field.name, [r.get(field.name) for r in rows], field.type) for field in self.schema
+        ]
+        batch = self._pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+        self._writer.write_batch(batch)
+        return self._sink.drain()
+
+    def finish(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+
+EXPORT_FORMATS = ("csv", "ndjson", "arrow", "parquet")
+
+# Accept header values that select each format
+MEDIA_TYPE_FORMATS = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "application/vnd.apache.arrow.stream": "arrow",
+    "application/vnd.apache.parquet": "parquet",
+}
+
+
+def negotiate_format(accept: str | None) -> str:
+    """Pick an export format from an ``Accept`` header (default: CSV)."""
+    for part in (accept or "").split(","):
+        media_type = part.split(";", 1)[0].strip().lower()
+        if media_type in MEDIA_TYPE_FORMATS:
+            return MEDIA_TYPE_FORMATS[media_type]
+    return "csv"
+
+
+def make_encoder(fmt: str, columns: Sequence[str]) -> Any:
+    """Return a fresh encoder for ``fmt`` (one of ``EXPORT_FORMATS``)."""
+    if fmt == "csv":
+        return CsvEncoder(columns)
+    if fmt == "ndjson":
+        return NdjsonEncoder(columns)
+    if fmt in ("arrow", "parquet"):
+        return ArrowEncoder(columns, parquet=fmt == "parquet")
+    raise ExportFormatError(f"Unsupported export format: {fmt}")
+
+
+async def encode_stream(encoder: Any, first_page: Rows, pages: AsyncIterator[Rows]) -> AsyncIterator[bytes]:
+    """Yield encoded bytes for ``first_page`` and then every remaining page."""
+    head = encoder.header() + encoder.encode(first_page)
+    if head:
+        yield head
+    async for page in pages:
+        chunk = encoder.encode(page)
+        if chunk:
+            yield chunk
+    tail = encoder.finish()
+    if tail:
+        yield tail
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    """Compress a byte stream into a single gzip member, chunk by chunk."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 = gzip container
+    async for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
@@ -0,0 +1,323 @@
+"""Inventory forecasts: when each peptide runs out, and what expires unused.
+
+For every row in ``peptides`` we store one row in ``inventory_forecasts``:
+
+- ``doses_per_day``: how often the peptide was logged in ``daily_tracking``
+  (any of ``peptide1_id..peptide3_id``) over the last
+  ``FORECAST_LOOKBACK_DAYS`` days
+- ``units_per_dose``: ``peptides.units_per_dose`` when the user set it, else
+  *estimated*: when ``units_remaining`` drops between two forecasts, the drop
+  divided by the doses logged in between (smoothed over time)
+- ``days_left`` / ``depletion_date``: ``units_remaining`` at that pace
+- ``expiry_waste_units``: what is still left on ``expires_on`` at that pace
+- ``status``: ``empty``, ``expired``, ``low`` (runs out within
+  ``FORECAST_LOW_DAYS``), ``expiring`` (some will be wasted), ``unknown``
+  (used, but the dose size is unknown) or ``ok``
+
+If you're new:
+- ``compute_forecasts`` works on many users at once: peptides become arrays
+  (one slot per peptide) and every logged dose is mapped to its slot with a
+  sorted search, so counting doses is one ``bincount``. No per-peptide loops
+  until the rows are written out.
+- Refreshes are incremental: watermarks remember the last ``(updated_at,
+  id)`` seen in ``peptides`` and ``daily_tracking``, so a refresh only
+  recomputes users with new writes (``python -m app.jobs.inventory_forecast``).
+  Like the sync cursor they stay ``SYNC_SETTLE_SECONDS`` behind now, so rows
+  committed late are not skipped; without them a refresh is a full one.
+- ``forecast_for_user`` (the endpoint) serves stored rows and recomputes just
+  that user when a peptide or tracking row changed after its forecast, or the
+  forecast is older than ``FORECAST_MAX_AGE_SECONDS``.
+"""
+import asyncio
+import time
+from collections.abc import Sequence
+from datetime import UTC, date, datetime, timedelta
+from typing import Any
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.schemas.rows import ForecastRow, PeptideRow
+from app.services.repository import FIRST_ID, Cursor, Repositories, settled_cursor
+
+PEPTIDE_COLUMNS = ("peptide1_id", "peptide2_id", "peptide3_id")
+USAGE_COLUMNS = ("id", "user_id", "created_at", *PEPTIDE_COLUMNS)
+INVENTORY_COLUMNS = (
+    "id",
+    "user_id",
+    "name",
+    "units_remaining",
+    "units_per_dose",
+    "expires_on",
+    "created_at",
+    "updated_at",
+)
+# Bookkeeping columns the endpoint does not return
+INTERNAL_COLUMNS = ("peptide_id", "user_id", "snapshot_units", "snapshot_at")
+
+DAY_SECONDS = 86_400
+# Weight of the newest dose-size sample in the running estimate
+ESTIMATE_WEIGHT = 0.5
+# Depletion further out than this is reported as "not in sight"
+HORIZON_DAYS = 5 * 365
+# Watermark before every row, for a table that is still empty on a full run
+EMPTY_MARK: Cursor = ("1970-01-01T00:00:00+00:00", FIRST_ID)
+
+
+def _timestamp(value: str | None) -> float:
+    if not value:
+        return np.nan
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=UTC)
+    return dt.timestamp()
+
+
+def _floats(values: Sequence[Any]) -> np.ndarray:
+    return np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+
+
+def _optional(value: float, decimals: int = 3) -> float | None:
+    return None if not np.isfinite(value) else round(float(value), decimals)
+
+
+def compute_forecasts(
+    peptides: Sequence[PeptideRow],
+    usage: Sequence[dict[str, Any]],
+    previous: dict[str, ForecastRow],
+    now: datetime,
+    lookback_days: int = 28,
+    low_days: int = 7,
+) -> list[ForecastRow]:
+    """Forecast every peptide in ``peptides`` (any number of users) in one pass.
+
+    ``usage`` holds tracking rows (``USAGE_COLUMNS``) from the lookback window
+    of the same users; ``previous`` the stored forecasts by peptide id (for
+    dose-size estimates).
+    """
+    n = len(peptides)
+    if n == 0:
+        return []
+    now_ts = now.timestamp()
+    window_start = now_ts - lookback_days * DAY_SECONDS
+    today = now.astimezone(UTC).date()
+
+    # 1) Inventory as arrays, one slot per peptide (sorted by id for lookups)
+    ids = np.array([p["id"] for p in peptides], dtype=str)
+    order = np.argsort(ids)
+    ids = ids[order]
+    peptides = [peptides[i] for i in order]
+    prev = [previous.get(p["id"], {}) for p in peptides]
+    units = _floats([p.get("units_remaining") for p in peptides])
+    configured = _floats([p.get("units_per_dose") for p in peptides])
+    configured[configured <= 0] = np.nan
+    created = np.array([_timestamp(p.get("created_at")) for p in peptides])
+    expiry_days = _floats(
+        [(date.fromisoformat(p["expires_on"][:10]) - today).days if p.get("expires_on") else None for p in peptides]
+    )
+    # Only our own estimates carry over (a configured size may have been removed)
+    prev_estimate = _floats(
+        [f.get("units_per_dose") if f.get("units_per_dose_source") == "estimated" else None for f in prev]
+    )
+    snapshot_units = _floats([f.get("snapshot_units") for f in prev])
+    snapshot_at = np.array([_timestamp(f.get("snapshot_at")) for f in prev])
+
+    # 2) Map every logged dose to its peptide slot with one sorted search
+    logged = np.array([[r.get(c) or "" for c in PEPTIDE_COLUMNS] for r in usage], dtype=str).reshape(-1)
+    logged_at = np.repeat(np.array([_timestamp(r["created_at"]) for r in usage]), len(PEPTIDE_COLUMNS))
+    slot = np.minimum(np.searchsorted(ids, logged), n - 1)
+    known = (ids[slot] == logged) & (logged_at >= window_start)
+    slot, logged_at = slot[known], logged_at[known]
+    doses = np.bincount(slot, minlength=n)
+    doses_since_snapshot = np.bincount(slot[logged_at > snapshot_at[slot]], minlength=n)
+
+    # 3) Dose rate over the lookback window (shorter for peptides added since)
+    age_days = (now_ts - np.nan_to_num(created, nan=window_start)) / DAY_SECONDS
+    window_days = np.clip(age_days, 1.0, lookback_days)
+    doses_per_day = doses / window_days
+
+    # 4) Dose size: configured, else refine the estimate when stock went down
+    used = snapshot_units - units
+    sampled = (used > 0) & (doses_since_snapshot > 0) & (snapshot_at >= window_start)
+    sample = np.divide(used, doses_since_snapshot, out=np.full(n, np.nan), where=sampled)
+    estimate = np.where(
+        np.isnan(sample),
+        prev_estimate,
+        np.where(np.isnan(prev_estimate), sample, ESTIMATE_WEIGHT * sample + (1 - ESTIMATE_WEIGHT) * prev_estimate),
+    )
+    units_per_dose = np.where(np.isnan(configured), estimate, configured)
+    source = np.select([~np.isnan(configured), ~np.isnan(estimate)], ["configured", "estimated"], default="")
+
+    # 5) Project depletion and expiry waste (unused peptides never run out)
+    units_per_day = doses_per_day * units_per_dose
+    with np.errstate(divide="ignore", invalid="ignore"):
+        days_left = np.where(doses == 0, np.inf, units / units_per_day)
+    days_left[units <= 0] = 0.0
+    used_by_expiry = np.where(doses == 0, 0.0, units_per_day * np.maximum(expiry_days, 0))
+    waste = np.maximum(units - used_by_expiry, 0.0)
+    waste[np.isnan(expiry_days)] = 0.0
+    status = np.select(
+        [units <= 0, expiry_days < 0, days_left <= low_days, waste > 0, np.isnan(days_left)],
+        ["empty", "expired", "low", "expiring", "unknown"],
+        default="ok",
+    )
+
+    # 6) Keep the stock snapshot until it changes (the next estimate needs it)
+    moved = np.isnan(snapshot_units) | (snapshot_units != units)
+    computed_at = now.isoformat()
+    rows: list[ForecastRow] = []
+    for i, peptide in enumerate(peptides):
+        depletes = bool(np.isfinite(days_left[i]) and days_left[i] <= HORIZON_DAYS)
+        rows.append(
+            ForecastRow(
+                peptide_id=peptide["id"],
+                user_id=peptide["user_id"],
+                computed_at=computed_at,
+                doses_per_day=round(float(doses_per_day[i]), 4),
+                units_per_dose=_optional(units_per_dose[i], 4),
+                units_per_dose_source=str(source[i]) or None,
+                days_left=_optional(days_left[i], 1) if depletes else None,
+                depletion_date=(today + timedelta(days=int(days_left[i]))).isoformat() if depletes else None,
+                expiry_waste_units=_optional(waste[i]),
+                status=str(status[i]),
+                snapshot_units=_optional(units[i], 4) if moved[i] else prev[i].get("snapshot_units"),
+                snapshot_at=computed_at if moved[i] else prev[i].get("snapshot_at"),
+            )
+        )
+    return rows
+
+
+class ForecastService:
+    """Computes and stores forecasts through the repository layer."""
+
+    def __init__(self, repos: Repositories, page_size: int = 1000) -> None:
+        self.repos = repos
+        self.page_size = page_size
+
+    async def refresh_users(self, user_ids: Sequence[str], now: datetime | None = None) -> list[ForecastRow]:
+        """Recompute and store the forecasts of ``user_ids``; returns the new rows."""
+        if not user_ids:
+            return []
+        settings = get_settings()
+        now = now or datetime.now(UTC)
+        # 1) Inventory, usage in the lookback window and previous forecasts
+        start = now - timedelta(days=settings.FORECAST_LOOKBACK_DAYS)
+        peptides, previous, usage = await asyncio.gather(
+            self.repos.peptides.list_for_users(user_ids, columns=INVENTORY_COLUMNS, page_size=self.page_size),
+            self.repos.forecasts.list_for_users(user_ids, page_size=self.page_size),
+            self._usage(user_ids, start),
+        )
+        # 2) One vectorized pass over all of them, then one upsert
+        rows = compute_forecasts(
+            peptides,
+            usage,
+            {f["peptide_id"]: f for f in previous},
+            now,
+            lookback_days=settings.FORECAST_LOOKBACK_DAYS,
+            low_days=settings.FORECAST_LOW_DAYS,
+        )
+        await self.repos.forecasts.upsert_many(rows)
+        return rows
+
+    async def _usage(self, user_ids: Sequence[str], start: datetime) -> list[dict[str, Any]]:
+        rows: list[dict[str, Any]] = []
+        async for page in self.repos.tracking.iter_pages(
+            None, start, None, columns=USAGE_COLUMNS, page_size=self.page_size, user_ids=user_ids
+        ):
+            rows.extend(page)  # type: ignore[arg-type]
+        return rows
+
+    async def refresh_changed(self, full: bool = False, batch_users: int = 200) -> dict[str, Any]:
+        """Recompute users with writes since the last refresh (or everyone with ``full``).
+
+        Returns a small report (users, peptides, timings). Without both
+        watermarks (the first run) the refresh is a full one: an incremental
+        run would scan all of ``daily_tracking`` to find every user anyway.
+        """
+        started = time.perf_counter()
+        settle_seconds = get_settings().SYNC_SETTLE_SECONDS
+        marks = {} if full else await self.repos.forecasts.get_watermarks()
+        if not {"peptides", "daily_tracking"} <= marks.keys():
+            full, marks = True, {}
+        users: set[str] = set()
+        new_marks: dict[str, Cursor] = {}
+        # 1) Users whose inventory changed (everyone's inventory on a full run)
+        async for page in self.repos.peptides.iter_changed(marks.get("peptides"), page_size=self.page_size):
+            users.update(r["user_id"] for r in page)
+            new_marks["peptides"] = (page[-1]["updated_at"], page[-1]["id"])
+        # 2) Users who logged (or edited) tracking rows; a full run covers
+        #    them already and just moves the watermark to the latest write
+        if full:
+            latest = await self.repos.tracking.last_write()
+            if latest is not None:
+                new_marks["daily_tracking"] = latest
+        else:
+            async for page in self.repos.tracking.iter_pages(
+                None,
+                None,
+                None,
+                columns=("id", "user_id", "updated_at"),
+                page_size=self.page_size,
+                after=marks.get("daily_tracking"),
+                key="updated_at",
+            ):
+                users.update(r["user_id"] for r in page)
+                new_marks["daily_tracking"] = (page[-1]["updated_at"], page[-1]["id"])
+        # 3) Recompute in batches of users, then advance the watermarks (no
+        #    further than the settle line: recent writers are redone next time)
+        ordered = sorted(users)
+        peptides = 0
+        for i in range(0, len(ordered), batch_users):
+            peptides += len(await self.refresh_users(ordered[i : i + batch_users]))
+        if full:
+            # Seed both watermarks even for an empty table, so the next run is incremental
+            for source in ("peptides", "daily_tracking"):
+                new_marks.setdefault(source, EMPTY_MARK)
+        for source, cursor in new_marks.items():
+            await self.repos.forecasts.set_watermark(source, settled_cursor(cursor, settle_seconds))
+        return {
+            "full": full,
+            "users": len(ordered),
+            "peptides": peptides,
+            "seconds": round(time.perf_counter() - started, 4),
+        }
+
+
+async def forecast_for_user(repos: Repositories, user_id: str) -> list[dict[str, Any]]:
+    """The user's inventory with forecasts, recomputed only when stale."""
+    settings = get_settings()
+    # 1) Current inventory, stored forecasts and the latest tracking write,
+    #    read in parallel
+    peptides, stored, last_logged = await asyncio.gather(
+        repos.peptides.list_for_user(user_id),
+        repos.forecasts.list_for_users([user_id]),
+        repos.tracking.last_write(user_id),
+    )
+    by_peptide = {f["peptide_id"]: f for f in stored}
+    # 2) Recompute when any peptide is new/edited since its forecast, a dose
+    #    was logged (or edited) since, or the forecast is old
+    oldest_ok = time.time() - settings.FORECAST_MAX_AGE_SECONDS
+    logged_at = _timestamp(last_logged[0]) if last_logged else np.nan
+    stale = any(
+        p["id"] not in by_peptide
+        or _timestamp(p.get("updated_at")) > _timestamp(by_peptide[p["id"]]["computed_at"])
+        or logged_at > _timestamp(by_peptide[p["id"]]["computed_at"])
+        or _timestamp(by_peptide[p["id"]]["computed_at"]) < oldest_ok
+        for p in peptides
+    )
+    if stale:
+        by_peptide = {f["peptide_id"]: f for f in await ForecastService(repos).refresh_users([user_id])}
+    # 3) Inventory fields the app shows, plus the forecast
+    result = []
+    for p in peptides:
+        forecast = by_peptide.get(p["id"], {})
+        result.append(
+            {
+                "peptide_id": p["id"],
+                "name": p.get("name"),
+                "units_remaining": p.get("units_remaining"),
+                "expires_on": p.get("expires_on"),
+                **{k: v for k, v in forecast.items() if k not in INTERNAL_COLUMNS},
+            }
+        )
+    return result
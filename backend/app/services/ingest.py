@@ -0,0 +1,215 @@
+"""Bulk ingest of ``daily_tracking`` rows (offline sync, imports).
+
+The request body is parsed *while it streams in*, as NDJSON (one JSON object
+per line) or a JSON array. Rows are then handled in chunks of
+``INGEST_CHUNK_SIZE``:
+
+1. validate the whole chunk with one Pydantic call (falling back to
+   row-by-row only when something in the chunk is invalid)
+2. give each row its deterministic id (see ``app.schemas.tracking``)
+3. write the chunk with a single upsert on ``id``
+
+Only one chunk is held in memory at a time, so tens of thousands of rows
+cost the same memory as a few hundred. Because ids are deterministic, a
+retried request overwrites instead of duplicating.
+"""
+import json
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from typing import Any
+
+from pydantic import TypeAdapter, ValidationError
+
+from app.schemas.rows import TrackingRow
+from app.schemas.tracking import TrackingIn
+from app.services.postgrest import PostgrestError
+from app.services.repository import Repositories
+
+OK = "ok"
+INVALID = "invalid"
+DUPLICATE = "duplicate"
+FAILED = "failed"
+
+_chunk_adapter = TypeAdapter(list[TrackingIn])
+_row_adapter = TypeAdapter(TrackingIn)
+
+
+class IngestFormatError(Exception):
+    """The body cannot be parsed any further (e.g. a broken JSON array)."""
+
+
+class _BadItem:
+    """Placeholder for an NDJSON line that is not valid JSON."""
+
+    def __init__(self, error: str) -> None:
+        self.error = error
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[Any]:
+    """Yield one parsed value per non-empty line (``_BadItem`` for bad lines)."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _parse_line(line)
+        if len(buffer) > max_line_bytes:
+            raise IngestFormatError(f"Line longer than {max_line_bytes} bytes")
+    if buffer.strip():
+        yield _parse_line(buffer)
+
+
+def _parse_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as exc:
+        return _BadItem(f"Invalid JSON: {exc}")
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes], max_item_bytes: int) -> AsyncIterator[Any]:
+    """Yield the elements of a top-level JSON array as the bytes arrive."""
+    decoder = json.JSONDecoder()
+    text = ""
+    pending = b""  # incomplete UTF-8 sequence at a chunk boundary
+    started = False
+    async for chunk in chunks:
+        data = pending + chunk
+        try:
+            text += data.decode("utf-8")
+            pending = b""
+        except UnicodeDecodeError as exc:
+            if exc.start < len(data) - 3:
+                raise IngestFormatError("Body is not valid UTF-8") from exc
+            text += data[: exc.start].decode("utf-8")
+            pending = data[exc.start :]
+        pos = 0
+        while True:
+            # Skip whitespace and the separators between elements
+            while pos < len(text) and (text[pos].isspace() or (started and text[pos] == ",")):
+                pos += 1
+            if pos >= len(text):
+                break
+            if not started:
+                if text[pos] != "[":
+                    raise IngestFormatError("Expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if text[pos] == "]":
+                return
+            try:
+                value, end = decoder.raw_decode(text, pos)
+            except ValueError:
+                break  # element not complete yet; wait for more bytes
+            yield value
+            pos = end
+        text = text[pos:]
+        if len(text) > max_item_bytes:
+            raise IngestFormatError(f"Array element larger than {max_item_bytes} bytes or malformed")
+    raise IngestFormatError("Unterminated JSON array")
+
+
+@dataclass
+class IngestReport:
+    """Counts plus per-row results (``index`` is the row's position in the body)."""
+
+    include_ok: bool = True
+    received: int = 0
+    counts: dict[str, int] = field(default_factory=lambda: {OK: 0, INVALID: 0, DUPLICATE: 0, FAILED: 0})
+    results: list[dict[str, Any]] = field(default_factory=list)
+
+    def add(self, index: int, status: str, row_id: str | None = None, error: Any = None) -> None:
+        self.counts[status] += 1
+        if status == OK and not self.include_ok:
+            return
+        result: dict[str, Any] = {"index": index, "status": status}
+        if row_id is not None:
+            result["id"] = row_id
+        if error is not None:
+            result["error"] = error
+        self.results.append(result)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"received": self.received, **self.counts, "results": self.results}
+
+
+def _validate_chunk(items: list[tuple[int, Any]], report: IngestReport) -> list[tuple[int, TrackingIn]]:
+    """Validate a chunk in one call; only a failing chunk is re-checked row by row."""
+    candidates = [(i, v) for i, v in items if not isinstance(v, _BadItem)]
+    for i, v in items:
+        if isinstance(v, _BadItem):
+            report.add(i, INVALID, error=v.error)
+    try:
+        models = _chunk_adapter.validate_python([v for _, v in candidates])
+        return [(i, m) for (i, _), m in zip(candidates, models, strict=True)]
+    except ValidationError:
+        pass
+    valid: list[tuple[int, TrackingIn]] = []
+    for i, v in candidates:
+        try:
+            valid.append((i, _row_adapter.validate_python(v)))
+        except ValidationError as exc:
+            errors = exc.errors(include_url=False, include_context=False, include_input=False)
+            report.add(i, INVALID, error=errors)
+    return valid
+
+
+async def _write_chunk(
+    repos: Repositories, user_id: str, items: list[tuple[int, Any]], report: IngestReport
+) -> None:
+    # 1) Validate
+    valid = _validate_chunk(items, report)
+    # 2) Build rows; one upsert cannot touch the same id twice, so the last
+    #    copy of a repeated key wins and earlier copies are reported
+    rows: dict[str, tuple[int, TrackingRow]] = {}
+    for index, model in valid:
+        if model.user_id is not None and str(model.user_id) != user_id:
+            report.add(index, INVALID, error="user_id does not match the signed-in user")
+            continue
+        row = model.to_row(user_id)
+        previous = rows.pop(row["id"], None)
+        if previous is not None:
+            report.add(previous[0], DUPLICATE, row_id=row["id"], error="Superseded by a later row in this request")
+        rows[row["id"]] = (index, row)
+    if not rows:
+        return
+    # 3) One upsert for the whole chunk
+    try:
+        await repos.tracking.upsert_many([row for _, row in rows.values()])
+    except PostgrestError as exc:
+        for index, row in rows.values():
+            report.add(index, FAILED, row_id=row["id"], error=exc.message)
+        return
+    for index, row in rows.values():
+        report.add(index, OK, row_id=row["id"])
+
+
+async def ingest_tracking(
+    repos: Repositories,
+    user_id: str,
+    items: AsyncIterator[Any],
+    chunk_size: int = 500,
+    max_rows: int = 50_000,
+    include_ok: bool = True,
+) -> IngestReport:
+    """Validate and upsert rows from ``items`` in chunks; returns the report.
+
+    Raises ``IngestFormatError`` if the body is malformed or has more than
+    ``max_rows`` rows (chunks already written stay written; they are
+    idempotent, so the client can fix and resend the whole body).
+    """
+    report = IngestReport(include_ok=include_ok)
+    chunk: list[tuple[int, Any]] = []
+    async for value in items:
+        if report.received >= max_rows:
+            raise IngestFormatError(f"Too many rows (limit {max_rows})")
+        chunk.append((report.received, value))
+        report.received += 1
+        if len(chunk) >= chunk_size:
+            await _write_chunk(repos, user_id, chunk, report)
+            chunk = []
+    if chunk:
+        await _write_chunk(repos, user_id, chunk, report)
+    report.results.sort(key=lambda r: r["index"])
+    return report
@@ -0,0 +1,214 @@
+"""Insight generation: prompt building, the model call, and a result cache.
+
+Users often refresh the insights screen many times while their data has not
+changed. Every refresh used to cost an OpenAI call and a new ``insights``
+row. Here results are cached by *content*:
+
+- the key is the user id plus a SHA-256 of the summary, the prompt template
+  and the model name, so any change to the data or the prompt is a miss
+- hits are served from the ``insights`` cache with a TTL (in memory, or
+  shared by every worker with ``CACHE_BACKEND``; see ``app.services.cache``)
+- on a cold cache (e.g. after a restart, or for insights precomputed by
+  ``app.jobs.insights_batch``) we look at the user's latest stored insight
+  and reuse it if it was built from the same summary recently
+- identical requests arriving together (a double-tap, pull-to-refresh)
+  share one run of all of the above: one model call, one stored row
+- when the model is unavailable (circuit breaker open, too many calls in
+  flight, request out of time) the default tips are returned with
+  ``"fallback": true`` and nothing is cached or stored
+"""
+import hashlib
+import json
+import time
+from datetime import UTC, datetime
+from typing import Any
+
+from app.core.config import get_settings
+from app.core.deadlines import DeadlineExceededError
+from app.core.metrics import track_upstream
+from app.core.profiling import timed
+from app.services.cache import Cache, get_cache
+from app.services.postgrest import PostgrestError
+from app.services.registry import get_registry
+from app.services.repository import Repositories
+from app.services.resilience import UpstreamUnavailableError, get_upstream
+from app.services.rollups import RollupService
+from app.services.singleflight import get_flight_group
+
+MODEL = "gpt-4o-mini"
+PROMPT_TEMPLATE = (
+    "You are a health coach. Based on the user's last {days} days of metrics, provide 3-5 concise, actionable tips.\n"
+    "Summary: {summary}\n"
+    "Constraints: return JSON with 'tips': an array of strings, short and specific."
+)
+# Returned when OpenAI is not configured
+MOCK_TIPS = [
+    "Great consistency this week. Consider a light refeed if energy averages below 6.",
+    "Waist trend stable; add 10–15 min post-meal walks to nudge fat loss.",
+    "Keep hydration high; a slight uptick in resting HR suggests more recovery.",
+]
+
+
+def build_prompt(summary: dict[str, Any], days: int) -> str:
+    """Prompt for the AI model (kept short and specific)."""
+    return PROMPT_TEMPLATE.format(days=days, summary=summary)
+
+
+def insight_key(user_id: str, summary: dict[str, Any]) -> str:
+    """Stable content hash of everything that determines the model's answer."""
+    canonical = json.dumps(
+        {"summary": summary, "template": PROMPT_TEMPLATE, "model": MODEL},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return f"{user_id}:{hashlib.sha256(canonical.encode()).hexdigest()}"
+
+
+class InsightGenerationError(Exception):
+    """Raised when the model call fails or returns unusable output."""
+
+
+class ModelUnavailableError(InsightGenerationError):
+    """The model call was not made or ran out of time (breaker open, no slot, deadline)."""
+
+
+def fallback_insight(summary: dict[str, Any] | None = None) -> dict[str, Any]:
+    """The default tips, marked as a fallback (never cached or stored)."""
+    return {"tips": list(MOCK_TIPS), "summary": summary, "cached": False, "fallback": True}
+
+
+async def request_tips(prompt: str) -> list[Any]:
+    """Ask the model for tips (raises ``InsightGenerationError`` on failure).
+
+    If OpenAI is not configured, provide helpful defaults. Raises
+    ``ModelUnavailableError`` when the call is refused or out of time.
+    """
+    client = get_registry().openai()
+    if client is None:
+        # Fallback: mock insights
+        return list(MOCK_TIPS)
+    try:
+        # Ask the model for JSON-only output using the summary (timed in
+        # the upstream_* metrics and as "model" when profiled), through the
+        # openai bulkhead and breaker
+        with timed("model"):
+            async with get_upstream("openai").call(get_settings().OPENAI_TIMEOUT_SECONDS) as guard:
+                with track_upstream("openai", "chat.completions"):
+                    completion = await client.chat.completions.create(
+                        model=MODEL,
+                        messages=[
+                            {"role": "system", "content": "You return only JSON."},
+                            {"role": "user", "content": prompt},
+                        ],
+                        temperature=0.3,
+                        timeout=guard.timeout,
+                    )
+        content = completion.choices[0].message.content or "{}"
+        parsed = json.loads(content)
+    except UpstreamUnavailableError as exc:
+        raise ModelUnavailableError(str(exc)) from exc
+    except Exception as exc:  # noqa: BLE001
+        raise InsightGenerationError(str(exc)) from exc
+    tips = parsed.get("tips") or parsed.get("suggestions") or []
+    if not isinstance(tips, list):
+        tips = [str(tips)]
+    return tips
+
+
+def get_insight_cache() -> Cache[list[Any]]:
+    """Return the insight cache (tips by ``insight_key``)."""
+    return get_cache("insights", get_settings().INSIGHT_CACHE_SIZE)
+
+
+async def _rehydrate(repos: Repositories, user_id: str, key: str) -> tuple[list[Any], float] | None:
+    """Reuse the latest stored insight if it matches ``key`` and is still fresh.
+
+    Returns ``(tips, expires_at)`` or ``None``.
+    """
+    try:
+        latest = await repos.insights.latest(user_id, limit=1)
+    except PostgrestError:
+        return None
+    if not latest:
+        return None
+    row = latest[0]
+    if insight_key(user_id, row.get("summary") or {}) != key:
+        return None
+    created = datetime.fromisoformat(row["created_at"])
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=UTC)
+    settings = get_settings()
+    # Stored answers (e.g. from the nightly batch) stay reusable for longer
+    # than the in-memory TTL, since the key already pins the exact summary
+    if created.timestamp() + settings.INSIGHT_REHYDRATE_MAX_AGE_SECONDS <= time.time():
+        return None
+    return list(row.get("tips") or []), time.time() + settings.INSIGHT_CACHE_TTL_SECONDS
+
+
+async def get_or_generate(
+    repos: Repositories, user_id: str, summary: dict[str, Any], days: int
+) -> tuple[list[Any], bool]:
+    """Return ``(tips, cached)`` for a summary, calling the model only on a miss.
+
+    Raises ``InsightGenerationError`` if the model call fails.
+    """
+    cache = get_insight_cache()
+    key = insight_key(user_id, summary)
+    # 1) Hot path: same user, same summary, same prompt -> same answer
+    tips = await cache.get(key)
+    if tips is not None:
+        return tips, True
+    # 2) Cold in-memory cache: the database may already hold this answer
+    stored = await _rehydrate(repos, user_id, key)
+    if stored is not None:
+        await cache.set(key, stored[0], stored[1])
+        return stored[0], True
+
+    # 3) Miss: ask the model (failures raise and are neither cached nor stored)
+    tips = await request_tips(build_prompt(summary, days))
+
+    # 4) Best effort: store the result so it can be viewed (and rehydrated) later
+    try:
+        await repos.insights.insert({"user_id": user_id, "summary": summary, "tips": tips})
+    except PostgrestError:
+        # Non-fatal: still return tips
+        pass
+    await cache.set(key, tips, time.time() + get_settings().INSIGHT_CACHE_TTL_SECONDS)
+    return tips, False
+
+
+async def build_insight(repos: Repositories, user_id: str, days: int) -> dict[str, Any]:
+    """Summarize the user's last ``days`` days and return tips for it.
+
+    Shared by the request/response route and background jobs. Raises
+    ``PostgrestError`` (database) or ``InsightGenerationError`` (model).
+    Concurrent calls for the same user and window share one run
+    (``app.services.singleflight``); a caller whose deadline passes while it
+    waits gets the default tips, like when the model is too slow.
+    """
+    try:
+        result = await get_flight_group("insights").do(
+            (user_id, days), lambda: _build_insight(repos, user_id, days)
+        )
+    except DeadlineExceededError:
+        return fallback_insight()
+    return dict(result)  # callers may add keys; keep theirs apart
+
+
+async def _build_insight(repos: Repositories, user_id: str, days: int) -> dict[str, Any]:
+    # 1) Summary from per-user rollups (a few aggregate rows)
+    settings = get_settings()
+    summary = await RollupService(
+        repos,
+        page_size=settings.EXPORT_PAGE_SIZE,
+        rebuild_seconds=settings.ROLLUP_REBUILD_SECONDS,
+        settle_seconds=settings.SYNC_SETTLE_SECONDS,
+    ).summary(user_id, days)
+    # 2) Cached answer for an unchanged summary, else ask the model
+    try:
+        tips, cached = await get_or_generate(repos, user_id, summary, days)
+    except ModelUnavailableError:
+        # 3) Model down or too slow: default tips now, a real answer next time
+        return fallback_insight(summary)
+    return {"tips": tips, "summary": summary, "cached": cached}
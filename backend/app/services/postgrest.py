@@ -0,0 +1,172 @@
+"""Async client for Supabase's REST API (PostgREST).
+
+The official ``supabase`` Python client is synchronous: calling it from an
+``async def`` route blocks the whole event loop until the database answers.
+This module talks to the same REST endpoints with ``httpx.AsyncClient`` so a
+slow query only waits on its own request.
+
+If you're new:
+- One shared ``AsyncClient`` is reused for every call. It keeps connections
+  open ("keep-alive"), so most queries skip the TCP/TLS handshake.
+- That client lives in the client registry (``app/services/registry.py``),
+  which also warms it up at startup and closes it on shutdown.
+- Identical selects running at the same time share one request
+  (``app/services/singleflight.py``). Each caller decodes its own copy of
+  the rows, so one caller changing them cannot affect another.
+"""
+from collections.abc import Awaitable, Callable, Iterable, Sequence
+from typing import Any
+
+import httpx
+
+from app.core.config import get_settings
+from app.core.deadlines import DeadlineExceededError
+from app.core.metrics import track_upstream
+from app.core.profiling import timed
+from app.services.registry import get_registry
+from app.services.resilience import UpstreamUnavailableError, get_upstream
+from app.services.singleflight import get_flight_group
+
+# (column, "operator.value") pairs, e.g. ("user_id", "eq.123")
+Filters = Sequence[tuple[str, str]]
+
+# Writes per table made by this process. Part of the single-flight key of a
+# select, so a read issued after our own write never joins an older read.
+_writes: dict[str, int] = {}
+
+
+def _wrote(table: str) -> None:
+    _writes[table] = _writes.get(table, 0) + 1
+
+
+class PostgrestError(Exception):
+    """Raised when PostgREST answers with a non-2xx status."""
+
+    def __init__(self, status_code: int, message: str) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+def _raise_for_error(resp: httpx.Response) -> None:
+    if resp.is_success:
+        return
+    try:
+        message = resp.json().get("message") or resp.text
+    except ValueError:
+        message = resp.text
+    raise PostgrestError(resp.status_code, message)
+
+
+class PostgrestClient:
+    """Thin async wrapper over the PostgREST table endpoints."""
+
+    def __init__(self, http: httpx.AsyncClient) -> None:
+        self.http = http
+
+    async def _send(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        """Send one request; network failures surface as ``PostgrestError(503)``.
+
+        Every call is timed in the ``upstream_*`` metrics (by method and path)
+        and goes through the ``supabase`` bulkhead and circuit breaker, with
+        a timeout cut short by the request's deadline (``PostgrestError(503)``
+        when refused, ``504`` when out of time).
+        """
+        try:
+            # "db" in a profiled request's Server-Timing, waiting for a slot included
+            with timed("db"):
+                async with get_upstream("supabase").call(get_settings().SUPABASE_HTTP_TIMEOUT) as guard:
+                    with track_upstream("supabase", f"{method} {url}") as call:
+                        resp = await self.http.request(method, url, timeout=guard.timeout, **kwargs)
+                        if not resp.is_success:
+                            call["outcome"] = f"http_{resp.status_code // 100}xx"
+                            if resp.status_code >= 500:
+                                guard.fail()
+        except UpstreamUnavailableError as exc:
+            raise PostgrestError(exc.status_code, f"Supabase {exc.reason.replace('_', ' ')}") from exc
+        except httpx.TimeoutException as exc:
+            raise PostgrestError(504, f"Supabase timed out: {exc!r}") from exc
+        except httpx.HTTPError as exc:
+            raise PostgrestError(503, f"Supabase unreachable: {exc!r}") from exc
+        _raise_for_error(resp)
+        return resp
+
+    async def select(
+        self,
+        table: str,
+        columns: str = "*",
+        filters: Filters = (),
+        order: str | None = None,
+        limit: int | None = None,
+    ) -> list[dict[str, Any]]:
+        """``GET /rest/v1/<table>`` and return the decoded rows."""
+        params: list[tuple[str, str]] = [("select", columns), *filters]
+        if order:
+            params.append(("order", order))
+        if limit is not None:
+            params.append(("limit", str(limit)))
+        url = f"/rest/v1/{table}"
+        # Same pool, same query, no write since: share the request in flight
+        key = (id(self.http), url, tuple(params), _writes.get(table, 0))
+        resp = await _shared("supabase_select", key, lambda: self._send("GET", url, params=params))
+        return resp.json()
+
+    async def insert(
+        self,
+        table: str,
+        rows: Iterable[dict[str, Any]] | dict[str, Any],
+        *,
+        returning: bool = False,
+        on_conflict: str | None = None,
+    ) -> list[dict[str, Any]]:
+        """``POST /rest/v1/<table>``; with ``on_conflict`` this is an upsert."""
+        payload = rows if isinstance(rows, dict) else list(rows)
+        prefer = ["return=representation" if returning else "return=minimal"]
+        params: list[tuple[str, str]] = []
+        if on_conflict:
+            prefer.append("resolution=merge-duplicates")
+            params.append(("on_conflict", on_conflict))
+        try:
+            resp = await self._send(
+                "POST", f"/rest/v1/{table}", json=payload, params=params, headers={"Prefer": ",".join(prefer)}
+            )
+        finally:
+            _wrote(table)
+        return resp.json() if returning else []
+
+    async def update(
+        self, table: str, values: dict[str, Any], filters: Filters, *, returning: bool = False
+    ) -> list[dict[str, Any]]:
+        """``PATCH /rest/v1/<table>``: set ``values`` on every row matching ``filters``."""
+        prefer = "return=representation" if returning else "return=minimal"
+        try:
+            resp = await self._send(
+                "PATCH", f"/rest/v1/{table}", json=values, params=list(filters), headers={"Prefer": prefer}
+            )
+        finally:
+            _wrote(table)
+        return resp.json() if returning else []
+
+    async def get_auth_user(self, token: str) -> dict[str, Any]:
+        """``GET /auth/v1/user`` with the caller's JWT (remote token check)."""
+        resp = await _shared(
+            "supabase_auth",
+            (id(self.http), token),
+            lambda: self._send("GET", "/auth/v1/user", headers={"Authorization": f"Bearer {token}"}),
+        )
+        return resp.json()
+
+
+async def _shared(group: str, key: Any, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+    """Run ``send`` in a single-flight group; running out of time is a ``PostgrestError(504)``."""
+    try:
+        return await get_flight_group(group).do(key, send)
+    except DeadlineExceededError as exc:
+        # Same as a call the guard refused for lack of time
+        raise PostgrestError(504, "Supabase deadline") from exc
+
+
+def get_postgrest() -> PostgrestClient | None:
+    """Return a ``PostgrestClient`` over the shared pool (``None`` if unconfigured)."""
+    http = get_registry().http()
+    return PostgrestClient(http) if http is not None else None
@@ -0,0 +1,271 @@
+"""Token-bucket rate limits for expensive routes, per user and for everyone.
+
+One user refreshing insights in a loop costs OpenAI tokens and database
+writes for every request; one ten-year export reads thousands of rows. Each
+limited route group (``insights``, ``export``, ``analytics``) has two token
+buckets per request: the caller's own, and a global one shared by every
+user. A request takes ``cost`` tokens from both or is rejected with
+``RateLimitedError`` (HTTP 429 with ``Retry-After``, see
+``app.api.dependencies.rate_limit``).
+
+If you're new:
+- A bucket holds up to ``capacity`` tokens and refills continuously at
+  ``capacity / period`` tokens per second. A rate is written
+  ``"capacity/period"``: ``"20/3600"`` allows a burst of 20 and then one
+  more every 3 minutes.
+- Cost grows with the requested date range: one token per
+  ``*_DAYS_PER_TOKEN`` days (at least one). A range costing more than a full
+  bucket takes the full bucket, so it is still possible, once.
+- ``RATE_LIMIT_BACKEND=memory`` keeps buckets per process (plain dict
+  updates between two ``await``s, so no locks); with several uvicorn workers
+  every worker has its own buckets. ``sqlite`` keeps them in one file shared
+  by every worker on the host. A shared backend that fails lets requests
+  through rather than failing them.
+"""
+import asyncio
+import logging
+import math
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from app.core.config import get_settings
+from app.core.metrics import RATE_LIMIT_DECISIONS
+
+logger = logging.getLogger(__name__)
+
+# Route groups with their own limits (settings RATE_LIMIT_<GROUP>_*)
+ROUTE_GROUPS = ("insights", "export", "analytics")
+
+
+class RateLimitedError(Exception):
+    """A request was over its limit; retry after ``retry_after`` seconds."""
+
+    def __init__(self, group: str, scope: str, retry_after: float) -> None:
+        super().__init__(f"{group} rate limit ({scope}) exceeded, retry in {retry_after:.1f}s")
+        self.group = group
+        self.scope = scope  # "user" or "global"
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class Rate:
+    """``capacity`` tokens, refilled evenly over ``period`` seconds."""
+
+    capacity: float
+    period: float
+
+    @classmethod
+    def parse(cls, text: str) -> "Rate":
+        try:
+            capacity, period = (float(part) for part in text.split("/"))
+        except ValueError:
+            raise ValueError(f"rate {text!r} must look like '<capacity>/<seconds>', e.g. '20/3600'") from None
+        if capacity <= 0 or period <= 0:
+            raise ValueError(f"rate {text!r} must be positive")
+        return cls(capacity, period)
+
+    @property
+    def refill(self) -> float:
+        """Tokens added per second."""
+        return self.capacity / self.period
+
+
+@dataclass(frozen=True)
+class RouteLimit:
+    user: Rate
+    everyone: Rate
+    days_per_token: int
+
+    def cost(self, days: float) -> float:
+        return float(max(1, math.ceil(days / self.days_per_token)))
+
+
+def take(tokens: float, updated_at: float, rate: Rate, cost: float, now: float) -> tuple[float, float]:
+    """Refill a bucket to ``now`` and try to take ``cost`` tokens.
+
+    Returns ``(tokens left, seconds to wait)``; the wait is 0 when the tokens
+    were taken, else the bucket is unchanged apart from the refill.
+    """
+    tokens = min(rate.capacity, tokens + (now - updated_at) * rate.refill)
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return tokens, (cost - tokens) / rate.refill
+
+
+class MemoryBuckets:
+    """Buckets in a dict of ``key -> (tokens, updated_at, full_at)`` in this process."""
+
+    MAX_BUCKETS = 100_000
+
+    def __init__(self) -> None:
+        self._buckets: dict[str, tuple[float, float, float]] = {}
+
+    async def take(self, key: str, rate: Rate, cost: float) -> float:
+        now = time.monotonic()
+        tokens, updated_at, _ = self._buckets.get(key, (rate.capacity, now, now))
+        tokens, wait = take(tokens, updated_at, rate, cost, now)
+        self._buckets[key] = (tokens, now, now + (rate.capacity - tokens) / rate.refill)
+        if len(self._buckets) > self.MAX_BUCKETS:
+            self._prune(now)
+        return wait
+
+    async def refund(self, key: str, rate: Rate, cost: float) -> None:
+        item = self._buckets.get(key)
+        if item is not None:
+            tokens = min(rate.capacity, item[0] + cost)
+            self._buckets[key] = (tokens, item[1], item[1] + (rate.capacity - tokens) / rate.refill)
+
+    def _prune(self, now: float) -> None:
+        # A bucket that has refilled completely is the same as no bucket
+        for key in [k for k, (_, _, full_at) in self._buckets.items() if full_at <= now]:
+            del self._buckets[key]
+
+    async def close(self) -> None:
+        self._buckets.clear()
+
+
+class SQLiteBuckets:
+    """Buckets in a local SQLite file shared by every worker on the host.
+
+    Each decision is one ``begin immediate`` transaction, so two processes
+    can never spend the same tokens.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.execute("pragma journal_mode=wal")
+        self._conn.execute("pragma synchronous=normal")
+        self._conn.execute(
+            "create table if not exists rate_buckets (key text primary key, tokens real not null,"
+            " updated_at real not null) without rowid"
+        )
+        self._lock = threading.Lock()
+
+    async def _run(self, fn: Any, *args: Any) -> Any:
+        def work() -> Any:
+            with self._lock:
+                self._conn.execute("begin immediate")
+                try:
+                    result = fn(*args)
+                except BaseException:
+                    self._conn.execute("rollback")
+                    raise
+                self._conn.execute("commit")
+                return result
+
+        return await asyncio.to_thread(work)
+
+    def _take(self, key: str, rate: Rate, cost: float) -> float:
+        now = time.time()  # wall clock: shared between processes
+        row = self._conn.execute("select tokens, updated_at from rate_buckets where key = ?", (key,)).fetchone()
+        tokens, wait = take(row[0], row[1], rate, cost, now) if row else take(rate.capacity, now, rate, cost, now)
+        self._conn.execute(
+            "insert into rate_buckets (key, tokens, updated_at) values (?, ?, ?)"
+            " on conflict (key) do update set tokens = excluded.tokens, updated_at = excluded.updated_at",
+            (key, tokens, now),
+        )
+        return wait
+
+    def _refund(self, key: str, rate: Rate, cost: float) -> None:
+        self._conn.execute(
+            "update rate_buckets set tokens = min(?, tokens + ?) where key = ?", (rate.capacity, cost, key)
+        )
+
+    async def take(self, key: str, rate: Rate, cost: float) -> float:
+        return await self._run(self._take, key, rate, cost)
+
+    async def refund(self, key: str, rate: Rate, cost: float) -> None:
+        await self._run(self._refund, key, rate, cost)
+
+    async def close(self) -> None:
+        self._conn.close()
+
+
+class RateLimiter:
+    """Admission control: per-user then global bucket for a route group."""
+
+    def __init__(self, buckets: Any, limits: dict[str, RouteLimit]) -> None:
+        self.buckets = buckets
+        self.limits = limits
+        self._failing = False
+
+    async def admit(self, group: str, user_id: str, days: float = 1.0) -> None:
+        """Spend the request's tokens or raise ``RateLimitedError``."""
+        limit = self.limits[group]
+        cost = limit.cost(days)
+        # A cost above a bucket's size takes the whole (full) bucket
+        user_cost = min(cost, limit.user.capacity)
+        everyone_cost = min(cost, limit.everyone.capacity)
+        user_key, everyone_key = f"{group}:user:{user_id}", f"{group}:global"
+        try:
+            # 1) The caller's own bucket first: a noisy user is stopped here
+            #    without draining the bucket everyone shares
+            wait = await self.buckets.take(user_key, limit.user, user_cost)
+            if wait:
+                self._reject(group, "user", wait)
+            # 2) The global bucket; if it is empty, give the user's tokens back
+            wait = await self.buckets.take(everyone_key, limit.everyone, everyone_cost)
+            if wait:
+                await self.buckets.refund(user_key, limit.user, user_cost)
+                self._reject(group, "global", wait)
+        except sqlite3.Error as exc:
+            # 3) A broken shared backend must not take the routes down with it
+            if not self._failing:
+                logger.warning("Rate limit backend unavailable, admitting requests: %s", exc)
+                self._failing = True
+            RATE_LIMIT_DECISIONS.labels(group, "error").inc()
+            return
+        self._failing = False
+        RATE_LIMIT_DECISIONS.labels(group, "admitted").inc()
+
+    @staticmethod
+    def _reject(group: str, scope: str, wait: float) -> None:
+        RATE_LIMIT_DECISIONS.labels(group, f"rejected_{scope}").inc()
+        raise RateLimitedError(group, scope, wait)
+
+    async def close(self) -> None:
+        await self.buckets.close()
+
+
+_limiter: RateLimiter | None = None
+
+
+def _limits_from_settings() -> dict[str, RouteLimit]:
+    settings = get_settings()
+    return {
+        group: RouteLimit(
+            user=Rate.parse(getattr(settings, f"RATE_LIMIT_{group.upper()}_USER")),
+            everyone=Rate.parse(getattr(settings, f"RATE_LIMIT_{group.upper()}_GLOBAL")),
+            days_per_token=getattr(settings, f"RATE_LIMIT_{group.upper()}_DAYS_PER_TOKEN"),
+        )
+        for group in ROUTE_GROUPS
+    }
+
+
+def get_rate_limiter() -> RateLimiter | None:
+    """The process-wide limiter, or ``None`` when ``RATE_LIMIT_ENABLED`` is off."""
+    global _limiter
+    settings = get_settings()
+    if not settings.RATE_LIMIT_ENABLED:
+        return None
+    if _limiter is None:
+        kind = settings.RATE_LIMIT_BACKEND.lower()
+        if kind == "sqlite":
+            buckets: Any = SQLiteBuckets(settings.RATE_LIMIT_SQLITE_PATH)
+        elif kind == "memory":
+            buckets = MemoryBuckets()
+        else:
+            raise ValueError(f"Unknown RATE_LIMIT_BACKEND {settings.RATE_LIMIT_BACKEND!r} (memory or sqlite)")
+        _limiter = RateLimiter(buckets, _limits_from_settings())
+    return _limiter
+
+
+async def close_rate_limiter() -> None:
+    """Close the shared backend (app shutdown); recreated on next use."""
+    global _limiter
+    limiter, _limiter = _limiter, None
+    if limiter is not None:
+        await limiter.close()
@@ -0,0 +1,160 @@
+"""One place that owns every outbound client (Supabase, OpenAI).
+
+Before, clients were created in several modules: some at import time (which
+raised if an env var was missing), some on the first request (which then
+paid for connection setup). The registry:
+
+- reads everything from ``core.config.Settings``
+- imports the heavy ``openai`` SDK only when first needed, so the app
+  starts (and binds its port) quickly
+- warms up connections in the background right after startup, so the first
+  real request finds an open keep-alive connection
+- closes everything on shutdown
+
+Usage::
+
+    registry = get_registry()
+    http = registry.http()        # pooled httpx.AsyncClient for PostgREST, or None
+    openai = registry.openai()    # AsyncOpenAI, or None without OPENAI_API_KEY
+"""
+import asyncio
+import importlib
+import logging
+import time
+from typing import Any
+
+import httpx
+
+from app.core.config import Settings, get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class ClientRegistry:
+    """Lazily built, shared clients for Supabase and OpenAI."""
+
+    def __init__(self, settings: Settings) -> None:
+        self.settings = settings
+        self._http: httpx.AsyncClient | None = None
+        self._openai: Any = None
+        self._warmup: asyncio.Task | None = None
+        self.warmup_seconds: float | None = None
+
+    @property
+    def supabase_key(self) -> str | None:
+        # Service role on the backend (never expose it to the frontend)
+        return self.settings.SUPABASE_SERVICE_ROLE_KEY or self.settings.SUPABASE_ANON_KEY
+
+    @property
+    def supabase_configured(self) -> bool:
+        return bool(self.settings.SUPABASE_URL and self.supabase_key)
+
+    def http(self) -> httpx.AsyncClient | None:
+        """Pooled HTTP client for Supabase's REST/auth APIs (``None`` if unconfigured).
+
+        Pool sizes and timeouts come from ``SUPABASE_HTTP_*``.
+        """
+        if self._http is not None and not self._http.is_closed:
+            return self._http
+        if not self.supabase_configured:
+            return None
+        settings = self.settings
+        # 1) Connection pool with keep-alive so requests reuse open sockets
+        limits = httpx.Limits(
+            max_connections=settings.SUPABASE_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.SUPABASE_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.SUPABASE_HTTP_KEEPALIVE_EXPIRY,
+        )
+        # 2) Every request carries the project key
+        key = self.supabase_key
+        self._http = httpx.AsyncClient(
+            base_url=settings.SUPABASE_URL.rstrip("/"),  # type: ignore[union-attr]
+            headers={"apikey": key, "Authorization": f"Bearer {key}"},  # type: ignore[dict-item]
+            limits=limits,
+            timeout=httpx.Timeout(settings.SUPABASE_HTTP_TIMEOUT),
+        )
+        return self._http
+
+    def openai(self) -> Any:
+        """Shared ``AsyncOpenAI`` client, or ``None`` without a key or the package."""
+        if self._openai is not None:
+            return self._openai
+        settings = self.settings
+        if not settings.OPENAI_API_KEY:
+            return None
+        try:
+            # Deferred: importing openai costs a few hundred ms at startup
+            from openai import AsyncOpenAI
+        except ImportError:  # pragma: no cover - optional dependency
+            return None
+        self._openai = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            timeout=settings.OPENAI_TIMEOUT_SECONDS,
+            max_retries=0,
+        )
+        return self._openai
+
+    def start_warmup(self) -> None:
+        """Open connections in the background (does not delay startup)."""
+        if self._warmup is None and self.settings.CLIENT_WARMUP_ENABLED:
+            self._warmup = asyncio.create_task(self.warm_up(), name="client-warmup")
+            self._warmup.add_done_callback(_log_warmup_failure)
+
+    async def warm_up(self) -> None:
+        """Build the clients and open ``SUPABASE_HTTP_WARM_CONNECTIONS`` sockets."""
+        started = time.perf_counter()
+        # 1) Concurrent tiny requests, so several pooled connections are
+        #    already through DNS + TCP + TLS before real traffic arrives
+        http = self.http()
+        if http is not None:
+            count = max(1, self.settings.SUPABASE_HTTP_WARM_CONNECTIONS)
+            results = await asyncio.gather(
+                *(http.get("/auth/v1/health") for _ in range(count)), return_exceptions=True
+            )
+            failed = [r for r in results if isinstance(r, Exception)]
+            if failed:
+                logger.warning("Supabase warm-up: %d/%d requests failed: %r", len(failed), count, failed[0])
+        # 2) Import the SDK off the event loop, then build the client on it:
+        #    a request calling openai() meanwhile finds it or builds it first,
+        #    never a second client racing in another thread
+        if self.settings.OPENAI_API_KEY:
+            try:
+                await asyncio.to_thread(importlib.import_module, "openai")
+            except ImportError:  # pragma: no cover - optional dependency
+                pass
+        self.openai()
+        self.warmup_seconds = time.perf_counter() - started
+
+    async def aclose(self) -> None:
+        """Stop warm-up and close every client (application shutdown)."""
+        if self._warmup is not None:
+            self._warmup.cancel()
+            await asyncio.gather(self._warmup, return_exceptions=True)
+            self._warmup = None
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        if self._openai is not None:
+            await self._openai.close()
+            self._openai = None
+
+
+def _log_warmup_failure(task: "asyncio.Task[None]") -> None:
+    """Retrieve the warm-up's exception, so it is logged instead of lost."""
+    if task.cancelled():
+        return
+    exc = task.exception()
+    if exc is not None:
+        logger.warning("Client warm-up failed: %r", exc, exc_info=exc)
+
+
+_registry: ClientRegistry | None = None
+
+
+def get_registry() -> ClientRegistry:
+    """Return the process-wide client registry."""
+    global _registry
+    if _registry is None:
+        _registry = ClientRegistry(get_settings())
+    return _registry
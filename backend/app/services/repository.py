@@ -0,0 +1,460 @@
+"""Async data-access layer: one small repository per table.
+
+Routes call these typed methods instead of building queries inline. Every
+method is ``async`` and goes through the shared, pooled PostgREST client, so
+database round-trips never block the event loop.
+
+Example::
+
+    repos = get_repositories()
+    rows = await repos.tracking.list_range(user_id, start, end)
+"""
+from collections.abc import AsyncIterator, Sequence
+from dataclasses import dataclass
+from datetime import UTC, date, datetime, timedelta
+from typing import Any, cast
+
+from app.schemas.rows import (
+    ForecastRow,
+    ForecastWatermarkRow,
+    InsightRow,
+    PeptideRow,
+    ProfileRow,
+    RollupRow,
+    RollupWatermarkRow,
+    ScheduleRow,
+    TrackingRow,
+)
+from app.services.postgrest import PostgrestClient, get_postgrest
+
+# A keyset position: (value of the ordering column, row id)
+Cursor = tuple[str, str]
+
+
+def after_filter(key: str, cursor: Cursor) -> tuple[str, str]:
+    """PostgREST filter for rows strictly after ``cursor`` in ``(key, id)`` order."""
+    value, last_id = cursor
+    return ("or", f'({key}.gt."{value}",and({key}.eq."{value}",id.gt."{last_id}"))')
+
+
+# Smallest possible id: a position just before every row stamped at one instant
+FIRST_ID = "00000000-0000-0000-0000-000000000000"
+
+
+def settled(value: str, before: datetime) -> bool:
+    """Whether the timestamp ``value`` (naive means UTC) is at or before ``before``."""
+    stamp = datetime.fromisoformat(value)
+    if stamp.tzinfo is None:
+        stamp = stamp.replace(tzinfo=UTC)
+    return stamp <= before
+
+
+def settled_cursor(cursor: Cursor, settle_seconds: float) -> Cursor:
+    """``cursor``, held back to ``now - settle_seconds`` if it is more recent.
+
+    Postgres stamps ``updated_at`` with the *transaction start* time, so a
+    slow transaction can commit a row "in the past". A watermark that never
+    passes the settle line reads recent rows again next time instead of
+    skipping late commits (``SYNC_SETTLE_SECONDS``).
+    """
+    settle_before = datetime.now(UTC) - timedelta(seconds=settle_seconds)
+    if settled(cursor[0], settle_before):
+        return cursor
+    return (settle_before.isoformat(), FIRST_ID)
+
+
+def in_filter(column: str, values: Sequence[str]) -> tuple[str, str]:
+    """PostgREST filter for ``column`` being one of ``values`` (ids, not free text)."""
+    return (column, f"in.({','.join(values)})")
+
+
+async def _changed_since(
+    db: PostgrestClient, table: str, user_id: str, key: str, after: Cursor | None, limit: int
+) -> list[dict[str, Any]]:
+    """One page of a user's rows ordered by ``(key, id)``, after ``after``."""
+    filters: list[tuple[str, str]] = [("user_id", f"eq.{user_id}")]
+    if after is not None:
+        filters.append(after_filter(key, after))
+    return await db.select(table, "*", filters, order=f"{key}.asc,id.asc", limit=limit)
+
+
+async def _iter_changed(
+    db: PostgrestClient, table: str, after: Cursor | None, columns: Sequence[str], page_size: int
+) -> AsyncIterator[list[dict[str, Any]]]:
+    """Every user's rows written after ``after``, in ``(updated_at, id)`` pages."""
+    while True:
+        filters = [after_filter("updated_at", after)] if after is not None else []
+        rows = await db.select(table, ",".join(columns), filters, order="updated_at.asc,id.asc", limit=page_size)
+        if not rows:
+            return
+        yield rows
+        if len(rows) < page_size:
+            return
+        after = (rows[-1]["updated_at"], rows[-1]["id"])
+
+
+async def _list_in(
+    db: PostgrestClient,
+    table: str,
+    column: str,
+    values: Sequence[str],
+    columns: Sequence[str],
+    key: str,
+    page_size: int,
+) -> list[dict[str, Any]]:
+    """All rows with ``column`` in ``values``, read in keyset pages on the unique ``key``.
+
+    A single ``in.(...)`` select would stop at PostgREST's max-rows cap
+    (1000 by default) without any error, however many rows match.
+    """
+    select = list(columns)
+    if "*" not in select and key not in select:
+        select.append(key)
+    found: list[dict[str, Any]] = []
+    last: str | None = None
+    while True:
+        filters = [in_filter(column, values)]
+        if last is not None:
+            filters.append((key, f"gt.{last}"))
+        rows = await db.select(table, ",".join(select), filters, order=f"{key}.asc", limit=page_size)
+        found.extend(rows)
+        if len(rows) < page_size:
+            return found
+        last = rows[-1][key]
+
+
+class TrackingRepository:
+    """Queries for the ``daily_tracking`` table."""
+
+    table = "daily_tracking"
+
+    def __init__(self, db: PostgrestClient) -> None:
+        self.db = db
+
+    async def list_range(
+        self,
+        user_id: str,
+        start: datetime | None,
+        end: datetime | None,
+        columns: Sequence[str] = ("*",),
+        descending: bool = False,
+    ) -> list[TrackingRow]:
+        """Return a user's rows with ``start <= created_at <= end``, ordered by time."""
+        filters = [("user_id", f"eq.{user_id}")]
+        if start is not None:
+            filters.append(("created_at", f"gte.{start.isoformat()}"))
+        if end is not None:
+            filters.append(("created_at", f"lte.{end.isoformat()}"))
+        order = "created_at.desc" if descending else "created_at.asc"
+        rows = await self.db.select(self.table, ",".join(columns), filters, order=order)
+        return cast(list[TrackingRow], rows)
+
+    async def iter_pages(
+        self,
+        user_id: str | None,
+        start: datetime | None,
+        end: datetime | None,
+        columns: Sequence[str] = ("*",),
+        page_size: int = 1000,
+        after: tuple[str, str] | None = None,
+        key: str = "created_at",
+        user_ids: Sequence[str] | None = None,
+    ) -> AsyncIterator[list[TrackingRow]]:
+        """Yield a user's rows in ``(key, id)`` order, one page at a time.
+
+        Uses keyset pagination: each page asks for rows *after* the last
+        ``(created_at, id)`` seen, instead of ``OFFSET``. Every page costs the
+        same index lookup no matter how deep into the range we are, and only
+        one page is held in memory at a time.
+
+        ``key`` is the ordering column (``created_at`` by default, or
+        ``updated_at`` to follow writes) and ``after`` an optional
+        ``(key value, id)`` to resume from. ``start``/``end`` always filter on
+        ``created_at``. ``user_id=None`` reads every user's rows (batch jobs),
+        or those of ``user_ids`` when given.
+        """
+        select = list(columns)
+        if "*" not in select:
+            # Both cursor columns are needed to ask for the next page
+            select += [c for c in (key, "id") if c not in select]
+        base = [("user_id", f"eq.{user_id}")] if user_id is not None else []
+        if user_ids is not None:
+            base.append(in_filter("user_id", user_ids))
+        if start is not None:
+            base.append(("created_at", f"gte.{start.isoformat()}"))
+        if end is not None:
+            base.append(("created_at", f"lte.{end.isoformat()}"))
+
+        cursor = after
+        while True:
+            filters = list(base)
+            if cursor is not None:
+                filters.append(after_filter(key, cursor))
+            rows = cast(
+                list[TrackingRow],
+                await self.db.select(
+                    self.table, ",".join(select), filters, order=f"{key}.asc,id.asc", limit=page_size
+                ),
+            )
+            if not rows:
+                return
+            yield rows
+            if len(rows) < page_size:
+                return
+            cursor = (rows[-1][key], rows[-1]["id"])  # type: ignore[literal-required]
+
+    async def changed_since(self, user_id: str, after: Cursor | None, limit: int) -> list[TrackingRow]:
+        """Rows written (inserted or updated) after ``after``, by ``(updated_at, id)``."""
+        rows = await _changed_since(self.db, self.table, user_id, "updated_at", after, limit)
+        return cast(list[TrackingRow], rows)
+
+    async def last_write(self, user_id: str | None = None) -> Cursor | None:
+        """``(updated_at, id)`` of the most recent write (by ``user_id``, or anyone), if any."""
+        filters = [("user_id", f"eq.{user_id}")] if user_id is not None else []
+        rows = await self.db.select(self.table, "id,updated_at", filters, order="updated_at.desc,id.desc", limit=1)
+        return (rows[0]["updated_at"], rows[0]["id"]) if rows else None
+
+    async def upsert_many(self, rows: Sequence[TrackingRow]) -> None:
+        """Insert rows, or update existing ones with the same ``id`` (one request).
+
+        Every row must have the same keys; callers chunk large batches.
+        """
+        if rows:
+            await self.db.insert(self.table, [dict(r) for r in rows], on_conflict="id")
+
+
+class InsightsRepository:
+    """Queries for the ``insights`` table."""
+
+    table = "insights"
+
+    def __init__(self, db: PostgrestClient) -> None:
+        self.db = db
+
+    async def insert(self, row: InsightRow) -> None:
+        """Store one generated insight."""
+        await self.db.insert(self.table, dict(row))
+
+    async def insert_many(self, rows: Sequence[InsightRow]) -> None:
+        """Store many insights in one request (callers chunk large batches)."""
+        if rows:
+            await self.db.insert(self.table, [dict(r) for r in rows])
+
+    async def latest(self, user_id: str, limit: int = 1) -> list[InsightRow]:
+        """Return the user's most recent insights, newest first."""
+        rows = await self.db.select(
+            self.table, "*", [("user_id", f"eq.{user_id}")], order="created_at.desc", limit=limit
+        )
+        return cast(list[InsightRow], rows)
+
+    async def changed_since(self, user_id: str, after: Cursor | None, limit: int) -> list[InsightRow]:
+        """Insights created after ``after``, by ``(created_at, id)`` (rows are never updated)."""
+        rows = await _changed_since(self.db, self.table, user_id, "created_at", after, limit)
+        return cast(list[InsightRow], rows)
+
+
+class ProfilesRepository:
+    """Queries for the ``profiles`` table."""
+
+    table = "profiles"
+
+    def __init__(self, db: PostgrestClient) -> None:
+        self.db = db
+
+    async def sample(self, limit: int = 1) -> list[ProfileRow]:
+        """Return a few profile rows (used by the DB sanity check)."""
+        return cast(list[ProfileRow], await self.db.select(self.table, "*", limit=limit))
+
+
+class PeptidesRepository:
+    """Queries for the ``peptides`` (inventory) table."""
+
+    table = "peptides"
+
+    def __init__(self, db: PostgrestClient) -> None:
+        self.db = db
+
+    async def list_for_user(self, user_id: str) -> list[PeptideRow]:
+        """Return a user's inventory ordered by name."""
+        rows = await self.db.select(self.table, "*", [("user_id", f"eq.{user_id}")], order="name.asc")
+        return cast(list[PeptideRow], rows)
+
+    async def list_for_users(
+        self, user_ids: Sequence[str], columns: Sequence[str] = ("*",), page_size: int = 1000
+    ) -> list[PeptideRow]:
+        """Return the inventory of several users at once (batch jobs), ordered by id."""
+        if not user_ids:
+            return []
+        rows = await _list_in(self.db, self.table, "user_id", user_ids, columns, "id", page_size)
+        return cast(list[PeptideRow], rows)
+
+    async def changed_since(self, user_id: str, after: Cursor | None, limit: int) -> list[PeptideRow]:
+        """Inventory rows written after ``after``, by ``(updated_at, id)``."""
+        rows = await _changed_since(self.db, self.table, user_id, "updated_at", after, limit)
+        return cast(list[PeptideRow], rows)
+
+    async def iter_changed(
+        self, after: Cursor | None, columns: Sequence[str] = ("id", "user_id", "updated_at"), page_size: int = 1000
+    ) -> AsyncIterator[list[PeptideRow]]:
+        """Every user's inventory rows written after ``after``, page by page."""
+        async for rows in _iter_changed(self.db, self.table, after, columns, page_size):
+            yield cast(list[PeptideRow], rows)
+
+
+class ForecastsRepository:
+    """Queries for ``inventory_forecasts`` and ``inventory_forecast_watermarks``."""
+
+    table = "inventory_forecasts"
+    watermarks_table = "inventory_forecast_watermarks"
+
+    def __init__(self, db: PostgrestClient) -> None:
+        self.db = db
+
+    async def list_for_users(self, user_ids: Sequence[str], page_size: int = 1000) -> list[ForecastRow]:
+        """Stored forecasts for every peptide of ``user_ids``."""
+        if not user_ids:
+            return []
+        rows = await _list_in(self.db, self.table, "user_id", user_ids, ("*",), "peptide_id", page_size)
+        return cast(list[ForecastRow], rows)
+
+    async def upsert_many(self, rows: Sequence[ForecastRow]) -> None:
+        """Insert or replace forecasts by ``peptide_id`` (callers chunk large batches)."""
+        if rows:
+            await self.db.insert(self.table, [dict(r) for r in rows], on_conflict="peptide_id")
+
+    async def get_watermarks(self) -> dict[str, Cursor]:
+        """Last ``(updated_at, id)`` seen per source table by the incremental refresh."""
+        rows = cast(list[ForecastWatermarkRow], await self.db.select(self.watermarks_table, "*"))
+        return {r["source"]: (r["last_updated_at"], r["last_id"]) for r in rows}
+
+    async def set_watermark(self, source: str, cursor: Cursor) -> None:
+        row = ForecastWatermarkRow(source=source, last_updated_at=cursor[0], last_id=cursor[1])
+        await self.db.insert(self.watermarks_table, dict(row), on_conflict="source")
+
+
+class SchedulesRepository:
+    """Queries for ``dose_schedules`` (recurrence rules, see ``app.services.schedules``)."""
+
+    table = "dose_schedules"
+
+    def __init__(self, db: PostgrestClient) -> None:
+        self.db = db
+
+    async def list_for_user(self, user_id: str) -> list[ScheduleRow]:
+        """The user's active schedules, oldest first."""
+        rows = await self.db.select(
+            self.table, "*", [("user_id", f"eq.{user_id}"), ("active", "is.true")], order="created_at.asc,id.asc"
+        )
+        return cast(list[ScheduleRow], rows)
+
+    async def insert(self, row: ScheduleRow) -> ScheduleRow:
+        rows = await self.db.insert(self.table, dict(row), returning=True)
+        return cast(ScheduleRow, rows[0])
+
+    async def deactivate(self, user_id: str, schedule_id: str) -> ScheduleRow | None:
+        """Switch a schedule off (kept, so incremental readers see the change)."""
+        rows = await self.db.update(
+            self.table,
+            {"active": False},
+            [("id", f"eq.{schedule_id}"), ("user_id", f"eq.{user_id}")],
+            returning=True,
+        )
+        return cast(ScheduleRow, rows[0]) if rows else None
+
+    async def iter_changed(
+        self, after: Cursor | None, columns: Sequence[str] = ("*",), page_size: int = 1000
+    ) -> AsyncIterator[list[ScheduleRow]]:
+        """Every user's schedules written (created, edited, switched off) after ``after``."""
+        async for rows in _iter_changed(self.db, self.table, after, columns, page_size):
+            yield cast(list[ScheduleRow], rows)
+
+
+class RollupsRepository:
+    """Queries for ``tracking_rollups`` and ``tracking_rollup_watermarks``."""
+
+    table = "tracking_rollups"
+    watermarks_table = "tracking_rollup_watermarks"
+
+    def __init__(self, db: PostgrestClient) -> None:
+        self.db = db
+
+    async def get_watermark(self, user_id: str) -> RollupWatermarkRow | None:
+        """Return the last ``(updated_at, id)`` folded into the user's rollups."""
+        rows = await self.db.select(self.watermarks_table, "*", [("user_id", f"eq.{user_id}")], limit=1)
+        return cast(RollupWatermarkRow, rows[0]) if rows else None
+
+    async def set_watermark(self, row: RollupWatermarkRow) -> None:
+        await self.db.insert(self.watermarks_table, dict(row), on_conflict="user_id")
+
+    async def list_buckets(
+        self, user_id: str, ranges: Sequence[tuple[str, date, date]], page_size: int = 1000
+    ) -> list[RollupRow]:
+        """Return rollup rows matching any ``(period, first, last)`` bucket range.
+
+        Rows come in ``(period, bucket_start)`` pages of ``page_size``, so a
+        long rebuild never runs into PostgREST's max-rows cap: after each full
+        page, the ranges are trimmed to start after the last bucket seen.
+        """
+        found: list[RollupRow] = []
+        remaining = list(ranges)
+        while remaining:
+            clauses = ",".join(
+                f"and(period.eq.{period},bucket_start.gte.{first.isoformat()},bucket_start.lte.{last.isoformat()})"
+                for period, first, last in remaining
+            )
+            rows = cast(
+                list[RollupRow],
+                await self.db.select(
+                    self.table,
+                    "*",
+                    [("user_id", f"eq.{user_id}"), ("or", f"({clauses})")],
+                    order="period.asc,bucket_start.asc",
+                    limit=page_size,
+                ),
+            )
+            found.extend(rows)
+            if len(rows) < page_size:
+                break
+            # Keyset step: "day" sorts before "week", so earlier periods are done
+            period, start = rows[-1]["period"], date.fromisoformat(rows[-1]["bucket_start"])
+            remaining = [
+                (p, max(first, start + timedelta(days=1)) if p == period else first, last)
+                for p, first, last in remaining
+                if p >= period
+            ]
+            remaining = [r for r in remaining if r[1] <= r[2]]
+        return found
+
+    async def upsert_buckets(self, rows: Sequence[RollupRow], chunk_size: int = 1000) -> None:
+        for i in range(0, len(rows), chunk_size):
+            chunk = [dict(r) for r in rows[i : i + chunk_size]]
+            await self.db.insert(self.table, chunk, on_conflict="user_id,period,bucket_start")
+
+
+@dataclass(frozen=True)
+class Repositories:
+    """All table repositories, sharing one PostgREST client."""
+
+    tracking: TrackingRepository
+    insights: InsightsRepository
+    profiles: ProfilesRepository
+    peptides: PeptidesRepository
+    rollups: RollupsRepository
+    forecasts: ForecastsRepository
+    schedules: SchedulesRepository
+
+
+def get_repositories() -> Repositories | None:
+    """Return repositories over the shared pool, or ``None`` if Supabase is unconfigured."""
+    db = get_postgrest()
+    if db is None:
+        return None
+    return Repositories(
+        tracking=TrackingRepository(db),
+        insights=InsightsRepository(db),
+        profiles=ProfilesRepository(db),
+        peptides=PeptidesRepository(db),
+        rollups=RollupsRepository(db),
+        forecasts=ForecastsRepository(db),
+        schedules=SchedulesRepository(db),
+    )
@@ -0,0 +1,246 @@
+"""Bulkheads and circuit breakers around Supabase and OpenAI calls.
+
+When an upstream stalls, every request waiting on it holds a worker slot,
+a pooled connection and memory until its timeout fires, and new requests
+keep joining the queue. Each upstream here gets:
+
+- a *deadline-aware timeout*: the smaller of the client's own timeout and
+  what is left of the request's deadline (``app.core.deadlines``)
+- a *bulkhead*: at most ``*_MAX_CONCURRENT_CALLS`` calls at once. Others
+  wait for a slot, but never longer than their timeout, so a stalled
+  upstream cannot take every request in the worker down with it
+- a *circuit breaker*: after ``BREAKER_FAILURE_THRESHOLD`` failures in a
+  row (timeouts, connection errors, 5xx), calls fail at once for
+  ``BREAKER_RESET_SECONDS``; then one trial call decides whether to close
+  it again
+
+Usage::
+
+    async with get_upstream("openai").call(settings.OPENAI_TIMEOUT_SECONDS) as call:
+        await client.chat.completions.create(..., timeout=call.timeout)
+
+If you're new:
+- A call that is not attempted (breaker open, no slot in time, no time left)
+  or that times out raises ``UpstreamUnavailableError``. Callers turn it into
+  their own error (``PostgrestError(503/504)``) or a fallback (default tips).
+- Client errors (4xx other than 429) mean the upstream is up, so they never
+  open a breaker. A 5xx *response* is not an exception: mark it with
+  ``call.fail()``.
+- Breakers are per process. Their state is in ``GET /api/v1/health`` (which
+  reports ``"status": "degraded"`` while one is open) and ``/metrics``.
+"""
+import asyncio
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any
+
+from app.core.config import get_settings
+from app.core.deadlines import DeadlineExceededError, call_timeout
+from app.core.metrics import BREAKER_TRANSITIONS, UPSTREAM_REJECTIONS
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+UPSTREAMS = ("supabase", "openai")
+
+
+class UpstreamUnavailableError(Exception):
+    """An upstream call was refused or timed out (``reason`` says which)."""
+
+    def __init__(self, upstream: str, reason: str) -> None:
+        super().__init__(f"{upstream} unavailable: {reason.replace('_', ' ')}")
+        self.upstream = upstream
+        # "circuit_open", "bulkhead_full", "deadline" or "timeout"
+        self.reason = reason
+
+    @property
+    def status_code(self) -> int:
+        """HTTP status for clients: 504 when time ran out, else 503."""
+        return 504 if self.reason in ("deadline", "timeout") else 503
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half open -> closed."""
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float) -> None:
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.failures = 0  # in a row
+        self.opens = 0  # times it has opened
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() >= self._opened_at + self.reset_seconds:
+            self._move(HALF_OPEN)
+        return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go out now (half open: one trial at a time)."""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._trial_running = False
+        if self._state != CLOSED:
+            self._move(CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_running = False
+        if self._state == HALF_OPEN or (self._state == CLOSED and self.failures >= self.failure_threshold):
+            self._opened_at = time.monotonic()
+            self.opens += 1
+            self._move(OPEN)
+
+    def record_abandoned(self) -> None:
+        """The call ended without telling us anything (e.g. it was cancelled)."""
+        self._trial_running = False
+
+    def _move(self, state: str) -> None:
+        self._state = state
+        BREAKER_TRANSITIONS.labels(self.name, state).inc()
+
+    def snapshot(self) -> dict[str, Any]:
+        state = self.state
+        snap: dict[str, Any] = {"state": state, "consecutive_failures": self.failures, "opens": self.opens}
+        if state == OPEN:
+            snap["retry_in_seconds"] = round(self._opened_at + self.reset_seconds - time.monotonic(), 1)
+        return snap
+
+
+class Call:
+    """One guarded call: its ``timeout`` (seconds) and a way to report a failed response."""
+
+    __slots__ = ("timeout", "failed")
+
+    def __init__(self, timeout: float) -> None:
+        self.timeout = timeout
+        self.failed = False
+
+    def fail(self) -> None:
+        self.failed = True
+
+
+def _is_failure(exc: BaseException) -> bool:
+    # Client errors (bad request, auth) say the upstream is up; 429 means it is overloaded
+    status = getattr(exc, "status_code", None)
+    return not (isinstance(status, int) and 400 <= status < 500 and status != 429)
+
+
+class Upstream:
+    """Bulkhead + breaker + deadline-aware timeout for one dependency."""
+
+    def __init__(self, name: str, max_concurrent: int, breaker: CircuitBreaker) -> None:
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.breaker = breaker
+        self.in_flight = 0
+        self.rejected: dict[str, int] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._slots: asyncio.Semaphore | None = None
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # Semaphores belong to one event loop (tests and scripts may run several)
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._loop is not loop:
+            self._loop, self._slots = loop, asyncio.Semaphore(self.max_concurrent)
+        return self._slots
+
+    def _reject(self, reason: str) -> UpstreamUnavailableError:
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        UPSTREAM_REJECTIONS.labels(self.name, reason).inc()
+        return UpstreamUnavailableError(self.name, reason)
+
+    @asynccontextmanager
+    async def call(self, default_timeout: float) -> AsyncIterator[Call]:
+        """Guard the block: yields a ``Call`` whose ``timeout`` the client should use."""
+        # 1) Time budget for this call (the request may already be out of time)
+        try:
+            timeout = call_timeout(default_timeout)
+        except DeadlineExceededError:
+            raise self._reject("deadline") from None
+        started = time.monotonic()
+        # 2) Fail fast while the breaker is open
+        if not self.breaker.allow():
+            raise self._reject("circuit_open")
+        # 3) Wait for a bulkhead slot, never longer than the call may take
+        slots = self._semaphore()
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout)
+        except TimeoutError:
+            self.breaker.record_abandoned()
+            raise self._reject("bulkhead_full") from None
+        except BaseException:
+            self.breaker.record_abandoned()
+            raise
+        call = Call(max(0.001, timeout - (time.monotonic() - started)))
+        self.in_flight += 1
+        try:
+            # 4) Run the block under what is left of the budget
+            try:
+                async with asyncio.timeout(call.timeout):
+                    yield call
+            except TimeoutError:
+                self.breaker.record_failure()
+                raise self._reject("timeout") from None
+            except asyncio.CancelledError:
+                self.breaker.record_abandoned()
+                raise
+            except Exception as exc:
+                # Client timeouts (httpx, openai) count like ours
+                if _is_failure(exc):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                raise
+            if call.failed:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+        finally:
+            self.in_flight -= 1
+            slots.release()
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "breaker": self.breaker.snapshot(),
+            "in_flight": self.in_flight,
+            "max_concurrent": self.max_concurrent,
+            "rejected": dict(self.rejected),
+        }
+
+
+_upstreams: dict[str, Upstream] = {}
+
+
+def get_upstream(name: str) -> Upstream:
+    """The process-wide guard for ``"supabase"`` or ``"openai"``."""
+    upstream = _upstreams.get(name)
+    if upstream is None:
+        settings = get_settings()
+        limits = {
+            "supabase": settings.SUPABASE_MAX_CONCURRENT_CALLS,
+            "openai": settings.OPENAI_MAX_CONCURRENT_CALLS,
+        }
+        breaker = CircuitBreaker(name, settings.BREAKER_FAILURE_THRESHOLD, settings.BREAKER_RESET_SECONDS)
+        upstream = _upstreams[name] = Upstream(name, limits[name], breaker)
+    return upstream
+
+
+def upstream_stats() -> dict[str, dict[str, Any]]:
+    """Breaker state, concurrency and rejections of every upstream."""
+    return {name: get_upstream(name).snapshot() for name in UPSTREAMS}
+
+
+def degraded() -> bool:
+    """True while any breaker is not closed."""
+    return any(get_upstream(name).breaker.state != CLOSED for name in UPSTREAMS)
@@ -0,0 +1,415 @@
+"""Per-user daily and weekly rollups of ``daily_tracking`` metrics.
+
+Instead of rescanning every raw tracking row each time insights are built,
+we keep small aggregate rows per user:
+
+- one ``day`` bucket per calendar day (UTC) with entries
+- one ``week`` bucket per ISO week (starting Monday)
+
+Each bucket stores, per metric: ``n`` (count), ``sum``, ``sumsq`` (sum of
+squares), ``min`` and ``max``. Those combine by simple addition, so a 7, 30
+or 90-day window is answered by merging a handful of weekly rows plus the
+ragged days at each edge.
+
+Keeping rollups fresh is incremental: a per-user watermark remembers the last
+``(updated_at, id)`` folded in. ``refresh`` reads only rows written after it
+(``updated_at`` is set on insert and update, so back-dated offline entries
+and edits are picked up too), recomputes the few day and week buckets those
+rows touch, and upserts them.
+Recomputing a whole bucket (rather than adding to it) keeps refreshes
+idempotent, so two overlapping refreshes can never double-count. Like the
+sync cursor, the watermark stays ``settle_seconds`` (``SYNC_SETTLE_SECONDS``)
+behind now, so rows a slow transaction commits "in the past" are not skipped;
+recent rows are simply folded in again by the next refresh.
+
+Limitations: the incremental path only knows where a row is *now*.
+
+- Deleting a ``daily_tracking`` row leaves nothing newer than the watermark,
+  so its day and week buckets keep counting the row.
+- Editing a row's ``created_at`` recomputes its new day and week, but the old
+  ones keep counting it too (PostgREST does not tell us the previous value).
+
+Both are fixed by the next full rebuild: when the user's last rebuild is
+older than ``rebuild_seconds`` (``ROLLUP_REBUILD_SECONDS``), ``refresh``
+re-derives every bucket from raw rows instead, and empties buckets whose rows
+are all gone.
+"""
+import asyncio
+import logging
+import math
+import weakref
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from datetime import UTC, date, datetime, time, timedelta
+from typing import Any
+
+from app.schemas.rows import RollupRow, RollupWatermarkRow
+from app.services.postgrest import PostgrestError
+from app.services.repository import Repositories, settled_cursor
+
+logger = logging.getLogger(__name__)
+
+# Numeric daily_tracking columns that get aggregated
+ROLLUP_METRICS = (
+    "weight_lbs",
+    "waist_in",
+    "body_fat_pct",
+    "muscle_mass_pct",
+    "resting_hr_bpm",
+    "energy",
+    "appetite",
+    "performance",
+)
+ROLLUP_COLUMNS = ("id", "created_at", *ROLLUP_METRICS)
+
+
+@dataclass
+class MetricStats:
+    """Mergeable statistics for one metric."""
+
+    n: int = 0
+    sum: float = 0.0
+    sumsq: float = 0.0
+    min: float | None = None
+    max: float | None = None
+
+    def add(self, value: float) -> None:
+        self.n += 1
+        self.sum += value
+        self.sumsq += value * value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "MetricStats") -> None:
+        if not other.n:
+            return
+        self.n += other.n
+        self.sum += other.sum
+        self.sumsq += other.sumsq
+        self.min = other.min if self.min is None else min(self.min, other.min)  # type: ignore[type-var]
+        self.max = other.max if self.max is None else max(self.max, other.max)  # type: ignore[type-var]
+
+    @property
+    def mean(self) -> float | None:
+        return self.sum / self.n if self.n else None
+
+    @property
+    def stddev(self) -> float | None:
+        if self.n < 2:
+            return None
+        variance = (self.sumsq - self.sum * self.sum / self.n) / (self.n - 1)
+        return math.sqrt(max(variance, 0.0))
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"n": self.n, "sum": self.sum, "sumsq": self.sumsq, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "MetricStats":
+        return cls(
+            n=int(data.get("n", 0)),
+            sum=float(data.get("sum", 0.0)),
+            sumsq=float(data.get("sumsq", 0.0)),
+            min=data.get("min"),
+            max=data.get("max"),
+        )
+
+
+@dataclass
+class Bucket:
+    """Aggregates for a span of rows (a day, a week, or a whole window)."""
+
+    entries: int = 0
+    metrics: dict[str, MetricStats] = field(default_factory=dict)
+
+    def add_row(self, row: dict[str, Any]) -> None:
+        self.entries += 1
+        for key in ROLLUP_METRICS:
+            value = row.get(key)
+            if value is None:
+                continue
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                continue
+            self.metrics.setdefault(key, MetricStats()).add(number)
+
+    def merge(self, other: "Bucket") -> None:
+        self.entries += other.entries
+        for key, stats in other.metrics.items():
+            self.metrics.setdefault(key, MetricStats()).merge(stats)
+
+    def mean(self, key: str) -> float | None:
+        stats = self.metrics.get(key)
+        return stats.mean if stats else None
+
+    @classmethod
+    def from_row(cls, row: RollupRow) -> "Bucket":
+        metrics = {k: MetricStats.from_dict(v) for k, v in (row.get("metrics") or {}).items()}
+        return cls(entries=int(row.get("entries", 0)), metrics=metrics)
+
+    def to_metrics(self) -> dict[str, dict[str, Any]]:
+        return {k: v.to_dict() for k, v in self.metrics.items()}
+
+
+def row_day(created_at: str) -> date:
+    """UTC calendar day of a PostgREST ``created_at`` string."""
+    dt = datetime.fromisoformat(created_at)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(UTC)
+    return dt.date()
+
+
+def week_start(day: date) -> date:
+    """Monday of the ISO week containing ``day``."""
+    return day - timedelta(days=day.weekday())
+
+
+# Summary field -> metric column (the shape insights have always used)
+SUMMARY_FIELDS = {
+    "avg_weight_lbs": "weight_lbs",
+    "avg_waist_in": "waist_in",
+    "avg_resting_hr": "resting_hr_bpm",
+    "avg_energy": "energy",
+    "avg_appetite": "appetite",
+    "avg_performance": "performance",
+}
+# Averages are rounded so the same data always yields the same summary (and
+# insight cache key), however the sums were accumulated
+SUMMARY_DECIMALS = 2
+
+
+def build_summary(entries: int, means: dict[str, float | None], days: int) -> dict[str, Any]:
+    """Summary dict used for insights from an entry count and per-metric means."""
+    summary: dict[str, Any] = {"entries": entries, "window_days": days}
+    for name, metric in SUMMARY_FIELDS.items():
+        value = means.get(metric)
+        summary[name] = None if value is None else round(float(value), SUMMARY_DECIMALS)
+    return summary
+
+
+def summarize(bucket: Bucket, days: int) -> dict[str, Any]:
+    """Turn window aggregates into the summary dict used for insights."""
+    return build_summary(bucket.entries, {k: bucket.mean(k) for k in ROLLUP_METRICS}, days)
+
+
+def window_ranges(first: date, last: date) -> list[tuple[str, date, date]]:
+    """Split ``[first, last]`` into ``(period, first_bucket, last_bucket)`` reads.
+
+    Full ISO weeks inside the window come from ``week`` buckets; the ragged
+    days before and after them come from ``day`` buckets. A 90-day window is
+    then ~12 weekly rows plus at most 12 daily rows.
+    """
+    first_monday = first if first.weekday() == 0 else week_start(first) + timedelta(days=7)
+    last_monday = week_start(last + timedelta(days=1)) - timedelta(days=7)
+    if first_monday > last_monday:
+        return [("day", first, last)]
+    ranges: list[tuple[str, date, date]] = [("week", first_monday, last_monday)]
+    if first < first_monday:
+        ranges.append(("day", first, first_monday - timedelta(days=1)))
+    after_weeks = last_monday + timedelta(days=7)
+    if after_weeks <= last:
+        ranges.append(("day", after_weeks, last))
+    return ranges
+
+
+def contiguous_runs(days: Iterable[date]) -> list[tuple[date, date]]:
+    """Group days into ``(first, last)`` runs of consecutive dates."""
+    runs: list[tuple[date, date]] = []
+    for day in sorted(days):
+        if runs and day - runs[-1][1] == timedelta(days=1):
+            runs[-1] = (runs[-1][0], day)
+        else:
+            runs.append((day, day))
+    return runs
+
+
+_refresh_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+class RollupService:
+    """Maintains and reads per-user rollups through the repository layer."""
+
+    def __init__(
+        self,
+        repos: Repositories,
+        page_size: int = 1000,
+        rebuild_seconds: float | None = None,
+        settle_seconds: float = 0.0,
+    ) -> None:
+        self.repos = repos
+        self.page_size = page_size
+        # How old a user's last full rebuild may get (None: never rebuild)
+        self.rebuild_seconds = rebuild_seconds
+        # How far behind now the watermark stays (see the module docstring)
+        self.settle_seconds = settle_seconds
+
+    async def refresh(self, user_id: str) -> int:
+        """Fold tracking rows newer than the watermark into rollups.
+
+        Returns how many new rows were seen (0 when already up to date; rows
+        written in the last ``settle_seconds`` count again next time). The
+        first refresh, and any after ``rebuild_seconds``, rebuilds everything.
+        """
+        lock = _refresh_locks.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            mark = await self.repos.rollups.get_watermark(user_id)
+            if mark is None or self._rebuild_due(mark):
+                return await self._rebuild_all(user_id)
+
+            # 1) Find rows added since the last refresh
+            after = (mark["last_updated_at"], mark["last_id"]) if mark.get("last_id") else None
+            touched: set[date] = set()
+            last: tuple[str, str] | None = None
+            seen = 0
+            async for page in self.repos.tracking.iter_pages(
+                user_id,
+                None,
+                None,
+                columns=("id", "created_at", "updated_at"),
+                page_size=self.page_size,
+                after=after,
+                key="updated_at",
+            ):
+                seen += len(page)
+                touched.update(row_day(r["created_at"]) for r in page)
+                last = (page[-1]["updated_at"], page[-1]["id"])
+            if not seen:
+                return 0
+
+            # 2) Recompute the touched buckets, then advance the watermark
+            #    (no further than the settle line)
+            await self._rebuild_days(user_id, touched)
+            await self._rebuild_weeks(user_id, {week_start(d) for d in touched})
+            assert last is not None
+            mark = settled_cursor(last, self.settle_seconds)
+            await self.repos.rollups.set_watermark(
+                {"user_id": user_id, "last_updated_at": mark[0], "last_id": mark[1]}
+            )
+            return seen
+
+    def _rebuild_due(self, mark: RollupWatermarkRow) -> bool:
+        if self.rebuild_seconds is None:
+            return False
+        rebuilt_at = mark.get("rebuilt_at")
+        if not rebuilt_at:
+            return True
+        age = datetime.now(UTC) - datetime.fromisoformat(rebuilt_at)
+        return age.total_seconds() >= self.rebuild_seconds
+
+    async def _rebuild_all(self, user_id: str) -> int:
+        """Re-derive every bucket of the user from raw rows (picks up deletes)."""
+        # 1) Remember the newest write first: anything written during the
+        #    scan is newer, so the next incremental refresh re-reads it
+        newest = await self.repos.tracking.last_write(user_id)
+        rebuilt_at = datetime.now(UTC).isoformat()
+
+        # 2) Aggregate all rows into day buckets, then weeks from the days
+        days: dict[date, Bucket] = {}
+        seen = 0
+        async for page in self.repos.tracking.iter_pages(
+            user_id, None, None, columns=ROLLUP_COLUMNS, page_size=self.page_size
+        ):
+            seen += len(page)
+            for r in page:
+                days.setdefault(row_day(r["created_at"]), Bucket()).add_row(r)  # type: ignore[arg-type]
+        weeks: dict[date, Bucket] = {}
+        for day, bucket in days.items():
+            weeks.setdefault(week_start(day), Bucket()).merge(bucket)
+
+        # 3) Stored buckets with no rows left (all deleted) become empty
+        stored = await self.repos.rollups.list_buckets(
+            user_id, [("day", date.min, date.max), ("week", date.min, date.max)], page_size=self.page_size
+        )
+        for r in stored:
+            start = date.fromisoformat(r["bucket_start"])
+            (days if r["period"] == "day" else weeks).setdefault(start, Bucket())
+
+        rows = [self._row(user_id, "day", d, b) for d, b in sorted(days.items())]
+        rows += [self._row(user_id, "week", m, b) for m, b in sorted(weeks.items())]
+        await self.repos.rollups.upsert_buckets(rows, chunk_size=self.page_size)
+        mark: RollupWatermarkRow = {"user_id": user_id, "rebuilt_at": rebuilt_at}
+        if newest is not None:
+            # No further than the settle line (rows about to commit)
+            newest = settled_cursor(newest, self.settle_seconds)
+            mark.update(last_updated_at=newest[0], last_id=newest[1])
+        await self.repos.rollups.set_watermark(mark)
+        return seen
+
+    async def _rebuild_days(self, user_id: str, days: Iterable[date]) -> None:
+        buckets: dict[date, Bucket] = {d: Bucket() for d in days}
+        # Read each run of consecutive touched days in one paginated scan
+        for first, last in contiguous_runs(buckets):
+            start = datetime.combine(first, time.min, tzinfo=UTC)
+            end = datetime.combine(last, time.max, tzinfo=UTC)
+            async for page in self.repos.tracking.iter_pages(
+                user_id, start, end, columns=ROLLUP_COLUMNS, page_size=self.page_size
+            ):
+                for r in page:
+                    buckets[row_day(r["created_at"])].add_row(r)  # type: ignore[arg-type]
+        await self.repos.rollups.upsert_buckets(
+            [self._row(user_id, "day", d, b) for d, b in sorted(buckets.items())], chunk_size=self.page_size
+        )
+
+    async def _rebuild_weeks(self, user_id: str, mondays: Iterable[date]) -> None:
+        mondays = sorted(mondays)
+        if not mondays:
+            return
+        # Weeks are rebuilt from their (at most 7) day buckets
+        day_rows = await self.repos.rollups.list_buckets(
+            user_id, [("day", mondays[0], mondays[-1] + timedelta(days=6))], page_size=self.page_size
+        )
+        weeks: dict[date, Bucket] = {m: Bucket() for m in mondays}
+        for r in day_rows:
+            monday = week_start(date.fromisoformat(r["bucket_start"]))
+            if monday in weeks:
+                weeks[monday].merge(Bucket.from_row(r))
+        await self.repos.rollups.upsert_buckets([self._row(user_id, "week", m, b) for m, b in weeks.items()])
+
+    @staticmethod
+    def _row(user_id: str, period: str, start: date, bucket: Bucket) -> RollupRow:
+        return {
+            "user_id": user_id,
+            "period": period,
+            "bucket_start": start.isoformat(),
+            "entries": bucket.entries,
+            "metrics": bucket.to_metrics(),
+            "updated_at": datetime.now(UTC).isoformat(),
+        }
+
+    async def window(self, user_id: str, days: int, today: date | None = None) -> Bucket:
+        """Aggregates for the last ``days`` calendar days (UTC), including today."""
+        last = today or datetime.now(UTC).date()
+        first = last - timedelta(days=days - 1)
+        ranges = window_ranges(first, last)
+        total = Bucket()
+        for r in await self.repos.rollups.list_buckets(user_id, ranges, page_size=self.page_size):
+            total.merge(Bucket.from_row(r))
+        return total
+
+    async def window_from_raw(self, user_id: str, days: int, today: date | None = None) -> Bucket:
+        """Same result as ``window`` but computed from raw rows (fallback path)."""
+        last = today or datetime.now(UTC).date()
+        start = datetime.combine(last - timedelta(days=days - 1), time.min, tzinfo=UTC)
+        total = Bucket()
+        async for page in self.repos.tracking.iter_pages(
+            user_id, start, None, columns=ROLLUP_COLUMNS, page_size=self.page_size
+        ):
+            for r in page:
+                total.add_row(r)  # type: ignore[arg-type]
+        return total
+
+    async def summary(self, user_id: str, days: int) -> dict[str, Any]:
+        """Refresh the user's rollups and summarize the last ``days`` days.
+
+        If the rollup tables are missing (migration not applied yet), we log
+        a warning and compute the same summary from raw rows.
+        """
+        try:
+            await self.refresh(user_id)
+            bucket = await self.window(user_id, days)
+        except PostgrestError as exc:
+            if exc.status_code < 400 or exc.status_code >= 500:
+                raise
+            logger.warning("Rollups unavailable (%s); summarizing raw rows", exc.message)
+            bucket = await self.window_from_raw(user_id, days)
+        return summarize(bucket, days)
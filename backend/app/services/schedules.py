@@ -0,0 +1,331 @@
+"""Dose schedules: recurrence rules expanded lazily, and a "what's due" index.
+
+A schedule row (``dose_schedules``) is a small rule such as "every 2 days at
+08:00 Europe/Berlin". ``Recurrence`` turns one into dose times with
+generators: it jumps straight to the first period at or after the requested
+start (no walking from ``starts_on``) and produces one day at a time, so an
+open-ended rule is never expanded further than a caller reads.
+
+Two questions get asked:
+
+- "what is due for user U in [t0, t1]?" (``ScheduleService.due_for_user``,
+  the API): the user's few rules are read from the database and each is
+  expanded over just that window (``due_between``)
+- "what is due for anyone in [t0, t1]?" (``ScheduleIndex.due``, for reminder
+  fan-out): a sorted timeline of upcoming dose times, searched with ``bisect``
+
+If you're new:
+- The timeline only covers what has been asked for so far. A heap holds
+  the *next* dose time of every rule; extending the timeline pops from the
+  heap (and advances that rule's generator) until the heap's top is past
+  the new end. Windows that move forward, like a reminder job every few
+  minutes, only ever add the doses they return.
+- ``trim`` drops the part of the timeline that is in the past.
+- Editing or switching off a rule bumps its version; old timeline entries
+  are skipped on read and dropped by the next ``trim``.
+- Loading the index reads every active schedule, so only the reminder
+  worker keeps one (``ScheduleService.index``, in a long-lived
+  ``dose_reminders --watch`` process); after the first load it only reads
+  rows written since its last look. API workers never build it.
+"""
+import asyncio
+import heapq
+import itertools
+import time as clock
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass
+from datetime import UTC, date, datetime, time, timedelta
+from typing import Any
+from zoneinfo import ZoneInfo
+
+from app.core.config import get_settings
+from app.schemas.rows import ScheduleRow
+from app.services.repository import Cursor, Repositories
+
+DAY = timedelta(days=1)
+# Rules are only expanded up to here (``date`` arithmetic stops at year 9999)
+LAST_DAY = date(9000, 1, 1)
+
+
+@dataclass(frozen=True)
+class Recurrence:
+    """A parsed ``dose_schedules`` row."""
+
+    id: str
+    user_id: str
+    peptide_id: str | None
+    title: str
+    freq: str
+    interval: int
+    weekdays: tuple[int, ...]
+    times: tuple[time, ...]
+    tz: ZoneInfo
+    starts_on: date
+    until: date | None
+
+    @classmethod
+    def from_row(cls, row: ScheduleRow) -> "Recurrence":
+        starts_on = date.fromisoformat(row["starts_on"][:10])
+        return cls(
+            id=row["id"],
+            user_id=row["user_id"],
+            peptide_id=row.get("peptide_id"),
+            title=row.get("title") or "",
+            freq=row.get("freq") or "daily",
+            interval=max(int(row.get("interval") or 1), 1),
+            weekdays=tuple(sorted(set(row.get("weekdays") or [starts_on.isoweekday()]))),
+            times=tuple(sorted(time.fromisoformat(t) for t in row.get("times") or ())),
+            tz=ZoneInfo(row.get("timezone") or "UTC"),
+            starts_on=starts_on,
+            until=date.fromisoformat(row["until"][:10]) if row.get("until") else None,
+        )
+
+    def _days(self, first: date) -> Iterator[date]:
+        """Local dates with doses, from ``first`` on."""
+        first = max(first, self.starts_on)
+        last = min(self.until or LAST_DAY, LAST_DAY)
+        if self.freq == "weekly":
+            # Weeks are counted from the Monday of the week ``starts_on`` is in
+            week0 = self.starts_on - timedelta(days=self.starts_on.weekday())
+            week = (first - week0).days // 7
+            week += -week % self.interval
+            while True:
+                monday = week0 + timedelta(weeks=week)
+                for weekday in self.weekdays:
+                    day = monday + timedelta(days=weekday - 1)
+                    if day > last:
+                        return
+                    if day >= first:
+                        yield day
+                week += self.interval
+        else:
+            day = first + timedelta(days=-(first - self.starts_on).days % self.interval)
+            step = timedelta(days=self.interval)
+            while day <= last:
+                yield day
+                day += step
+
+    def timestamps(self, start: float) -> Iterator[float]:
+        """Dose times (epoch seconds, ascending) at or after ``start``; lazy, maybe endless."""
+        # Start a day early: the local date can be behind the UTC one
+        first = datetime.fromtimestamp(start, self.tz).date() - DAY
+        for day in self._days(first):
+            # Sorted per day: a DST change can reorder times around midnight
+            for ts in sorted(datetime.combine(day, t, self.tz).timestamp() for t in self.times):
+                if ts >= start:
+                    yield ts
+
+    def between(self, start: float, end: float) -> Iterator[float]:
+        """Dose times in ``[start, end]``."""
+        return itertools.takewhile(lambda ts: ts <= end, self.timestamps(start))
+
+    def dose(self, ts: float) -> dict[str, Any]:
+        return {
+            "schedule_id": self.id,
+            "user_id": self.user_id,
+            "peptide_id": self.peptide_id,
+            "title": self.title,
+            "due_at": datetime.fromtimestamp(ts, UTC).isoformat(),
+        }
+
+
+def due_between(rules: Sequence[Recurrence], start: float, end: float) -> list[dict[str, Any]]:
+    """Doses of ``rules`` in ``[start, end]``, in time order."""
+    merged = heapq.merge(*([(ts, n) for ts in r.between(start, end)] for n, r in enumerate(rules)))
+    return [rules[n].dose(ts) for ts, n in merged]
+
+
+class ScheduleIndex:
+    """Every active rule, plus a sorted timeline of dose times from ``origin`` on."""
+
+    def __init__(self, origin: float) -> None:
+        self.rules: dict[str, Recurrence] = {}
+        self._by_user: dict[str, set[str]] = {}
+        self._versions: dict[str, int] = {}
+        # Timeline: parallel sorted lists, complete for [origin, horizon]
+        self._times: list[float] = []
+        self._keys: list[tuple[str, int]] = []  # (schedule id, version)
+        self._origin = origin
+        self._horizon = origin
+        # Next dose time of every rule past the horizon, and its generator
+        self._frontier: list[tuple[float, str, int]] = []
+        self._streams: dict[str, Iterator[float]] = {}
+        self._stale = False
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    @property
+    def timeline_size(self) -> int:
+        return len(self._times)
+
+    def upsert(self, rule: Recurrence) -> None:
+        """Add a rule, or replace the one with the same id."""
+        self.remove(rule.id)
+        version = self._versions.get(rule.id, 0) + 1
+        self._versions[rule.id] = version
+        self.rules[rule.id] = rule
+        self._by_user.setdefault(rule.user_id, set()).add(rule.id)
+        # Doses inside the built part of the timeline go straight in; the
+        # first one after it waits on the heap like every other rule's
+        stream = rule.timestamps(self._origin)
+        self._streams[rule.id] = stream
+        for ts in stream:
+            if ts > self._horizon:
+                heapq.heappush(self._frontier, (ts, rule.id, version))
+                break
+            self._insert(ts, (rule.id, version))
+
+    def remove(self, schedule_id: str) -> None:
+        rule = self.rules.pop(schedule_id, None)
+        if rule is None:
+            return
+        self._versions[schedule_id] += 1  # its timeline and heap entries are now stale
+        self._streams.pop(schedule_id, None)
+        self._stale = True
+        user_rules = self._by_user.get(rule.user_id)
+        if user_rules is not None:
+            user_rules.discard(schedule_id)
+            if not user_rules:
+                del self._by_user[rule.user_id]
+
+    def due_for_user(self, user_id: str, start: float, end: float) -> list[dict[str, Any]]:
+        """The user's doses in ``[start, end]``, in time order."""
+        return due_between([self.rules[i] for i in sorted(self._by_user.get(user_id, ()))], start, end)
+
+    def due(self, start: float, end: float) -> list[dict[str, Any]]:
+        """Every user's doses in ``[start, end]``, in time order."""
+        if start < self._origin:
+            self._rebuild(start)
+        self._extend(end)
+        lo, hi = bisect_left(self._times, start), bisect_right(self._times, end)
+        doses = []
+        for ts, (schedule_id, version) in zip(self._times[lo:hi], self._keys[lo:hi], strict=True):
+            if self._versions.get(schedule_id) == version:
+                doses.append(self.rules[schedule_id].dose(ts))
+        return doses
+
+    def trim(self, before: float) -> None:
+        """Forget timeline entries before ``before`` (and stale ones)."""
+        if before > self._origin:
+            self._extend(before)  # moves every rule's generator past ``before``
+            cut = bisect_left(self._times, before)
+            del self._times[:cut], self._keys[:cut]
+            self._origin = before
+        if self._stale:
+            live = [(ts, key) for ts, key in zip(self._times, self._keys, strict=True) if self._versions.get(key[0]) == key[1]]
+            self._times = [ts for ts, _ in live]
+            self._keys = [key for _, key in live]
+            self._frontier = [f for f in self._frontier if self._versions.get(f[1]) == f[2]]
+            heapq.heapify(self._frontier)
+            self._stale = False
+
+    def _insert(self, ts: float, key: tuple[str, int]) -> None:
+        i = bisect_right(self._times, ts)
+        self._times.insert(i, ts)
+        self._keys.insert(i, key)
+
+    def _extend(self, end: float) -> None:
+        """Make the timeline complete up to ``end``."""
+        frontier = self._frontier
+        while frontier and frontier[0][0] <= end:
+            ts, schedule_id, version = heapq.heappop(frontier)
+            if self._versions.get(schedule_id) != version:
+                continue
+            if self._times and ts < self._times[-1]:
+                self._insert(ts, (schedule_id, version))
+            else:
+                self._times.append(ts)
+                self._keys.append((schedule_id, version))
+            upcoming = next(self._streams[schedule_id], None)
+            if upcoming is not None:
+                heapq.heappush(frontier, (upcoming, schedule_id, version))
+        self._horizon = max(self._horizon, end)
+
+    def _rebuild(self, origin: float) -> None:
+        """Start the timeline over from an earlier ``origin``."""
+        self._times, self._keys, self._frontier = [], [], []
+        self._origin = self._horizon = origin
+        for rule in list(self.rules.values()):
+            self.upsert(rule)
+
+
+@dataclass
+class _LoadedIndex:
+    index: ScheduleIndex
+    watermark: Cursor | None = None
+    checked_at: float = 0.0
+
+
+_loaded: _LoadedIndex | None = None
+_load_lock: asyncio.Lock | None = None
+
+
+class ScheduleService:
+    """Schedule reads and writes, plus the process's ``ScheduleIndex`` (reminder worker only)."""
+
+    def __init__(self, repos: Repositories, page_size: int = 1000) -> None:
+        self.repos = repos
+        self.page_size = page_size
+
+    async def index(self, max_age: float | None = None) -> ScheduleIndex:
+        """The index, first applying schedules written since the last check.
+
+        Checks at most every ``max_age`` seconds (``SCHEDULE_REFRESH_SECONDS``
+        by default); pass ``0`` to always check.
+        """
+        global _loaded, _load_lock
+        if max_age is None:
+            max_age = get_settings().SCHEDULE_REFRESH_SECONDS
+        if _load_lock is None:
+            _load_lock = asyncio.Lock()
+        async with _load_lock:
+            now = clock.time()
+            if _loaded is None:
+                # Keep a day of history so "today so far" queries stay cheap
+                _loaded = _LoadedIndex(ScheduleIndex(origin=now - 86_400))
+            elif now - _loaded.checked_at < max_age:
+                return _loaded.index
+            # 1) Apply rows written after the watermark (all rows on first use)
+            async for page in self.repos.schedules.iter_changed(_loaded.watermark, page_size=self.page_size):
+                self._apply(_loaded.index, page)
+                _loaded.watermark = (page[-1]["updated_at"], page[-1]["id"])
+            # 2) Drop timeline entries older than a day
+            _loaded.index.trim(now - 86_400)
+            _loaded.checked_at = now
+            return _loaded.index
+
+    @staticmethod
+    def _apply(index: ScheduleIndex, rows: Sequence[ScheduleRow]) -> None:
+        for row in rows:
+            if row.get("active", True):
+                index.upsert(Recurrence.from_row(row))
+            else:
+                index.remove(row["id"])
+
+    async def create(self, row: ScheduleRow) -> ScheduleRow:
+        """Store a new schedule (a loaded index sees it immediately)."""
+        stored = await self.repos.schedules.insert(row)
+        if _loaded is not None:
+            self._apply(_loaded.index, [stored])
+        return stored
+
+    async def deactivate(self, user_id: str, schedule_id: str) -> bool:
+        """Switch a schedule off; ``False`` if the user has no such schedule."""
+        stored = await self.repos.schedules.deactivate(user_id, schedule_id)
+        if stored is None:
+            return False
+        if _loaded is not None:
+            _loaded.index.remove(schedule_id)
+        return True
+
+    async def due_for_user(self, user_id: str, start: datetime, end: datetime) -> list[dict[str, Any]]:
+        """The user's doses in ``[start, end]``; reads only that user's rules."""
+        rows = await self.repos.schedules.list_for_user(user_id)
+        rules = sorted((Recurrence.from_row(r) for r in rows), key=lambda r: r.id)
+        return due_between(rules, start.timestamp(), end.timestamp())
+
+    async def due(self, start: datetime, end: datetime) -> list[dict[str, Any]]:
+        index = await self.index()
+        return index.due(start.timestamp(), end.timestamp())
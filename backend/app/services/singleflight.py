@@ -0,0 +1,151 @@
+"""Single-flight: identical concurrent calls share one upstream operation.
+
+A double-tap or a pull-to-refresh on the insights screen sends the same
+request two or three times within a few milliseconds. Without help, each
+copy runs the same ``daily_tracking`` select, the same model call and the
+same ``insights`` insert. A ``SingleFlight`` group lets the first caller for
+a key (the *leader*) start the work while every caller arriving before it
+finishes (*followers*) waits for that same result:
+
+    flights = get_flight_group("insights")
+    result = await flights.do((user_id, days), lambda: build(...))
+
+If you're new:
+- Nothing is cached here. The key is forgotten as soon as the call ends, so
+  the next request starts a fresh one; errors are shared by the callers that
+  were waiting, then forgotten too.
+- The work runs in its own task. A caller that goes away (client
+  disconnected, timeout) stops waiting but does not cancel it for the others.
+- That task starts from an empty context, not the leader's: it serves
+  callers whose deadlines differ, so it gets a deadline of its own
+  (``REQUEST_DEADLINE_SECONDS`` from when it starts) and belongs to no
+  request's profile. Each caller waits for it until its *own* deadline at
+  most (then ``DeadlineExceededError``), and the work's phase times show in
+  the ``Server-Timing`` of every profiled caller that waited for it.
+- Reads of a table are never joined after this process wrote to it (see
+  ``app.services.postgrest``), so coalescing cannot hide a caller's own write.
+- ``SINGLE_FLIGHT_ENABLED=false`` runs every call on its own. Leaders and
+  followers per group are in ``GET /api/v1/health`` and the
+  ``singleflight_calls_total`` metric.
+"""
+import asyncio
+import contextvars
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import asdict, dataclass
+from typing import Any, Generic, TypeVar
+
+from app.core.config import get_settings
+from app.core.deadlines import DeadlineExceededError, deadline_scope, remaining
+from app.core.metrics import SINGLE_FLIGHT_CALLS
+from app.core.profiling import add_phases, shared_phases
+
+T = TypeVar("T")
+
+
+@dataclass
+class FlightStats:
+    leaders: int = 0  # calls that ran the operation
+    followers: int = 0  # calls that shared a leader's result instead
+
+    @property
+    def coalesced_ratio(self) -> float | None:
+        calls = self.leaders + self.followers
+        return round(self.followers / calls, 4) if calls else None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {**asdict(self), "coalesced_ratio": self.coalesced_ratio}
+
+
+class SingleFlight(Generic[T]):
+    """A named group of in-flight calls, keyed by what they compute."""
+
+    def __init__(self, name: str, enabled: bool = True, deadline: float = 0.0) -> None:
+        self.name = name
+        self.enabled = enabled
+        self.deadline = deadline  # seconds the shared work may take (0: no limit)
+        self.stats = FlightStats()
+        self._calls: dict[Hashable, asyncio.Task[T]] = {}
+        self._phases: dict[asyncio.Task[T], dict[str, list[float]]] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Return ``await fn()``, shared with every concurrent call for ``key``.
+
+        Raises ``DeadlineExceededError`` when the caller's deadline passes
+        first (the work goes on for the others).
+        """
+        if not self.enabled:
+            return await fn()
+        left = remaining()
+        if left is not None and left <= 0:
+            raise DeadlineExceededError("request deadline exceeded")
+        loop = asyncio.get_running_loop()
+        task = self._calls.get(key)
+        # 1) Join a call in progress (only on our own event loop)
+        if task is not None and task.get_loop() is loop:
+            self.stats.followers += 1
+            SINGLE_FLIGHT_CALLS.labels(self.name, "follower").inc()
+        else:
+            # 2) Lead: run the work as a task of its own, from an empty context
+            #    (not our deadline or profile: the others share it)
+            context = contextvars.Context()
+            phases = shared_phases(context)
+            task = loop.create_task(self._run(fn), context=context)
+            self._phases[task] = phases
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.stats.leaders += 1
+            SINGLE_FLIGHT_CALLS.labels(self.name, "leader").inc()
+        # 3) Wait until our own deadline at most, without letting our
+        #    cancellation (or timeout) cancel it for the others
+        phases = self._phases.get(task)
+        timeout = asyncio.timeout(left)
+        try:
+            async with timeout:
+                return await asyncio.shield(task)
+        except TimeoutError:
+            if timeout.expired():
+                raise DeadlineExceededError("request deadline exceeded") from None
+            raise
+        finally:
+            if phases is not None and task.done():
+                add_phases(phases)
+
+    async def _run(self, fn: Callable[[], Awaitable[T]]) -> T:
+        if self.deadline <= 0:
+            return await fn()
+        with deadline_scope(self.deadline):
+            return await fn()
+
+    def _forget(self, key: Hashable, task: "asyncio.Task[T]") -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        self._phases.pop(task, None)
+        if not task.cancelled():
+            # Mark the exception as seen: the waiting callers re-raise it
+            task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+
+_groups: dict[str, SingleFlight[Any]] = {}
+
+
+def get_flight_group(name: str) -> SingleFlight[Any]:
+    """Return the process-wide group called ``name`` (created on first use)."""
+    group = _groups.get(name)
+    if group is None:
+        settings = get_settings()
+        group = _groups[name] = SingleFlight(
+            name,
+            enabled=settings.SINGLE_FLIGHT_ENABLED,
+            deadline=settings.REQUEST_DEADLINE_SECONDS,
+        )
+    return group
+
+
+def flight_stats() -> dict[str, dict[str, Any]]:
+    """Stats of every group used so far in this process."""
+    return {
+        name: {"in_flight": group.in_flight(), **group.stats.to_dict()} for name, group in sorted(_groups.items())
+    }
@@ -0,0 +1,77 @@
+"""Small in-memory LRU cache with per-entry expiry.
+
+We use this for hot, per-process lookups (like verified auth tokens) where a
+network round-trip would be far slower than a dictionary read.
+
+If you're new:
+- "LRU" means *least recently used*. When the cache is full, the entry that
+  was read longest ago is dropped first, so memory use stays bounded.
+- Each entry also carries an ``expires_at`` timestamp. Expired entries are
+  treated as missing and removed the next time they are touched.
+"""
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Any, Generic, TypeVar
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """A thread-safe, size-bounded LRU cache whose entries expire.
+
+    ``maxsize`` caps the number of entries. ``expires_at`` is a Unix timestamp
+    (seconds) passed per entry, because different values can live for
+    different amounts of time (e.g. each JWT has its own ``exp``).
+    """
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self._data: OrderedDict[Hashable, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0  # entries dropped to stay within maxsize
+
+    def get(self, key: Hashable, default: V | None = None) -> V | None:
+        """Return the cached value for ``key`` or ``default`` if missing/expired."""
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            # 1) Drop entries whose lifetime has passed
+            if expires_at <= now:
+                del self._data[key]
+                return default
+            # 2) Mark as most recently used
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: V, expires_at: float) -> None:
+        """Store ``value`` until ``expires_at`` (Unix seconds)."""
+        if expires_at <= time.time():
+            return
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            # Evict least recently used entries once we exceed the bound
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove ``key`` and return its value (or ``default``)."""
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
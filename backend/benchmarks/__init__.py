@@ -0,0 +1,4 @@
+"""Offline load benchmarks with local Supabase and OpenAI stand-ins.
+
+See ``benchmarks/run.py`` for usage (``python -m benchmarks.run``).
+"""
@@ -0,0 +1,163 @@
+"""Cache backend benchmark: latency per backend, and hit rate vs size.
+
+Run from the ``backend`` folder::
+
+    python -m benchmarks.cache
+    python -m benchmarks.cache --keys 20000 --lookups 50000 --sizes 500,2000,5000 --output cache.json
+
+Two parts:
+
+- ``backends``: median ``get`` (hit and miss) and ``set`` latency for the
+  memory, SQLite and Redis backends (Redis is ``benchmarks.fakes.FakeRedis``
+  unless ``--redis-url`` points at a real server). The SQLite file is also
+  read from ``--processes`` worker processes at once, as uvicorn workers
+  would, to show that one process's writes are hits in the others.
+- ``sizing``: hit rate of a memory cache for several ``maxsize`` values
+  under a skewed (Zipf-like) key popularity, the shape of real traffic
+  where a few users are very active. Read it to pick ``*_CACHE_SIZE``.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any
+
+from app.services.cache import Cache, MemoryBackend, RedisBackend, SQLiteBackend
+from benchmarks.fakes import FakeRedis
+
+VALUE = {"tips": ["Keep hydration high.", "Walk 10 minutes after meals.", "Sleep before 11pm."]}
+
+
+async def time_us(fn: Any, repeat: int) -> float:
+    """Median wall time of the coroutine function ``fn`` in microseconds."""
+    samples = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        await fn(i)
+        samples.append((time.perf_counter() - started) * 1e6)
+    return round(statistics.median(samples), 1)
+
+
+async def bench_backend(backend: Any, repeat: int) -> dict[str, Any]:
+    cache: Cache[Any] = Cache("bench", backend, maxsize=repeat * 2)
+    expires = time.time() + 600
+    set_us = await time_us(lambda i: cache.set(f"key-{i}", VALUE, expires), repeat)
+    hit_us = await time_us(lambda i: cache.get(f"key-{i}"), repeat)
+    miss_us = await time_us(lambda i: cache.get(f"absent-{i}"), repeat)
+    await cache.clear()
+    await backend.close()
+    return {"set_us": set_us, "get_hit_us": hit_us, "get_miss_us": miss_us, **cache.stats.to_dict()}
+
+
+def _sqlite_worker(path: str, worker: int, workers: int, keys: int, queue: Any) -> None:
+    async def run() -> dict[str, Any]:
+        cache: Cache[Any] = Cache("shared", SQLiteBackend(path), maxsize=keys * 4)
+        expires = time.time() + 600
+        for i in range(keys):
+            await cache.set(f"{worker}-{i}", VALUE, expires)
+        # Read every worker's keys (some may not be written yet: misses)
+        started = time.perf_counter()
+        for other in range(workers):
+            for i in range(keys):
+                await cache.get(f"{other}-{i}")
+        elapsed = time.perf_counter() - started
+        return {"lookups_per_s": round(workers * keys / elapsed), **cache.stats.to_dict()}
+
+    queue.put(asyncio.run(run()))
+
+
+def bench_sqlite_processes(path: str, processes: int, keys: int) -> list[dict[str, Any]]:
+    queue: Any = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=_sqlite_worker, args=(path, n, processes, keys, queue)) for n in range(processes)
+    ]
+    for p in workers:
+        p.start()
+    results = [queue.get() for _ in workers]
+    for p in workers:
+        p.join()
+    return results
+
+
+def zipf_keys(keys: int, lookups: int, skew: float, seed: int = 3) -> list[int]:
+    rng = random.Random(seed)
+    weights = [1.0 / (rank + 1) ** skew for rank in range(keys)]
+    return rng.choices(range(keys), weights=weights, k=lookups)
+
+
+async def bench_sizing(keys: int, lookups: int, sizes: list[int], skew: float) -> list[dict[str, Any]]:
+    trace = zipf_keys(keys, lookups, skew)
+    results = []
+    for size in sizes:
+        cache: Cache[Any] = Cache("sizing", MemoryBackend(), maxsize=size)
+        expires = time.time() + 3600
+        for key in trace:
+            if await cache.get(str(key)) is None:
+                await cache.set(str(key), key, expires)  # read-through, like the real callers
+        results.append({"maxsize": size, **cache.stats.to_dict()})
+    return results
+
+
+async def run(args: argparse.Namespace, sqlite_path: str) -> dict[str, Any]:
+    fake: FakeRedis | None = None
+    redis_url = args.redis_url
+    if not redis_url:
+        fake = FakeRedis().start()
+        redis_url = fake.url
+    try:
+        backends = {
+            "memory": await bench_backend(MemoryBackend(), args.repeat),
+            "sqlite": await bench_backend(SQLiteBackend(sqlite_path), args.repeat),
+            "redis": await bench_backend(RedisBackend(redis_url, timeout=2.0), args.repeat),
+        }
+    finally:
+        if fake is not None:
+            fake.stop()
+    return {
+        "backends": backends,
+        "redis": "fake" if fake is not None else redis_url,
+        "sizing": {
+            "keys": args.keys,
+            "lookups": args.lookups,
+            "skew": args.skew,
+            "results": await bench_sizing(args.keys, args.lookups, args.sizes, args.skew),
+        },
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark cache backends and hit rate vs size.")
+    parser.add_argument("--repeat", type=int, default=2000, help="Timed operations per measurement")
+    parser.add_argument("--processes", type=int, default=4, help="Processes sharing the SQLite file")
+    parser.add_argument("--redis-url", help="A real Redis to measure (default: the local stand-in)")
+    parser.add_argument("--keys", type=int, default=20_000, help="Distinct keys in the sizing trace")
+    parser.add_argument("--lookups", type=int, default=100_000, help="Lookups in the sizing trace")
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent of key popularity")
+    parser.add_argument(
+        "--sizes", type=lambda v: [int(x) for x in v.split(",")], default=[500, 2000, 5000, 10_000, 20_000]
+    )
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_path = os.path.join(tmp, "cache.sqlite3")
+        report = asyncio.run(run(args, sqlite_path))
+        report["sqlite_processes"] = bench_sqlite_processes(
+            os.path.join(tmp, "shared.sqlite3"), args.processes, min(args.repeat, 2000)
+        )
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(text + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,582 @@
+"""Local stand-ins for Supabase (PostgREST + auth) and OpenAI.
+
+The benchmark suite must run offline, so these small Starlette apps answer
+the exact requests the backend makes:
+
+- ``FakeSupabase``: ``/rest/v1/<table>`` selects (``eq``/``gt``/``gte``/
+  ``lt``/``lte`` filters, ``or=(...)``/``and(...)`` groups, ``order``,
+  ``limit``, column lists) and inserts/upserts, plus ``/auth/v1/user`` and
+  ``/auth/v1/health``
+- ``FakeOpenAI``: ``/v1/chat/completions`` returning a JSON list of tips
+- ``FakeRedis``: a Redis protocol server with the commands the shared cache
+  uses (``GET``/``SET ... PX``/``DEL``/``SCAN``, ``AUTH``/``SELECT``/``PING``)
+
+Each one sleeps for a configurable latency (with seeded jitter) before
+answering, so results are reproducible. ``latency.base`` and ``fail_with``
+(an HTTP status to answer with) can be changed while they run, to play a
+slow or failing upstream. They run inside the benchmark
+process on background threads (``serve_in_thread``).
+"""
+import asyncio
+import base64
+import fnmatch
+import json
+import random
+import socket
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+Row = dict[str, Any]
+Predicate = Callable[[Row], bool]
+
+
+def _timestamp(dt: datetime) -> str:
+    """Format like PostgREST returns ``timestamptz`` (second precision, UTC)."""
+    return dt.astimezone(UTC).strftime("%Y-%m-%dT%H:%M:%S+00:00")
+
+
+@dataclass
+class Dataset:
+    """Size of the generated data: ``users`` users with one row per day."""
+
+    users: int = 50
+    days: int = 90
+    peptides_per_user: int = 3
+    seed: int = 42
+
+    def user_ids(self) -> list[str]:
+        return [str(uuid.uuid5(uuid.NAMESPACE_URL, f"bench-user-{i}")) for i in range(self.users)]
+
+
+class Latency:
+    """Sleep ``base_ms`` plus up to ``jitter`` (fraction) of it, seeded."""
+
+    def __init__(self, base_ms: float, jitter: float = 0.1, seed: int = 0) -> None:
+        self.base = base_ms / 1000.0
+        self.jitter = jitter
+        self._random = random.Random(seed)
+
+    async def wait(self) -> None:
+        if self.base > 0:
+            await asyncio.sleep(self.base * (1 + self.jitter * self._random.random()))
+
+
+# ---------------------------------------------------------------------------
+# PostgREST filter parsing
+# ---------------------------------------------------------------------------
+
+
+def _split_top_level(text: str) -> list[str]:
+    """Split ``a,b(c,d),"e,f"`` on commas that are not nested or quoted."""
+    parts, depth, quoted, current = [], 0, False, []
+    for ch in text:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and ch == "," and depth == 0:
+            parts.append("".join(current))
+            current = []
+            continue
+        current.append(ch)
+    parts.append("".join(current))
+    return parts
+
+
+def _normalize(value: str) -> Any:
+    """Make filter values comparable with stored values (times, numbers)."""
+    value = value.strip('"')
+    if len(value) >= 10 and value[4] == "-" and value[7] == "-":
+        try:
+            dt = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+        if len(value) == 10:
+            return value  # plain date (e.g. bucket_start)
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=UTC)
+        return _timestamp(dt)
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+_OPS: dict[str, Callable[[Any, Any], bool]] = {
+    "eq": lambda a, b: a == b,
+    "neq": lambda a, b: a != b,
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+}
+
+
+def _condition(column: str, op: str, raw: str) -> Predicate:
+    if op == "in":
+        members = {v.strip('"') for v in _split_top_level(raw[1:-1])}
+        return lambda row: row.get(column) is not None and str(row.get(column)) in members
+    if op == "is":
+        expected = {"true": True, "false": False, "null": None}[raw]
+        return lambda row: row.get(column) is expected
+    compare = _OPS[op]
+    value = _normalize(raw)
+
+    def check(row: Row) -> bool:
+        cell = row.get(column)
+        if cell is None:
+            return False
+        if isinstance(value, float) and not isinstance(cell, (int, float)):
+            return compare(str(cell), raw.strip('"'))
+        return compare(cell, value)
+
+    return check
+
+
+def _group(kind: str, body: str) -> Predicate:
+    """Parse the inside of ``or(...)``/``and(...)``."""
+    predicates: list[Predicate] = []
+    for part in _split_top_level(body):
+        if part.startswith(("and(", "or(")):
+            inner_kind, _, rest = part.partition("(")
+            predicates.append(_group(inner_kind, rest[:-1]))
+        else:
+            column, op, raw = part.split(".", 2)
+            predicates.append(_condition(column, op, raw))
+    if kind == "or":
+        return lambda row: any(p(row) for p in predicates)
+    return lambda row: all(p(row) for p in predicates)
+
+
+def _sort(rows: list[Row], order: str) -> list[Row]:
+    # Stable sorts from the last key to the first give multi-column order
+    for clause in reversed(order.split(",")):
+        column, _, direction = clause.partition(".")
+        rows = sorted(rows, key=lambda r: (r.get(column) is None, r.get(column)), reverse=direction == "desc")
+    return rows
+
+
+class Table:
+    """Rows of one fake table, indexed by ``user_id`` for fast per-user reads."""
+
+    def __init__(self) -> None:
+        self.rows: list[Row] = []
+        self.by_user: dict[Any, list[Row]] = {}
+        # Unique indexes for upserts, built on first use per conflict target
+        self._unique: dict[tuple[str, ...], dict[tuple[Any, ...], Row]] = {}
+
+    def add(self, row: Row) -> None:
+        self.rows.append(row)
+        self.by_user.setdefault(row.get("user_id"), []).append(row)
+        for columns, index in self._unique.items():
+            index[tuple(row.get(c) for c in columns)] = row
+
+    def remove(self, row: Row) -> None:
+        """Delete ``row`` (tests use this; the backend never deletes)."""
+        self.rows.remove(row)
+        self.by_user[row.get("user_id")].remove(row)
+        for columns, index in self._unique.items():
+            index.pop(tuple(row.get(c) for c in columns), None)
+
+    def upsert(self, row: Row, conflict: tuple[str, ...]) -> None:
+        index = self._unique.get(conflict)
+        if index is None:
+            index = self._unique[conflict] = {tuple(r.get(c) for c in conflict): r for r in self.rows}
+        existing = index.get(tuple(row.get(c) for c in conflict))
+        if existing is not None:
+            # Reassigning user_id is not supported (the backend never does it)
+            existing.update(row)
+            return
+        self.add(row)
+
+
+class FakeSupabase:
+    """In-memory PostgREST + GoTrue ``/auth/v1/user`` with synthetic data."""
+
+    def __init__(self, dataset: Dataset, latency: Latency) -> None:
+        self.dataset = dataset
+        self.latency = latency
+        self.tables: dict[str, Table] = {
+            name: Table()
+            for name in (
+                "daily_tracking",
+                "profiles",
+                "peptides",
+                "insights",
+                "tracking_rollups",
+                "tracking_rollup_watermarks",
+                "inventory_forecasts",
+                "inventory_forecast_watermarks",
+                "dose_schedules",
+            )
+        }
+        self.requests = 0
+        self.fail_with: int | None = None  # answer every table request with this status
+        self.max_rows: int | None = None  # like PostgREST's db-max-rows cap on every select
+        self._populate()
+        self.app = Starlette(
+            routes=[
+                Route("/rest/v1/{table}", self.rest, methods=["GET", "POST", "PATCH"]),
+                Route("/auth/v1/user", self.auth_user, methods=["GET"]),
+                Route("/auth/v1/health", self.auth_health, methods=["GET"]),
+            ]
+        )
+
+    def _populate(self) -> None:
+        rng = random.Random(self.dataset.seed)
+        now = datetime.now(UTC)
+        today = now.replace(hour=7, minute=0, second=0, microsecond=0)
+        if today > now:
+            today -= timedelta(days=1)  # never generate rows in the future
+        for user_id in self.dataset.user_ids():
+            self.tables["profiles"].add({"id": user_id, "user_id": user_id, "display_name": f"user {user_id[:8]}"})
+            peptide_ids = []
+            for p in range(self.dataset.peptides_per_user):
+                peptide_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{user_id}-peptide-{p}"))
+                peptide_ids.append(peptide_id)
+                created = _timestamp(today - timedelta(days=self.dataset.days))
+                self.tables["peptides"].add(
+                    {
+                        "id": peptide_id,
+                        "user_id": user_id,
+                        "name": f"Peptide {p}",
+                        "units_remaining": 10.0 * (p + 1),
+                        "units_per_dose": 0.25 if p == 0 else None,
+                        "expires_on": (today + timedelta(days=30 * (p + 1))).date().isoformat(),
+                        "created_at": created,
+                        "updated_at": created,
+                    }
+                )
+            # Two reminders per user: daily in the morning, weekly in the evening
+            for n, (freq, weekdays, times) in enumerate((("daily", None, ["08:00"]), ("weekly", [1, 4], ["20:00"]))):
+                created = _timestamp(today - timedelta(days=self.dataset.days))
+                self.tables["dose_schedules"].add(
+                    {
+                        "id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"{user_id}-schedule-{n}")),
+                        "user_id": user_id,
+                        "peptide_id": peptide_ids[n] if n < len(peptide_ids) else None,
+                        "title": f"Dose {n}",
+                        "freq": freq,
+                        "interval": 1,
+                        "weekdays": weekdays,
+                        "times": times,
+                        "timezone": "UTC",
+                        "starts_on": (today - timedelta(days=self.dataset.days)).date().isoformat(),
+                        "until": None,
+                        "active": True,
+                        "created_at": created,
+                        "updated_at": created,
+                    }
+                )
+            weight = rng.uniform(150, 220)
+            for d in range(self.dataset.days, 0, -1):
+                created = _timestamp(today - timedelta(days=d - 1))
+                weight += rng.uniform(-0.6, 0.5)
+                self.tables["daily_tracking"].add(
+                    {
+                        "id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"{user_id}-{d}")),
+                        "user_id": user_id,
+                        "created_at": created,
+                        "updated_at": created,
+                        "weight_lbs": round(weight, 1),
+                        "waist_in": round(rng.uniform(30, 40), 1),
+                        "bp_am": f"{rng.randint(105, 135)}/{rng.randint(65, 85)}",
+                        "bp_pm": f"{rng.randint(105, 135)}/{rng.randint(65, 85)}",
+                        "body_fat_pct": round(rng.uniform(12, 30), 1),
+                        "muscle_mass_pct": round(rng.uniform(30, 45), 1),
+                        "resting_hr_bpm": rng.randint(50, 80),
+                        "energy": rng.randint(1, 10),
+                        "appetite": rng.randint(1, 10),
+                        "performance": rng.randint(1, 10),
+                        "peptide1_id": peptide_ids[0] if peptide_ids else None,
+                        "peptide2_id": peptide_ids[1] if len(peptide_ids) > 1 and d % 2 else None,
+                        "peptide3_id": None,
+                    }
+                )
+
+    async def rest(self, request: Request) -> Response:
+        self.requests += 1
+        await self.latency.wait()
+        if self.fail_with is not None:
+            return JSONResponse({"message": "injected failure"}, status_code=self.fail_with)
+        table = self.tables.get(request.path_params["table"])
+        if table is None:
+            return JSONResponse({"message": "relation does not exist"}, status_code=404)
+        if request.method == "POST":
+            return await self._insert(request, table)
+        if request.method == "PATCH":
+            return await self._update(request, table)
+        return self._select(request, table)
+
+    def _select(self, request: Request, table: Table) -> Response:
+        rows = table.rows
+        predicates: list[Predicate] = []
+        columns, order, limit = "*", None, None
+        for name, value in request.query_params.multi_items():
+            if name == "select":
+                columns = value
+            elif name == "order":
+                order = value
+            elif name == "limit":
+                limit = int(value)
+            elif name in ("or", "and"):
+                predicates.append(_group(name, value[1:-1]))
+            elif name == "user_id" and value.startswith("eq."):
+                rows = table.by_user.get(value[3:], [])
+            else:
+                op, _, raw = value.partition(".")
+                predicates.append(_condition(name, op, raw))
+        result = [r for r in rows if all(p(r) for p in predicates)]
+        if order:
+            result = _sort(result, order)
+        if limit is not None:
+            result = result[:limit]
+        if self.max_rows is not None:
+            result = result[: self.max_rows]
+        if columns != "*":
+            keep = columns.split(",")
+            result = [{c: r.get(c) for c in keep} for r in result]
+        return JSONResponse(result)
+
+    async def _insert(self, request: Request, table: Table) -> Response:
+        payload = await request.json()
+        rows = payload if isinstance(payload, list) else [payload]
+        on_conflict = request.query_params.get("on_conflict")
+        conflict = tuple(on_conflict.split(",")) if on_conflict else None
+        now = _timestamp(datetime.now(UTC))
+        stored = []
+        for row in rows:
+            row = dict(row)
+            row.setdefault("id", str(uuid.uuid4()))
+            row.setdefault("created_at", now)
+            row["updated_at"] = now
+            if conflict:
+                table.upsert(row, conflict)
+            else:
+                table.add(row)
+            stored.append(row)
+        if "return=representation" in request.headers.get("prefer", ""):
+            return JSONResponse(stored, status_code=201)
+        return Response(status_code=201)
+
+    async def _update(self, request: Request, table: Table) -> Response:
+        values = await request.json()
+        rows = table.rows
+        predicates: list[Predicate] = []
+        for name, value in request.query_params.multi_items():
+            if name == "user_id" and value.startswith("eq."):
+                rows = table.by_user.get(value[3:], [])
+            else:
+                op, _, raw = value.partition(".")
+                predicates.append(_condition(name, op, raw))
+        now = _timestamp(datetime.now(UTC))
+        updated = [r for r in rows if all(p(r) for p in predicates)]
+        for row in updated:
+            row.update(values, updated_at=now)
+        if "return=representation" in request.headers.get("prefer", ""):
+            return JSONResponse(updated)
+        return Response(status_code=204)
+
+    async def auth_health(self, request: Request) -> Response:
+        await self.latency.wait()
+        return JSONResponse({"name": "GoTrue", "description": "bench stand-in"})
+
+    async def auth_user(self, request: Request) -> Response:
+        self.requests += 1
+        await self.latency.wait()
+        token = request.headers.get("authorization", "").removeprefix("Bearer ")
+        try:
+            payload = token.split(".")[1]
+            claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        except (IndexError, ValueError):
+            return JSONResponse({"message": "invalid JWT"}, status_code=401)
+        return JSONResponse({"id": claims.get("sub"), "aud": claims.get("aud"), "role": "authenticated"})
+
+
+class FakeOpenAI:
+    """Minimal ``/v1/chat/completions`` that returns tips as JSON content."""
+
+    TIPS = [
+        "Keep protein intake steady across the week.",
+        "Add a short walk after your largest meal.",
+        "Log sleep alongside energy to spot patterns.",
+    ]
+
+    def __init__(self, latency: Latency) -> None:
+        self.latency = latency
+        self.requests = 0
+        self.fail_with: int | None = None  # answer every completion with this status
+        self.app = Starlette(routes=[Route("/v1/chat/completions", self.completions, methods=["POST"])])
+
+    async def completions(self, request: Request) -> Response:
+        self.requests += 1
+        body = await request.json()
+        await self.latency.wait()
+        if self.fail_with is not None:
+            return JSONResponse({"error": {"message": "injected failure"}}, status_code=self.fail_with)
+        return JSONResponse(
+            {
+                "id": f"chatcmpl-bench-{self.requests}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "bench"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": json.dumps({"tips": self.TIPS})},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {"prompt_tokens": 100, "completion_tokens": 40, "total_tokens": 140},
+            }
+        )
+
+
+class FakeRedis:
+    """In-memory Redis stand-in on a background thread (``url`` once started)."""
+
+    def __init__(self, latency: Latency | None = None) -> None:
+        self.latency = latency or Latency(0)
+        self.data: dict[bytes, tuple[bytes, float | None]] = {}  # key -> (value, expires_at)
+        self.commands = 0
+        self.url = ""
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+
+    def _alive(self, key: bytes) -> bytes | None:
+        item = self.data.get(key)
+        if item is None:
+            return None
+        if item[1] is not None and item[1] <= time.time():
+            del self.data[key]
+            return None
+        return item[0]
+
+    def execute(self, args: list[bytes]) -> Any:
+        name = args[0].upper()
+        if name in (b"PING", b"AUTH", b"SELECT"):
+            return "PONG" if name == b"PING" else "OK"
+        if name == b"GET":
+            return self._alive(args[1])
+        if name == b"SET":
+            expires_at = None
+            if len(args) >= 5 and args[3].upper() == b"PX":
+                expires_at = time.time() + int(args[4]) / 1000
+            self.data[args[1]] = (args[2], expires_at)
+            return "OK"
+        if name == b"DEL":
+            return sum(self.data.pop(k, None) is not None for k in args[1:])
+        if name == b"SCAN":
+            # Every match in one page (cursor "0" = done)
+            pattern = args[args.index(b"MATCH") + 1].decode() if b"MATCH" in args else "*"
+            keys = [k for k in list(self.data) if self._alive(k) is not None]
+            return [b"0", [k for k in keys if fnmatch.fnmatchcase(k.decode(), pattern)]]
+        if name == b"FLUSHDB":
+            self.data.clear()
+            return "OK"
+        return RuntimeError(f"ERR unknown command '{name.decode()}'")
+
+    @staticmethod
+    def _encode(value: Any) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        if isinstance(value, RuntimeError):
+            return b"-%s\r\n" % str(value).encode()
+        if isinstance(value, str):
+            return b"+%s\r\n" % value.encode()
+        if isinstance(value, int):
+            return b":%d\r\n" % value
+        if isinstance(value, list):
+            return b"*%d\r\n" % len(value) + b"".join(FakeRedis._encode(v) for v in value)
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                header = await reader.readline()
+                if not header:
+                    break
+                args = []
+                for _ in range(int(header[1:-2])):
+                    length = int((await reader.readline())[1:-2])
+                    args.append((await reader.readexactly(length + 2))[:-2])
+                self.commands += 1
+                await self.latency.wait()
+                writer.write(self._encode(self.execute(args)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass  # client went away, or stop() is shutting the loop down
+        finally:
+            writer.close()
+
+    def start(self) -> "FakeRedis":
+        started = threading.Event()
+
+        def run() -> None:
+            loop = self._loop = asyncio.new_event_loop()
+            server = loop.run_until_complete(asyncio.start_server(self._client, "127.0.0.1", 0))
+            self.url = f"redis://127.0.0.1:{server.sockets[0].getsockname()[1]}/0"
+            started.set()
+            loop.run_forever()
+            server.close()
+            pending = asyncio.all_tasks(loop)
+            for task in pending:
+                task.cancel()
+            if pending:
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.close()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self) -> None:
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+class ServerThread:
+    """Run an ASGI app with uvicorn on a background thread and a free port."""
+
+    def __init__(self, app: Any) -> None:
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        config = uvicorn.Config(app, log_level="warning", access_log=False, lifespan="off")
+        self.server = uvicorn.Server(config)
+        self.thread: threading.Thread | None = None
+
+    def start(self) -> "ServerThread":
+        self.thread = threading.Thread(target=self.server.run, kwargs={"sockets": [self.sock]}, daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+
+
+def serve_in_thread(app: Any) -> ServerThread:
+    """Start ``app`` on ``127.0.0.1:<free port>``; returns the running server."""
+    return ServerThread(app).start()
@@ -0,0 +1,201 @@
+"""Resilience benchmark: what clients see while an upstream stalls or fails.
+
+Run from the ``backend`` folder::
+
+    python -m benchmarks.resilience
+    python -m benchmarks.resilience --requests 40 --concurrency 8 --output resilience.json
+    python -m benchmarks.resilience --env BREAKER_FAILURE_THRESHOLD=1000   # without breakers
+
+The app runs against ``benchmarks.fakes`` with short timeouts, and the fakes
+are switched between phases:
+
+1. ``healthy``: normal latency
+2. ``openai_stalled``: the model never answers in time. Insights should
+   come back quickly with ``"fallback": true`` once the breaker opens,
+   instead of every request waiting for ``OPENAI_TIMEOUT_SECONDS``
+3. ``openai_recovered``: normal again; after ``BREAKER_RESET_SECONDS`` one
+   trial call closes the breaker
+4. ``supabase_failing``: every table request returns 503
+5. ``supabase_stalled``: the database never answers in time; ``/ping-db``
+   should answer 503/504 within ``PING_DB_TIMEOUT_SECONDS``
+6. ``recovered``: both upstreams healthy again
+
+Each phase reports statuses, fallbacks, latency percentiles, upstream calls
+and the breaker states from ``/api/v1/health`` at its end.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections.abc import Callable
+from typing import Any
+
+import httpx
+
+from benchmarks.fakes import Dataset, FakeOpenAI, FakeSupabase, Latency, serve_in_thread
+from benchmarks.run import AppProcess, percentile
+from benchmarks.scenarios import build_scenarios
+
+STALL_MS = 60_000.0
+
+# The app's settings for this run: short timeouts so a phase takes seconds
+APP_ENV = {
+    "OPENAI_TIMEOUT_SECONDS": "1",
+    "SUPABASE_HTTP_TIMEOUT": "1",
+    "PING_DB_TIMEOUT_SECONDS": "0.5",
+    "REQUEST_DEADLINE_SECONDS": "3",
+    "BREAKER_FAILURE_THRESHOLD": "5",
+    "BREAKER_RESET_SECONDS": "2",
+}
+
+
+async def run_phase(
+    client: httpx.AsyncClient, build: Callable[[int], tuple[str, str, dict[str, str]]], requests: int,
+    concurrency: int, offset: int,
+) -> dict[str, Any]:
+    """Send ``requests`` requests from ``concurrency`` workers; count statuses and fallbacks."""
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    fallbacks = 0
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal next_index, fallbacks
+        while next_index < requests:
+            i = next_index
+            next_index += 1
+            method, path, headers = build(offset + i)
+            started = time.perf_counter()
+            try:
+                resp = await client.request(method, path, headers=headers)
+                status = str(resp.status_code)
+                if resp.status_code == 200 and resp.json().get("fallback"):
+                    fallbacks += 1
+            except httpx.HTTPError:
+                status = "transport_error"
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    latencies.sort()
+
+    def ms(q: float) -> float | None:
+        value = percentile(latencies, q)
+        return round(value * 1000, 1) if value is not None else None
+
+    return {
+        "requests": requests,
+        "statuses": statuses,
+        "fallbacks": fallbacks,
+        "latency_ms": {"p50": ms(50), "p95": ms(95), "max": ms(100)},
+    }
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    dataset = Dataset(users=args.users, days=args.days, seed=args.seed)
+    supabase = FakeSupabase(dataset, Latency(args.supabase_latency_ms, 0.1, args.seed))
+    openai = FakeOpenAI(Latency(args.openai_latency_ms, 0.1, args.seed + 1))
+    supabase_server = serve_in_thread(supabase.app)
+    openai_server = serve_in_thread(openai.app)
+    extra_env = {**APP_ENV, **dict(e.split("=", 1) for e in args.env)}
+    app = AppProcess(supabase_server.url, openai_server.url, extra_env=extra_env)
+    reset_seconds = float(extra_env["BREAKER_RESET_SECONDS"])
+
+    def healthy() -> None:
+        supabase.latency.base, supabase.fail_with = args.supabase_latency_ms / 1000, None
+        openai.latency.base, openai.fail_with = args.openai_latency_ms / 1000, None
+
+    def openai_stalled() -> None:
+        openai.latency.base = STALL_MS / 1000
+
+    def supabase_failing() -> None:
+        supabase.fail_with = 503
+
+    def supabase_stalled() -> None:
+        supabase.fail_with, supabase.latency.base = None, STALL_MS / 1000
+
+    # (name, switch the fakes, seconds to wait before sending)
+    phases = [
+        ("healthy", healthy, 0.0),
+        ("openai_stalled", openai_stalled, 0.0),
+        ("openai_recovered", healthy, reset_seconds),
+        ("supabase_failing", supabase_failing, 0.0),
+        ("supabase_stalled", supabase_stalled, reset_seconds),
+        ("recovered", healthy, reset_seconds),
+    ]
+    report: list[dict[str, Any]] = []
+    try:
+        app.start()
+        # One new (user, window) per request: every insight is cold and calls the model
+        scenarios = build_scenarios(dataset.user_ids(), args.days, args.requests * len(phases), burst=1)
+        routes = {"insights": scenarios["insights_burst"].build, "ping_db": scenarios["ping_db"].build}
+        async with httpx.AsyncClient(base_url=app.url, timeout=args.timeout) as client:
+            offset = 0
+            for name, switch, pause in phases:
+                switch()
+                await asyncio.sleep(pause)
+                supabase_before, openai_before = supabase.requests, openai.requests
+                phase: dict[str, Any] = {"phase": name}
+                for route, build in routes.items():
+                    phase[route] = await run_phase(client, build, args.requests, args.concurrency, offset)
+                offset += args.requests
+                health = (await client.get("/api/v1/health")).json()
+                phase.update(
+                    upstream_calls={
+                        "supabase": supabase.requests - supabase_before,
+                        "openai": openai.requests - openai_before,
+                    },
+                    status=health.get("status"),
+                    breakers={n: u["breaker"]["state"] for n, u in health.get("upstreams", {}).items()},
+                )
+                report.append(phase)
+                print(
+                    f"{name:<18} insights p95={phase['insights']['latency_ms']['p95']}ms "
+                    f"fallbacks={phase['insights']['fallbacks']} ping_db={phase['ping_db']['statuses']} "
+                    f"breakers={phase['breakers']}",
+                    file=sys.stderr,
+                )
+    finally:
+        app.stop()
+        supabase_server.stop()
+        openai_server.stop()
+    return {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "supabase_latency_ms": args.supabase_latency_ms,
+            "openai_latency_ms": args.openai_latency_ms,
+            "app_env": extra_env,
+        },
+        "phases": report,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the app while upstreams stall or fail.")
+    parser.add_argument("--requests", type=int, default=30, help="Requests per route and phase")
+    parser.add_argument("--concurrency", type=int, default=6)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--supabase-latency-ms", type=float, default=5.0)
+    parser.add_argument("--openai-latency-ms", type=float, default=50.0)
+    parser.add_argument("--timeout", type=float, default=30.0, help="Client timeout per request (s)")
+    parser.add_argument(
+        "--env", action="append", default=[], metavar="KEY=VALUE", help="Override an app setting (repeatable)"
+    )
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(text + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+"""Run the benchmark suite and print results as JSON.
+
+Run from the ``backend`` folder (no network, Supabase or OpenAI key needed)::
+
+    python -m benchmarks.run
+    python -m benchmarks.run --scenarios export_csv,ping_db --concurrency 1,16,64 --requests 400
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --baseline bench.json --max-regression 0.2   # exit 1 on regression
+    python -m benchmarks.run --scenarios insights_burst,export_burst --concurrency 4 --env SINGLE_FLIGHT_ENABLED=false
+
+How it works:
+1. start the fake Supabase and OpenAI servers on background threads
+2. start the real app (``uvicorn app.main:app``) as a child process pointed
+   at the fakes, so its memory is measured on its own
+3. for every scenario and concurrency level: send a few warm-up requests,
+   then ``--requests`` requests from ``concurrency`` parallel clients
+4. report p50/p95/p99 latency, throughput, errors and the app's peak RSS
+
+Latency of the fakes (``--supabase-latency-ms``, ``--openai-latency-ms``)
+and the dataset size (``--users``, ``--days``) are configurable; with the
+same ``--seed`` a run is reproducible.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from benchmarks.fakes import Dataset, FakeOpenAI, FakeSupabase, Latency, serve_in_thread
+from benchmarks.scenarios import JWT_SECRET, Scenario, build_scenarios
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def percentile(sorted_values: list[float], q: float) -> float | None:
+    """Nearest-rank percentile of an already sorted list (``q`` in 0..100)."""
+    if not sorted_values:
+        return None
+    rank = max(1, min(len(sorted_values), round(q / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[rank - 1]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class AppProcess:
+    """The app under test, running in a child process."""
+
+    def __init__(
+        self,
+        supabase_url: str,
+        openai_url: str,
+        extra_env: dict[str, str] | None = None,
+        app_dir: Path = BACKEND_DIR,
+    ) -> None:
+        self.app_dir = app_dir
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.env = {
+            **os.environ,
+            "SUPABASE_URL": supabase_url,
+            "SUPABASE_SERVICE_ROLE_KEY": "bench-service-key",
+            "SUPABASE_ANON_KEY": "bench-anon-key",
+            "JWT_SECRET_KEY": JWT_SECRET,
+            "JWT_AUDIENCE": "authenticated",
+            "JWT_JWKS_URL": "",
+            "OPENAI_API_KEY": "bench-openai-key",
+            "OPENAI_BASE_URL": f"{openai_url}/v1",
+            # Measure the app, not the limiter (``--env RATE_LIMIT_ENABLED=true`` to include it)
+            "RATE_LIMIT_ENABLED": "false",
+            **(extra_env or {}),
+        }
+        self.proc: subprocess.Popen | None = None
+
+    def start(self, timeout: float = 30.0) -> float:
+        """Start uvicorn and wait until ``/health`` answers; returns startup seconds."""
+        started = time.perf_counter()
+        self.proc = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "app.main:app",
+                "--host", "127.0.0.1", "--port", str(self.port),
+                "--log-level", "warning", "--no-access-log",
+            ],
+            cwd=self.app_dir,
+            env=self.env,
+        )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"app exited during startup (code {self.proc.returncode})")
+            try:
+                if httpx.get(f"{self.url}/health", timeout=1.0).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.05)
+        raise RuntimeError("app did not become healthy in time")
+
+    def stop(self) -> None:
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+    def _proc_status(self, field: str) -> float | None:
+        """A ``/proc/<pid>/status`` memory field in MiB (Linux only)."""
+        if self.proc is None:
+            return None
+        try:
+            with open(f"/proc/{self.proc.pid}/status") as fh:
+                for line in fh:
+                    if line.startswith(field + ":"):
+                        return round(int(line.split()[1]) / 1024, 1)
+        except OSError:
+            return None
+        return None
+
+    def reset_peak_rss(self) -> None:
+        """Start a new peak-RSS measurement window (Linux; ignored elsewhere)."""
+        if self.proc is None:
+            return
+        try:
+            with open(f"/proc/{self.proc.pid}/clear_refs", "w") as fh:
+                fh.write("5")
+        except OSError:
+            pass
+
+    def peak_rss_mb(self) -> float | None:
+        return self._proc_status("VmHWM")
+
+
+async def drive(
+    client: httpx.AsyncClient, scenario: Scenario, requests: int, concurrency: int, offset: int = 0
+) -> dict[str, Any]:
+    """Send ``requests`` requests from ``concurrency`` workers; return stats."""
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    errors = 0
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal next_index, errors
+        while next_index < requests:
+            i = next_index
+            next_index += 1
+            method, path, headers = scenario.build(offset + i)
+            started = time.perf_counter()
+            try:
+                # Read the whole body: streamed exports count until the last byte
+                resp = await client.request(method, path, headers=headers)
+                latencies.append(time.perf_counter() - started)
+                statuses[str(resp.status_code)] = statuses.get(str(resp.status_code), 0) + 1
+                if resp.status_code >= 500:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+                statuses["transport_error"] = statuses.get("transport_error", 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    def ms(value: float | None) -> float | None:
+        return round(value * 1000, 2) if value is not None else None
+
+    return {
+        "requests": requests,
+        "errors": errors,
+        "statuses": statuses,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "latency_ms": {
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "mean": ms(sum(latencies) / len(latencies)) if latencies else None,
+            "max": ms(latencies[-1]) if latencies else None,
+        },
+    }
+
+
+async def run_suite(args: argparse.Namespace) -> dict[str, Any]:
+    dataset = Dataset(users=args.users, days=args.days, seed=args.seed)
+    supabase = FakeSupabase(dataset, Latency(args.supabase_latency_ms, args.jitter, args.seed))
+    openai = FakeOpenAI(Latency(args.openai_latency_ms, args.jitter, args.seed + 1))
+    supabase_server = serve_in_thread(supabase.app)
+    openai_server = serve_in_thread(openai.app)
+    app = AppProcess(supabase_server.url, openai_server.url, extra_env=dict(e.split("=", 1) for e in args.env))
+    results: list[dict[str, Any]] = []
+    try:
+        startup_s = app.start()
+        levels = [int(c) for c in args.concurrency.split(",")]
+        scenarios = build_scenarios(
+            dataset.user_ids(), args.days, args.requests * len(levels) + args.warmup, burst=args.burst
+        )
+        names = list(scenarios) if args.scenarios == "all" else args.scenarios.split(",")
+        limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+        async with httpx.AsyncClient(base_url=app.url, limits=limits, timeout=args.timeout) as client:
+            for name in names:
+                scenario = scenarios[name]
+                offset = 0
+                for concurrency in levels:
+                    if args.warmup:
+                        await drive(client, scenario, args.warmup, min(concurrency, args.warmup), offset)
+                        offset += args.warmup
+                    app.reset_peak_rss()
+                    supabase_before, openai_before = supabase.requests, openai.requests
+                    stats = await drive(client, scenario, args.requests, concurrency, offset)
+                    offset += args.requests
+                    stats.update(
+                        scenario=name,
+                        concurrency=concurrency,
+                        peak_rss_mb=app.peak_rss_mb(),
+                        upstream_calls={
+                            "supabase": supabase.requests - supabase_before,
+                            "openai": openai.requests - openai_before,
+                        },
+                    )
+                    results.append(stats)
+                    print(
+                        f"{name:<18} c={concurrency:<4} p50={stats['latency_ms']['p50']}ms "
+                        f"p95={stats['latency_ms']['p95']}ms rps={stats['throughput_rps']} errors={stats['errors']}",
+                        file=sys.stderr,
+                    )
+    finally:
+        app.stop()
+        supabase_server.stop()
+        openai_server.stop()
+
+    return {
+        "config": {
+            "users": args.users,
+            "days": args.days,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "supabase_latency_ms": args.supabase_latency_ms,
+            "openai_latency_ms": args.openai_latency_ms,
+            "jitter": args.jitter,
+            "seed": args.seed,
+            "burst": args.burst,
+            "env": args.env,
+        },
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "app_startup_s": round(startup_s, 3),
+        "results": results,
+    }
+
+
+def compare(report: dict[str, Any], baseline: dict[str, Any], max_regression: float) -> list[str]:
+    """Return human-readable regressions of ``report`` against ``baseline``."""
+    before = {(r["scenario"], r["concurrency"]): r for r in baseline.get("results", [])}
+    problems = []
+    for row in report["results"]:
+        base = before.get((row["scenario"], row["concurrency"]))
+        if base is None:
+            continue
+        label = f"{row['scenario']} c={row['concurrency']}"
+        p95, base_p95 = row["latency_ms"]["p95"], base["latency_ms"]["p95"]
+        if p95 and base_p95 and p95 > base_p95 * (1 + max_regression):
+            problems.append(f"{label}: p95 {base_p95}ms -> {p95}ms")
+        rps, base_rps = row["throughput_rps"], base["throughput_rps"]
+        if rps and base_rps and rps < base_rps * (1 - max_regression):
+            problems.append(f"{label}: throughput {base_rps} -> {rps} req/s")
+        if row["errors"] > base["errors"]:
+            problems.append(f"{label}: errors {base['errors']} -> {row['errors']}")
+    return problems
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline load benchmarks for the API.")
+    parser.add_argument("--scenarios", default="all", help="Comma list (export_csv, insights_generate, analytics, "
+                        "auth_warm, auth_cold, ping_db, insights_burst, export_burst) or 'all'")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma list of parallel clients")
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per level")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests before each level")
+    parser.add_argument("--users", type=int, default=50, help="Users in the fake dataset")
+    parser.add_argument("--days", type=int, default=90, help="Days of tracking rows per user")
+    parser.add_argument("--supabase-latency-ms", type=float, default=5.0, help="Fake Supabase latency")
+    parser.add_argument("--openai-latency-ms", type=float, default=300.0, help="Fake OpenAI latency")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Extra random latency (fraction)")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for data and jitter")
+    parser.add_argument("--burst", type=int, default=4, help="Identical requests per burst (*_burst scenarios)")
+    parser.add_argument(
+        "--env", action="append", default=[], metavar="KEY=VALUE", help="Extra app setting (repeatable)"
+    )
+    parser.add_argument("--timeout", type=float, default=60.0, help="Client timeout per request (s)")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    parser.add_argument("--baseline", help="Compare against a previous JSON report")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed p95/throughput change")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run_suite(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    if args.baseline:
+        problems = compare(report, json.loads(Path(args.baseline).read_text()), args.max_regression)
+        for problem in problems:
+            print(f"REGRESSION {problem}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""Benchmark scenarios: which request to send for the i-th call.
+
+Each scenario mixes users round-robin so caches behave like real traffic:
+the first request per user is cold (rollup refresh, model call), later ones
+are warm. The ``*_burst`` scenarios instead send ``burst`` identical
+requests in a row (a double-tap or pull-to-refresh), each burst for a cold
+user and window; run them with ``--concurrency`` of at least ``burst`` and
+compare ``upstream_calls`` with ``SINGLE_FLIGHT_ENABLED`` on and off.
+"""
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+
+import jwt
+
+# Shared with the app under test (``JWT_SECRET_KEY``) so tokens verify locally
+JWT_SECRET = "bench-secret-not-for-production"
+
+RequestSpec = tuple[str, str, dict[str, str]]  # (method, path, headers)
+
+
+def mint_token(user_id: str, nonce: int = 0) -> str:
+    """An HS256 access token shaped like Supabase's (``nonce`` makes it unique)."""
+    now = int(time.time())
+    claims = {"sub": user_id, "aud": "authenticated", "role": "authenticated", "iat": now, "exp": now + 3600}
+    if nonce:
+        claims["jti"] = str(nonce)
+    return jwt.encode(claims, JWT_SECRET, algorithm="HS256")
+
+
+@dataclass
+class Scenario:
+    """A named request generator; ``build(i)`` returns the i-th request."""
+
+    name: str
+    description: str
+    build: Callable[[int], RequestSpec]
+
+
+def _bearer(token: str) -> dict[str, str]:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def build_scenarios(user_ids: list[str], days: int, requests: int, burst: int = 4) -> dict[str, Scenario]:
+    """All scenarios over the fake dataset (``requests`` sizes the token pool)."""
+    tokens = [mint_token(u) for u in user_ids]
+    end = datetime.now(UTC)
+    start = end - timedelta(days=days)
+    window = f"start={start.date().isoformat()}&end={end.isoformat().replace('+00:00', 'Z')}"
+
+    # A fresh token per request defeats the token cache: measures signature checks
+    cold_tokens = [mint_token(user_ids[i % len(user_ids)], nonce=i + 1) for i in range(requests)]
+
+    def export_csv(i: int) -> RequestSpec:
+        return "GET", f"/api/v1/export/csv?{window}", _bearer(tokens[i % len(tokens)])
+
+    def insights_generate(i: int) -> RequestSpec:
+        return "POST", "/api/v1/insights/generate?days=7", _bearer(tokens[i % len(tokens)])
+
+    def auth_warm(i: int) -> RequestSpec:
+        # Any authenticated route works; a missing job is a cheap 404 after auth
+        return "GET", "/api/v1/insights/jobs/bench-missing", _bearer(tokens[i % len(tokens)])
+
+    def auth_cold(i: int) -> RequestSpec:
+        return "GET", "/api/v1/insights/jobs/bench-missing", _bearer(cold_tokens[i % len(cold_tokens)])
+
+    def analytics(i: int) -> RequestSpec:
+        return "GET", f"/api/v1/analytics?{window}", _bearer(tokens[i % len(tokens)])
+
+    def ping_db(i: int) -> RequestSpec:
+        return "GET", "/api/v1/ping-db", {}
+
+    def insights_burst(i: int) -> RequestSpec:
+        # Every pass over the users asks for a new window, so each burst is cold
+        n = i // burst
+        window_days = 1 + (n // len(tokens)) % 365
+        return "POST", f"/api/v1/insights/generate?days={window_days}", _bearer(tokens[n % len(tokens)])
+
+    def export_burst(i: int) -> RequestSpec:
+        return "GET", f"/api/v1/export/csv?{window}", _bearer(tokens[(i // burst) % len(tokens)])
+
+    scenarios = [
+        Scenario("export_csv", f"CSV export of {days} days for one user", export_csv),
+        Scenario("insights_generate", "7-day insights (rollups + model, then cached)", insights_generate),
+        Scenario("analytics", f"Trends and peptide comparisons over {days} days", analytics),
+        Scenario("auth_warm", "Authenticated no-op with a repeated token", auth_warm),
+        Scenario("auth_cold", "Authenticated no-op with a new token every time", auth_cold),
+        Scenario("ping_db", "Single-row database round-trip", ping_db),
+        Scenario("insights_burst", f"Bursts of {burst} identical cold insight requests", insights_burst),
+        Scenario("export_burst", f"Bursts of {burst} identical CSV exports", export_burst),
+    ]
+    return {s.name: s for s in scenarios}
@@ -0,0 +1,170 @@
+"""Schedule engine benchmark: "what's due" queries at 100k active schedules.
+
+Run from the ``backend`` folder::
+
+    python -m benchmarks.schedules
+    python -m benchmarks.schedules --schedules 100000 --users 25000 --output schedules.json
+
+Builds ``--schedules`` random recurrence rules (daily / weekly, several
+timezones, one to three doses a day) spread over ``--users`` users, loads
+them into a ``ScheduleIndex`` and reports the median time of:
+
+- ``fanout``: every user's doses in a ``--window-minutes`` window, with the
+  window sliding forward like a reminder job (``ScheduleIndex.due``)
+- ``user``: one user's doses over the next 7 days (``due_for_user``)
+- ``upsert`` / ``remove``: changing one rule in the loaded index
+
+Each query is also timed against a scan that expands every rule over the
+window (what the index replaces), and the results are checked to match.
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from collections.abc import Callable
+from datetime import UTC, date, datetime, timedelta
+from typing import Any
+
+from app.services.schedules import Recurrence, ScheduleIndex
+
+TIMEZONES = ("UTC", "Europe/Berlin", "America/New_York", "America/Los_Angeles", "Asia/Tokyo", "Australia/Sydney")
+
+
+def make_rules(count: int, users: int, seed: int = 7) -> list[Recurrence]:
+    rng = random.Random(seed)
+    today = date.today()
+    rules = []
+    for i in range(count):
+        freq = "weekly" if rng.random() < 0.4 else "daily"
+        starts_on = today - timedelta(days=rng.randint(0, 365))
+        rules.append(
+            Recurrence.from_row(
+                {
+                    "id": f"schedule-{i}",
+                    "user_id": f"user-{i % users}",
+                    "title": f"Dose {i}",
+                    "freq": freq,
+                    "interval": rng.choice((1, 1, 1, 2, 3)),
+                    "weekdays": rng.sample(range(1, 8), rng.randint(1, 3)) if freq == "weekly" else None,
+                    "times": [
+                        f"{rng.randint(6, 22):02d}:{rng.choice((0, 15, 30, 45)):02d}" for _ in range(rng.randint(1, 3))
+                    ],
+                    "timezone": rng.choice(TIMEZONES),
+                    "starts_on": starts_on.isoformat(),
+                    "until": (today + timedelta(days=rng.randint(1, 365))).isoformat() if rng.random() < 0.3 else None,
+                }
+            )
+        )
+    return rules
+
+
+def time_us(fn: Callable[[], Any], repeat: int) -> float:
+    """Median wall time of ``fn`` in microseconds."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return round(statistics.median(samples), 1)
+
+
+def scan(rules: list[Recurrence], start: float, end: float) -> int:
+    """Baseline: expand every rule over the window."""
+    return sum(1 for rule in rules for _ in rule.between(start, end))
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the dose schedule index.")
+    parser.add_argument("--schedules", type=int, default=100_000, help="Active schedules")
+    parser.add_argument("--users", type=int, default=25_000, help="Users they belong to")
+    parser.add_argument("--window-minutes", type=int, default=5, help="Fan-out window")
+    parser.add_argument("--repeat", type=int, default=50, help="Timed repetitions per measurement")
+    parser.add_argument("--scan-repeat", type=int, default=3, help="Repetitions of the full-scan baseline")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    rules = make_rules(args.schedules, args.users)
+    by_user: dict[str, list[Recurrence]] = {}
+    for rule in rules:
+        by_user.setdefault(rule.user_id, []).append(rule)
+    now = datetime.now(UTC).replace(minute=0, second=0, microsecond=0).timestamp()
+    window = args.window_minutes * 60
+
+    # 1) Load the index (rules only; the timeline grows with the queries)
+    started = time.perf_counter()
+    index = ScheduleIndex(origin=now)
+    for rule in rules:
+        index.upsert(rule)
+    load_s = time.perf_counter() - started
+
+    # 2) Fan-out: a window sliding forward, as a reminder job would ask
+    slide = {"start": now}
+
+    def fanout() -> list[dict[str, Any]]:
+        doses = index.due(slide["start"], slide["start"] + window)
+        slide["start"] += window
+        return doses
+
+    fanout_us = time_us(fanout, args.repeat)
+    check_start = slide["start"]
+    indexed = len(index.due(check_start, check_start + window))
+    scanned = scan(rules, check_start, check_start + window)
+    fanout_scan_us = time_us(lambda: scan(rules, check_start, check_start + window), args.scan_repeat)
+    day_started = time.perf_counter()
+    day_doses = len(index.due(now, now + 86_400))
+    extend_day_ms = (time.perf_counter() - day_started) * 1e3
+
+    # 3) One user's week
+    rng = random.Random(1)
+    users = [f"user-{rng.randrange(args.users)}" for _ in range(args.repeat)]
+    week = 7 * 86_400
+    picks = iter(users * 2)
+    user_us = time_us(lambda: index.due_for_user(next(picks), now, now + week), args.repeat)
+    user_scan_us = time_us(
+        lambda: [d for rule in rules if rule.user_id == users[0] for d in rule.between(now, now + week)],
+        args.scan_repeat,
+    )
+    user_match = len(index.due_for_user(users[0], now, now + week)) == sum(
+        1 for rule in by_user.get(users[0], []) for _ in rule.between(now, now + week)
+    )
+
+    # 4) Edits against the loaded index
+    edits = iter(rules)
+    upsert_us = time_us(lambda: index.upsert(next(edits)), args.repeat)
+    removals = iter(rules)
+    remove_us = time_us(lambda: index.remove(next(removals).id), args.repeat)
+    trim_started = time.perf_counter()
+    index.trim(now + 3600)
+    trim_ms = (time.perf_counter() - trim_started) * 1e3
+
+    report = {
+        "schedules": args.schedules,
+        "users": args.users,
+        "load_seconds": round(load_s, 3),
+        "fanout": {
+            "window_minutes": args.window_minutes,
+            "indexed_us": fanout_us,
+            "scan_us": fanout_scan_us,
+            "doses": indexed,
+            "matches_scan": indexed == scanned,
+        },
+        "timeline": {
+            "doses_next_24h": day_doses,
+            "extend_24h_ms": round(extend_day_ms, 1),
+            "trim_ms": round(trim_ms, 1),
+        },
+        "user_week": {"indexed_us": user_us, "scan_us": user_scan_us, "matches_scan": user_match},
+        "edits": {"upsert_us": upsert_us, "remove_us": remove_us},
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(text + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""Cold-start benchmark: import time and time to first response.
+
+Run from the ``backend`` folder::
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --runs 5 --no-warmup             # compare without warm-up
+    python -m benchmarks.startup --app-dir /path/to/other/backend  # compare another checkout
+
+Each run measures, in fresh processes:
+
+- ``import_s``: ``import app.main`` in a new interpreter
+- ``ready_s``: from spawning uvicorn until ``/health`` answers
+- ``first_*_ms``: the first request to a few routes right after ``/health``
+  answers (what a user hitting a just-woken instance waits for)
+
+Results (median/min/max per measurement) are printed as JSON.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.fakes import Dataset, FakeOpenAI, FakeSupabase, Latency, serve_in_thread
+from benchmarks.run import BACKEND_DIR, AppProcess
+from benchmarks.scenarios import mint_token
+
+
+def measure_import(app_dir: Path, env: dict[str, str]) -> float:
+    """Seconds to ``import app.main`` in a fresh interpreter."""
+    code = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=app_dir, env=env, check=True, capture_output=True, text=True
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def first_requests(url: str, token: str, pause: float) -> dict[str, float]:
+    """Latency (ms) of the first call to each route on a freshly started app."""
+    routes = {
+        "first_ping_db_ms": ("GET", "/api/v1/ping-db"),
+        "first_insights_ms": ("POST", "/api/v1/insights/generate?days=7"),
+    }
+    timings: dict[str, float] = {}
+    with httpx.Client(base_url=url, timeout=60.0, headers={"Authorization": f"Bearer {token}"}) as client:
+        time.sleep(pause)  # a real first user arrives a moment after the port opens
+        for name, (method, path) in routes.items():
+            started = time.perf_counter()
+            resp = client.request(method, path)
+            resp.raise_for_status()
+            timings[name] = round((time.perf_counter() - started) * 1000, 2)
+    return timings
+
+
+def summarize(values: list[float]) -> dict[str, float]:
+    return {
+        "median": round(statistics.median(values), 4),
+        "min": round(min(values), 4),
+        "max": round(max(values), 4),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure import time and time to first response.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per measurement")
+    parser.add_argument("--app-dir", default=str(BACKEND_DIR), help="Backend checkout to measure")
+    parser.add_argument("--no-warmup", action="store_true", help="Set CLIENT_WARMUP_ENABLED=false")
+    parser.add_argument("--pause", type=float, default=0.25, help="Delay before the first request (s)")
+    parser.add_argument("--supabase-latency-ms", type=float, default=5.0, help="Fake Supabase latency")
+    parser.add_argument("--openai-latency-ms", type=float, default=50.0, help="Fake OpenAI latency")
+    args = parser.parse_args(argv)
+
+    dataset = Dataset(users=5, days=30)
+    supabase = serve_in_thread(FakeSupabase(dataset, Latency(args.supabase_latency_ms)).app)
+    openai = serve_in_thread(FakeOpenAI(Latency(args.openai_latency_ms)).app)
+    extra_env = {"CLIENT_WARMUP_ENABLED": "false"} if args.no_warmup else {}
+    app_dir = Path(args.app_dir).resolve()
+    samples: dict[str, list[float]] = {}
+    try:
+        for run in range(args.runs):
+            app = AppProcess(supabase.url, openai.url, extra_env, app_dir=app_dir)
+            samples.setdefault("import_s", []).append(measure_import(app_dir, app.env))
+            try:
+                samples.setdefault("ready_s", []).append(app.start())
+                # A different user per run so no cached insight is reused
+                token = mint_token(dataset.user_ids()[run % dataset.users])
+                for name, value in first_requests(app.url, token, args.pause).items():
+                    samples.setdefault(name, []).append(value)
+            finally:
+                app.stop()
+            print(f"run {run + 1}/{args.runs} done", file=sys.stderr)
+    finally:
+        supabase.stop()
+        openai.stop()
+
+    report = {
+        "app_dir": str(app_dir),
+        "runs": args.runs,
+        "warmup": not args.no_warmup,
+        "results": {name: summarize(values) for name, values in samples.items()},
+    }
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""Wire-efficiency benchmark: serialization CPU and bytes on the wire.
+
+Run from the ``backend`` folder::
+
+    python -m benchmarks.wire
+    python -m benchmarks.wire --days 90 --users 20 --repeat 50 --output wire.json
+
+Payloads come from the same synthetic data as the load suite
+(``benchmarks.fakes``):
+
+- ``insights``: an ``/insights/generate`` answer (small: under the
+  compression threshold on purpose)
+- ``sync``: a full ``/sync`` answer for one user over ``--days`` days
+- ``export_csv``: a CSV export of every user's rows, streamed in pages of
+  ``--page-rows`` like ``/export/csv``
+
+For each payload the report has, per serializer (stdlib ``json`` as used by
+FastAPI's default ``JSONResponse``, ``orjson``, MessagePack), the median
+encode time and body size; and per compression setting (gzip levels, brotli
+qualities), the median time and compressed size. For the streamed CSV,
+"streamed" compresses page by page with a flush after every page (what
+``CompressionMiddleware`` does) and "one_shot" compresses the whole file.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from collections.abc import Callable
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.compression import BrotliCompressor, GzipCompressor
+from app.core.responses import dumps_json, dumps_msgpack
+from app.services.export_formats import make_encoder
+from app.services.rollups import ROLLUP_METRICS, build_summary
+from benchmarks.fakes import Dataset, FakeSupabase, Latency
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+EXPORT_COLUMNS = (
+    "created_at", "weight_lbs", "waist_in", "bp_am", "bp_pm", "body_fat_pct", "muscle_mass_pct",
+    "resting_hr_bpm", "energy", "appetite", "performance", "peptide1_id", "peptide2_id", "peptide3_id",
+)  # fmt: skip
+
+
+def time_us(fn: Callable[[], Any], repeat: int) -> float:
+    """Median wall time of ``fn`` in microseconds."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return round(statistics.median(samples), 1)
+
+
+def stdlib_json(content: Any) -> bytes:
+    # Exactly what starlette.responses.JSONResponse.render does
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode(
+        "utf-8"
+    )
+
+
+def build_payloads(dataset: Dataset) -> dict[str, Any]:
+    fake = FakeSupabase(dataset, Latency(0))
+    user_id = dataset.user_ids()[0]
+    rows = {name: table.by_user.get(user_id, []) for name, table in fake.tables.items()}
+    summary = build_summary(7, {metric: 100.0 + i / 3 for i, metric in enumerate(ROLLUP_METRICS)}, 7)
+    return {
+        "insights": {
+            "tips": [
+                "Your weight trend is flat this week; consider a small calorie deficit.",
+                "Resting heart rate improved on training days - keep the routine.",
+                "Log blood pressure at the same time each morning for cleaner trends.",
+            ],
+            "summary": summary,
+            "cached": False,
+        },
+        "sync": {
+            "changes": {
+                "tracking": rows["daily_tracking"],
+                "peptides": rows["peptides"],
+                "insights": rows["insights"],
+            },
+            "cursor": "eyJwIjp7fSwidiI6MX0",
+            "has_more": False,
+        },
+    }
+
+
+def compressors() -> dict[str, Callable[[], Any]]:
+    options: dict[str, Callable[[], Any]] = {
+        f"gzip-{level}": (lambda level=level: GzipCompressor(level)) for level in (1, 6, 9)
+    }
+    if brotli is not None:
+        options.update({f"br-{q}": (lambda q=q: BrotliCompressor(q)) for q in (1, 4, 6)})
+    return options
+
+
+def bench_payload(content: Any, repeat: int) -> dict[str, Any]:
+    # FastAPI runs jsonable_encoder before any response class, so it is
+    # reported separately and the serializers get its output
+    encoded = jsonable_encoder(content)
+    serializers: dict[str, Callable[[Any], bytes]] = {"stdlib_json": stdlib_json, "orjson": dumps_json}
+    if msgpack is not None:
+        serializers["msgpack"] = dumps_msgpack
+    report: dict[str, Any] = {
+        "jsonable_encoder_us": time_us(lambda: jsonable_encoder(content), repeat),
+        "serializers": {
+            name: {"encode_us": time_us(lambda fn=fn: fn(encoded), repeat), "bytes": len(fn(encoded))}
+            for name, fn in serializers.items()
+        },
+    }
+    body = dumps_json(encoded)
+    report["compression"] = {
+        name: {
+            "compress_us": time_us(lambda make=make: make().finish(body), repeat),
+            "bytes": len(make().finish(body)),
+        }
+        for name, make in compressors().items()
+    }
+    return report
+
+
+def bench_export(rows: list[dict[str, Any]], page_rows: int, repeat: int) -> dict[str, Any]:
+    pages = [rows[i : i + page_rows] for i in range(0, len(rows), page_rows)]
+
+    def encode() -> list[bytes]:
+        encoder = make_encoder("csv", EXPORT_COLUMNS)
+        return [encoder.header() + encoder.encode(pages[0]), *(encoder.encode(p) for p in pages[1:])]
+
+    chunks = encode()
+    whole = b"".join(chunks)
+
+    def streamed(make: Callable[[], Any]) -> bytes:
+        compressor = make()
+        return b"".join([*(compressor.compress(c) for c in chunks[:-1]), compressor.finish(chunks[-1])])
+
+    return {
+        "rows": len(rows),
+        "pages": len(pages),
+        "csv_encode_us": time_us(encode, repeat),
+        "bytes": len(whole),
+        "compression": {
+            name: {
+                "streamed_us": time_us(lambda make=make: streamed(make), repeat),
+                "streamed_bytes": len(streamed(make)),
+                "one_shot_bytes": len(make().finish(whole)),
+            }
+            for name, make in compressors().items()
+        },
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure serialization CPU and bytes on the wire.")
+    parser.add_argument("--users", type=int, default=10, help="Users in the export payload")
+    parser.add_argument("--days", type=int, default=365, help="Days of tracking per user")
+    parser.add_argument("--page-rows", type=int, default=1000, help="Rows per streamed export page")
+    parser.add_argument("--repeat", type=int, default=30, help="Timed repetitions per measurement")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    dataset = Dataset(users=args.users, days=args.days)
+    payloads = build_payloads(dataset)
+    export_rows = FakeSupabase(dataset, Latency(0)).tables["daily_tracking"].rows
+    report = {
+        "users": args.users,
+        "days": args.days,
+        "msgpack": msgpack is not None,
+        "brotli": brotli is not None,
+        "payloads": {name: bench_payload(content, args.repeat) for name, content in payloads.items()},
+        "export_csv": bench_export(export_rows, args.page_rows, args.repeat),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(text + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
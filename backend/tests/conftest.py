@@ -0,0 +1,141 @@
+"""Shared fixtures: the app's clients pointed at in-process stand-ins.
+
+The stand-ins are the benchmark fakes (``benchmarks.fakes``): an in-memory
+PostgREST and an OpenAI chat endpoint. Here they are served through
+``httpx.ASGITransport`` instead of a socket, so tests need no network and no
+background threads.
+
+If you're new:
+- ``supabase`` records when each request to the stand-in started and ended
+  (``supabase.calls``), so tests can check that requests really overlapped.
+- Process-wide state (single-flight groups, breakers, caches, the write
+  counters) is reset before every test.
+"""
+import os
+
+from benchmarks.scenarios import JWT_SECRET, mint_token  # noqa: F401 - re-exported for tests
+
+# Before any app import: settings are read once
+os.environ.update(
+    {
+        "SUPABASE_URL": "http://supabase.test",
+        "SUPABASE_SERVICE_ROLE_KEY": "test-service-key",
+        "SUPABASE_ANON_KEY": "test-anon-key",
+        "OPENAI_API_KEY": "test-openai-key",
+        "OPENAI_BASE_URL": "http://openai.test/v1",
+        "JWT_SECRET_KEY": JWT_SECRET,
+        "JWT_JWKS_URL": "",
+        "CACHE_BACKEND": "memory",
+        "RATE_LIMIT_ENABLED": "false",
+        "CLIENT_WARMUP_ENABLED": "false",
+        "PROFILING_ENABLED": "false",
+    }
+)
+
+import time  # noqa: E402
+from collections.abc import AsyncIterator, MutableMapping  # noqa: E402
+from typing import Any
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+
+from app.services import cache, postgrest, ratelimit, resilience, schedules, singleflight  # noqa: E402
+from app.services.registry import get_registry  # noqa: E402
+from benchmarks.fakes import Dataset, FakeOpenAI, FakeSupabase, Latency  # noqa: E402
+
+LATENCY_MS = 50.0
+
+
+class Recorded:
+    """An ASGI stand-in that logs ``(method, path, started, ended)`` per request."""
+
+    def __init__(self, fake: Any) -> None:
+        self.fake = fake
+        self.calls: list[tuple[str, str, float, float]] = []
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.fake, name)
+
+    async def __call__(self, scope: MutableMapping[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.fake.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        try:
+            await self.fake.app(scope, receive, send)
+        finally:
+            self.calls.append((scope["method"], scope["path"], started, time.perf_counter()))
+
+    def count(self, method: str, path: str) -> int:
+        return sum(1 for m, p, _, _ in self.calls if m == method and p == path)
+
+
+@pytest.fixture(autouse=True)
+async def fresh_state() -> AsyncIterator[None]:
+    singleflight._groups.clear()
+    resilience._upstreams.clear()
+    postgrest._writes.clear()
+    schedules._loaded = schedules._load_lock = None
+    await cache.close_caches()
+    await ratelimit.close_rate_limiter()
+    yield
+    await cache.close_caches()
+    await ratelimit.close_rate_limiter()
+
+
+@pytest.fixture
+def dataset() -> Dataset:
+    return Dataset(users=4, days=60, seed=7)
+
+
+@pytest.fixture
+async def supabase(dataset: Dataset, monkeypatch: pytest.MonkeyPatch) -> AsyncIterator[Recorded]:
+    """The PostgREST stand-in, installed as the registry's Supabase pool."""
+    recorded = Recorded(FakeSupabase(dataset, Latency(LATENCY_MS, jitter=0.0)))
+    registry = get_registry()
+    key = registry.supabase_key
+    http = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=recorded),
+        base_url="http://supabase.test",
+        headers={"apikey": key, "Authorization": f"Bearer {key}"},
+    )
+    monkeypatch.setattr(registry, "_http", http)
+    yield recorded
+    await http.aclose()
+
+
+@pytest.fixture
+async def openai(monkeypatch: pytest.MonkeyPatch) -> AsyncIterator[Recorded]:
+    """The OpenAI stand-in, installed as the registry's ``AsyncOpenAI`` client."""
+    from openai import AsyncOpenAI
+
+    recorded = Recorded(FakeOpenAI(Latency(LATENCY_MS, jitter=0.0)))
+    http = httpx.AsyncClient(transport=httpx.ASGITransport(app=recorded))
+    client = AsyncOpenAI(api_key="test", base_url="http://openai.test/v1", http_client=http, max_retries=0)
+    monkeypatch.setattr(get_registry(), "_openai", client)
+    yield recorded
+    await client.close()
+
+
+@pytest.fixture
+async def api() -> AsyncIterator[httpx.AsyncClient]:
+    """An HTTP client for the app itself, in-process."""
+    from app.main import app
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://api.test") as client:
+        yield client
+
+
+def bearer(user_id: str) -> dict[str, str]:
+    """``Authorization`` header for ``user_id``, signed with the test secret."""
+    return {"Authorization": f"Bearer {mint_token(user_id)}"}
+
+
+def overlapping(calls: list[tuple[str, str, float, float]]) -> bool:
+    """True when every call started before the first one ended."""
+    first_end = min(end for _, _, _, end in calls)
+    return all(start < first_end for _, _, start, _ in calls)
+
+
+def table_rows(fake: Recorded, table: str) -> list[dict[str, Any]]:
+    return fake.tables[table].rows
@@ -0,0 +1,60 @@
+"""Analytics column cache: merges keep the expiry and do not skip late commits."""
+import time
+from datetime import UTC, datetime, timedelta
+
+from app.core.config import get_settings
+from app.schemas.tracking import TrackingIn
+from app.services import analytics
+from app.services.analytics import AnalyticsService
+from app.services.repository import get_repositories
+
+
+async def test_deleted_rows_drop_out_one_ttl_after_the_cold_load(supabase, dataset, monkeypatch):
+    ttl = get_settings().ANALYTICS_CACHE_TTL_SECONDS
+    now = time.time()
+    monkeypatch.setattr(analytics.time, "time", lambda: now)
+    repos = get_repositories()
+    service = AnalyticsService(repos)
+    user = dataset.user_ids()[0]
+    tracking = supabase.tables["daily_tracking"]
+
+    # 1) Cold load, then one row is deleted and another one written
+    loaded = await service.columns(user)
+    deleted = tracking.by_user[user][0]
+    tracking.remove(deleted)
+    await repos.tracking.upsert_many([{**tracking.by_user[user][-1], "energy": 3}])
+
+    # 2) Just before the expiry the write is merged in; the delete is not seen yet
+    now += ttl - 1
+    merged = await service.columns(user)
+    assert merged.loaded_at == loaded.loaded_at
+    assert deleted["id"] in merged.ids
+
+    # 3) One TTL after the cold load everything is reloaded, whatever was merged since
+    now += 2
+    reloaded = await service.columns(user)
+    assert deleted["id"] not in reloaded.ids
+    assert len(reloaded.ids) == len(tracking.by_user[user])
+
+
+async def test_rows_committed_late_are_still_merged(supabase, dataset, monkeypatch):
+    monkeypatch.setattr(get_settings(), "SYNC_SETTLE_SECONDS", 60)
+    repos = get_repositories()
+    service = AnalyticsService(repos)
+    user = dataset.user_ids()[1]
+    tracking = supabase.tables["daily_tracking"]
+    await service.columns(user)
+
+    # 1) A row written just now is merged, but the watermark stays behind it
+    written = dict(TrackingIn(created_at="2031-01-01T08:00:00Z", energy=4).to_row(user))
+    await repos.tracking.upsert_many([written])
+    assert written["id"] in (await service.columns(user)).ids
+
+    # 2) A transaction that started 30s ago commits its row only now
+    started = datetime.now(UTC) - timedelta(seconds=30)
+    late = dict(TrackingIn(created_at="2031-01-02T08:00:00Z", energy=5).to_row(user))
+    tracking.add({**late, "updated_at": started.strftime("%Y-%m-%dT%H:%M:%S+00:00")})
+
+    columns = await service.columns(user)
+    assert late["id"] in columns.ids
+    assert len(columns.ids) == len(tracking.by_user[user])
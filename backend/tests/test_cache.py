@@ -0,0 +1,42 @@
+"""Named caches and their backends."""
+import asyncio
+import socket
+
+import pytest
+
+from app.services.cache import RedisBackend, get_cache
+from benchmarks.fakes import FakeRedis
+
+
+@pytest.fixture
+def redis():
+    server = FakeRedis().start()
+    yield server
+    server.stop()
+
+
+def test_same_name_returns_the_same_cache():
+    assert get_cache("things", 10) is get_cache("things", 10)
+
+
+def test_same_name_with_another_backend_is_rejected():
+    get_cache("things", 10, shared=False)
+
+    with pytest.raises(ValueError):
+        get_cache("things", 10)
+
+
+async def test_redis_closes_idle_connections_when_the_loop_changes(redis):
+    backend = RedisBackend(redis.url)
+    # A CLI job runs its own loop, which is closed by the time the app uses the backend
+    await asyncio.to_thread(asyncio.run, backend.get("things", "a"))
+    [old] = backend._idle
+    fileno = old.writer.get_extra_info("socket").fileno()
+
+    await backend.get("things", "a")
+
+    assert old not in backend._idle
+    with socket.socket(fileno=socket.dup(fileno)) as raw:
+        raw.settimeout(1)
+        assert raw.recv(1) == b""  # shut down, not left open
+    await backend.close()
@@ -0,0 +1,34 @@
+"""Response compression: already-compressed export formats are passed through."""
+import httpx
+import pytest
+from starlette.responses import Response
+
+from app.core.compression import CompressionMiddleware
+
+BODY = b"0123456789" * 1000
+
+
+def _app(media_type: str) -> CompressionMiddleware:
+    async def app(scope, receive, send):
+        await Response(BODY, media_type=media_type)(scope, receive, send)
+
+    return CompressionMiddleware(app, minimum_size=100)
+
+
+async def _get(media_type: str) -> httpx.Response:
+    transport = httpx.ASGITransport(app=_app(media_type))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get("/", headers={"Accept-Encoding": "gzip"})
+
+
+async def test_text_is_gzipped():
+    resp = await _get("text/csv")
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.content == BODY
+
+
+@pytest.mark.parametrize("media_type", ["application/vnd.apache.arrow.stream", "application/vnd.apache.parquet"])
+async def test_compressed_formats_are_not_compressed_again(media_type):
+    resp = await _get(media_type)
+    assert "content-encoding" not in resp.headers
+    assert resp.content == BODY
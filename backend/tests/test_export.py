@@ -0,0 +1,48 @@
+"""Streamed exports: a database error mid-stream fails the download."""
+import httpx
+import pytest
+
+from app.core.config import get_settings
+from tests.conftest import mint_token
+
+
+@pytest.fixture
+def small_pages(monkeypatch):
+    monkeypatch.setattr(get_settings(), "EXPORT_PAGE_SIZE", 10)
+
+
+async def _download(user: str, path: str) -> httpx.Response:
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://api.test") as client:
+        return await client.get(path, headers={"Authorization": f"Bearer {mint_token(user)}"})
+
+
+async def test_export_streams_every_page(supabase, dataset, small_pages):
+    resp = await _download(dataset.user_ids()[0], "/api/v1/export/csv")
+    assert resp.status_code == 200
+    assert len(resp.text.strip().splitlines()) > 10 + 1  # several pages plus the header
+
+
+@pytest.mark.parametrize("path", ["/api/v1/export/csv", "/api/v1/export?format=ndjson"])
+async def test_database_error_mid_stream_aborts_the_download(
+    supabase, dataset, small_pages, path, caplog
+):
+    app = supabase.fake.app
+    pages = 0
+
+    async def failing_after_first_page(scope, receive, send):
+        nonlocal pages
+        if scope["path"] == "/rest/v1/daily_tracking":
+            pages += 1
+            supabase.fake.fail_with = 503 if pages > 1 else None
+        await app(scope, receive, send)
+
+    supabase.fake.app = failing_after_first_page
+    # The server raises instead of ending the body cleanly (a real server
+    # drops the connection), so the client never gets a complete file
+    with pytest.raises(Exception):  # noqa: B017 - Starlette may wrap it in an ExceptionGroup
+        await _download(dataset.user_ids()[0], path)
+    assert pages == 2
+    assert "Export aborted mid-stream" in caplog.text
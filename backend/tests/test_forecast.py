@@ -0,0 +1,77 @@
+"""Inventory forecasts: paged batch reads, watermarks and endpoint staleness."""
+from datetime import UTC, datetime, timedelta
+
+from app.core.config import get_settings
+from app.schemas.tracking import TrackingIn
+from app.services.forecast import ForecastService, forecast_for_user
+from app.services.repository import get_repositories
+
+PAGE = 5
+
+
+async def test_batch_refresh_reads_every_peptide_past_the_cap(supabase, dataset):
+    supabase.fake.max_rows = PAGE
+    repos = get_repositories()
+    users = dataset.user_ids()
+    peptides = len(supabase.tables["peptides"].rows)
+    assert peptides > PAGE
+
+    rows = await ForecastService(repos, page_size=PAGE).refresh_users(users)
+    assert len(rows) == peptides
+    stored = await repos.forecasts.list_for_users(users, page_size=PAGE)
+    assert sorted(f["peptide_id"] for f in stored) == sorted(r["id"] for r in supabase.tables["peptides"].rows)
+
+
+def dose(user: str, peptide_id: str, created_at: str) -> dict:
+    return dict(TrackingIn(created_at=created_at, peptide1_id=peptide_id).to_row(user))
+
+
+def peptide_of(supabase, user: str) -> str:
+    return supabase.tables["peptides"].by_user[user][0]["id"]
+
+
+async def test_first_incremental_run_is_a_full_one_and_seeds_the_watermarks(supabase, dataset):
+    service = ForecastService(get_repositories())
+
+    first = await service.refresh_changed()
+    # Everyone with inventory, rather than paging through all of daily_tracking
+    assert (first["full"], first["users"]) == (True, len(dataset.user_ids()))
+    marks = {r["source"] for r in supabase.tables["inventory_forecast_watermarks"].rows}
+    assert marks == {"peptides", "daily_tracking"}
+
+    again = await service.refresh_changed()
+    assert (again["full"], again["users"]) == (False, 0)
+
+
+async def test_watermark_stays_behind_recent_and_late_writes(supabase, dataset, monkeypatch):
+    monkeypatch.setattr(get_settings(), "SYNC_SETTLE_SECONDS", 60)
+    repos = get_repositories()
+    service = ForecastService(repos)
+    await service.refresh_changed(full=True)
+    writer, late_writer = dataset.user_ids()[:2]
+
+    # 1) A dose logged just now is picked up, and again on the next run
+    await repos.tracking.upsert_many([dose(writer, peptide_of(supabase, writer), "2031-01-01T08:00:00Z")])
+    assert (await service.refresh_changed())["users"] == 1
+
+    # 2) A transaction that started 30s ago commits its row only now
+    started = datetime.now(UTC) - timedelta(seconds=30)
+    late = dose(late_writer, peptide_of(supabase, late_writer), "2031-01-01T09:00:00Z")
+    supabase.tables["daily_tracking"].add({**late, "updated_at": started.strftime("%Y-%m-%dT%H:%M:%S+00:00")})
+
+    assert (await service.refresh_changed())["users"] == 2
+
+
+async def test_endpoint_recomputes_after_a_new_dose(supabase, dataset):
+    repos = get_repositories()
+    user = dataset.user_ids()[0]
+    await ForecastService(repos).refresh_users([user], now=datetime.now(UTC) - timedelta(minutes=1))
+
+    # 1) Nothing changed since: the stored forecasts are served
+    await forecast_for_user(repos, user)
+    assert supabase.count("POST", "/rest/v1/inventory_forecasts") == 1
+
+    # 2) A dose logged after the forecast makes it stale
+    await repos.tracking.upsert_many([dose(user, peptide_of(supabase, user), datetime.now(UTC).isoformat())])
+    await forecast_for_user(repos, user)
+    assert supabase.count("POST", "/rest/v1/inventory_forecasts") == 2
@@ -0,0 +1,167 @@
+"""Bulk tracking ingest: streamed parsing, per-row results, idempotent ids."""
+import json
+from collections.abc import AsyncIterator
+
+import pytest
+
+from app.core.config import get_settings
+from app.services.ingest import IngestFormatError, iter_json_array, iter_ndjson
+from tests.conftest import bearer, table_rows
+
+URL = "/api/v1/tracking/bulk"
+NDJSON = {"Content-Type": "application/x-ndjson"}
+JSON = {"Content-Type": "application/json"}
+
+
+def entries(count: int) -> list[dict]:
+    return [
+        {"created_at": f"2031-01-{day:02d}T08:00:00Z", "weight_lbs": 180 - day, "notes": "café ☕"}
+        for day in range(1, count + 1)
+    ]
+
+
+async def in_pieces(body: bytes, size: int = 7) -> AsyncIterator[bytes]:
+    # Small pieces split lines, elements and multi-byte characters
+    for start in range(0, len(body), size):
+        yield body[start : start + size]
+
+
+async def collect(items: AsyncIterator) -> list:
+    return [item async for item in items]
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    # Several upserts per request
+    monkeypatch.setattr(get_settings(), "INGEST_CHUNK_SIZE", 2)
+
+
+def stored(supabase, user: str) -> list[dict]:
+    return [r for r in table_rows(supabase, "daily_tracking") if r["user_id"] == user]
+
+
+async def test_json_array_is_parsed_as_it_streams():
+    rows = entries(5)
+    body = json.dumps(rows, ensure_ascii=False).encode()
+
+    assert await collect(iter_json_array(in_pieces(body), 1024)) == rows
+
+
+async def test_ndjson_is_parsed_as_it_streams():
+    rows = entries(5)
+    body = "\n".join(json.dumps(r, ensure_ascii=False) for r in rows).encode()
+
+    assert await collect(iter_ndjson(in_pieces(body), 1024)) == rows
+
+
+@pytest.mark.parametrize(
+    "body",
+    [b'{"created_at": "2031-01-01T00:00:00Z"}', b'[{"a": 1}, {"b": 2}', b"[" + b"1" * 100],
+    ids=["not-an-array", "unterminated", "element-too-large"],
+)
+async def test_broken_json_array_is_a_format_error(body):
+    with pytest.raises(IngestFormatError):
+        await collect(iter_json_array(in_pieces(body), 64))
+
+
+async def test_ndjson_and_json_array_store_the_same_rows(api, supabase, dataset):
+    user_a, user_b = dataset.user_ids()[:2]
+    rows = entries(5)
+
+    ndjson = "\n".join(json.dumps(r) for r in rows).encode()
+    first = await api.post(URL, content=in_pieces(ndjson), headers={**NDJSON, **bearer(user_a)})
+    array = json.dumps(rows).encode()
+    second = await api.post(URL, content=in_pieces(array), headers={**JSON, **bearer(user_b)})
+
+    assert first.status_code == second.status_code == 200
+    for resp in (first, second):
+        assert resp.json()["received"] == resp.json()["ok"] == 5
+    new_a = {(r["created_at"], r["weight_lbs"]) for r in stored(supabase, user_a) if r.get("notes") == "café ☕"}
+    new_b = {(r["created_at"], r["weight_lbs"]) for r in stored(supabase, user_b) if r.get("notes") == "café ☕"}
+    assert len(new_a) == 5
+    assert new_a == new_b
+
+
+async def test_malformed_ndjson_lines_are_reported_and_the_rest_stored(api, supabase, dataset):
+    user = dataset.user_ids()[0]
+    good = [json.dumps(r) for r in entries(2)]
+    body = "\n".join([good[0], "{not json", "", good[1]]).encode()
+
+    resp = await api.post(URL, content=body, headers={**NDJSON, **bearer(user)})
+
+    assert resp.status_code == 200
+    report = resp.json()
+    assert (report["received"], report["ok"], report["invalid"]) == (3, 2, 1)
+    assert [r["status"] for r in report["results"]] == ["ok", "invalid", "ok"]
+    assert report["results"][1]["error"].startswith("Invalid JSON")
+
+
+async def test_broken_json_array_answers_400(api, dataset):
+    user = dataset.user_ids()[0]
+    resp = await api.post(URL, content=b'[{"created_at": "2031-01-01T00:00:00Z"}', headers={**JSON, **bearer(user)})
+
+    assert resp.status_code == 400
+    assert resp.json()["detail"] == "Unterminated JSON array"
+
+
+async def test_unknown_content_type_answers_415(api, dataset):
+    resp = await api.post(URL, content=b"a,b", headers={"Content-Type": "text/csv", **bearer(dataset.user_ids()[0])})
+
+    assert resp.status_code == 415
+
+
+async def test_invalid_rows_are_reported_per_row(api, supabase, dataset):
+    user, other = dataset.user_ids()[:2]
+    rows = [
+        *entries(1),
+        {"created_at": "2031-01-02T08:00:00Z", "energy": 11},
+        {"created_at": "2031-01-03T08:00:00Z", "mood": 5},
+        {"created_at": "2031-01-04T08:00:00Z", "user_id": other},
+        {"weight_lbs": 170},
+    ]
+    before = len(stored(supabase, user))
+
+    resp = await api.post(URL, json=rows, params={"results": "errors"}, headers=bearer(user))
+
+    assert resp.status_code == 200
+    report = resp.json()
+    assert (report["ok"], report["invalid"]) == (1, 4)
+    # Only failed rows are listed with results=errors
+    assert [r["index"] for r in report["results"]] == [1, 2, 3, 4]
+    assert report["results"][0]["error"][0]["loc"] == ["energy"]
+    assert report["results"][1]["error"][0]["type"] == "extra_forbidden"
+    assert report["results"][2]["error"] == "user_id does not match the signed-in user"
+    assert report["results"][3]["error"][0]["loc"] == ["created_at"]
+    assert len(stored(supabase, user)) == before + 1
+
+
+async def test_retrying_a_batch_does_not_duplicate_rows(api, supabase, dataset):
+    user = dataset.user_ids()[0]
+    rows = entries(3)
+    rows[0]["idempotency_key"] = "offline-queue-1"
+    before = len(stored(supabase, user))
+
+    first = await api.post(URL, json=rows, headers=bearer(user))
+    rows[0]["weight_lbs"] = 150  # edited offline, then resent
+    second = await api.post(URL, json=rows, headers=bearer(user))
+
+    ids = [r["id"] for r in first.json()["results"]]
+    assert [r["id"] for r in second.json()["results"]] == ids
+    assert len(stored(supabase, user)) == before + 3
+    by_id = {r["id"]: r for r in stored(supabase, user)}
+    assert by_id[ids[0]]["weight_lbs"] == 150
+
+
+async def test_repeated_key_in_one_request_keeps_the_last_copy(api, supabase, dataset):
+    user = dataset.user_ids()[0]
+    first, last = entries(1) * 2
+    last = {**last, "weight_lbs": 123}
+    before = len(stored(supabase, user))
+
+    resp = await api.post(URL, json=[first, last], headers=bearer(user))
+
+    report = resp.json()
+    assert (report["ok"], report["duplicate"]) == (1, 1)
+    assert report["results"][0]["status"] == "duplicate"
+    assert len(stored(supabase, user)) == before + 1
+    assert next(r for r in stored(supabase, user) if r["id"] == report["results"][1]["id"])["weight_lbs"] == 123
@@ -0,0 +1,18 @@
+"""Model calls are awaited on the event loop, never blocking it."""
+import asyncio
+import time
+
+from app.services.insights import request_tips
+from tests.conftest import LATENCY_MS, overlapping
+
+
+async def test_concurrent_model_calls_overlap(openai):
+    started = time.perf_counter()
+    results = await asyncio.gather(*(request_tips(f"prompt {i}") for i in range(4)))
+    elapsed = time.perf_counter() - started
+
+    assert all(results)
+    assert len(openai.calls) == 4
+    assert overlapping(openai.calls)
+    # Four calls in about the time of one; a blocking client would take 4x
+    assert elapsed < 2 * LATENCY_MS / 1000
@@ -0,0 +1,39 @@
+"""Nightly insights batch: failed writes are counted, not fatal."""
+import pytest
+
+from app.jobs.insights_batch import main, run_batch
+from app.services.repository import get_repositories
+
+
+async def test_failed_insert_chunk_is_counted_and_the_batch_goes_on(supabase, openai, dataset):
+    app = supabase.fake.app
+    inserts = 0
+
+    async def first_insert_fails(scope, receive, send):
+        nonlocal inserts
+        if scope["method"] == "POST" and scope["path"] == "/rest/v1/insights":
+            inserts += 1
+            supabase.fake.fail_with = 503 if inserts == 1 else None
+        await app(scope, receive, send)
+        supabase.fake.fail_with = None
+
+    supabase.fake.app = first_insert_fails
+    report = await run_batch(get_repositories(), days=7, rpm=6000, chunk_size=2)
+
+    users = len(dataset.user_ids())
+    assert report["users_processed"] == users
+    assert (report["write_failures"], report["insights_written"]) == (2, users - 2)
+    assert len(supabase.tables["insights"].rows) == users - 2
+
+
+@pytest.mark.parametrize("option", ["--rpm", "--concurrency", "--chunk-size", "--page-size", "--days"])
+def test_sizes_and_rates_must_be_positive(option, capsys):
+    with pytest.raises(SystemExit) as exited:
+        main([option, "0"])
+    assert exited.value.code == 2
+    assert "must be greater than 0" in capsys.readouterr().err
+
+
+async def test_zero_concurrency_is_rejected_instead_of_hanging(supabase):
+    with pytest.raises(ValueError):
+        await run_batch(get_repositories(), concurrency=0)
@@ -0,0 +1,42 @@
+"""Job queue: a worker starting up never takes jobs another worker is running."""
+import asyncio
+
+from app.jobs.queue import RUNNING, SUCCEEDED, JobRunner, SQLiteJobStore
+
+
+async def test_live_lease_is_not_requeued(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    first, second = SQLiteJobStore(path, lease_seconds=0.2), SQLiteJobStore(path, lease_seconds=0.2)
+    job, _ = await first.create_or_get("k", "owner", {})
+    assert (await first.claim(job.id)).status == RUNNING
+
+    # A second worker starting now leaves the running job alone
+    assert await second.pending() == []
+    assert (await second.get(job.id)).status == RUNNING
+
+    # Once the lease lapses (its worker died), the job goes back to the queue
+    await asyncio.sleep(0.25)
+    assert await second.pending() == [job.id]
+    assert await first.renew(job.id) is False
+
+
+async def test_runner_renews_its_lease(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    store, other = SQLiteJobStore(path, lease_seconds=0.3), SQLiteJobStore(path, lease_seconds=0.3)
+    calls = 0
+
+    async def handler(payload):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.8)  # well past one lease
+        return {"ok": True}
+
+    runner = JobRunner(store, handler, fallback=lambda p: None, workers=1, deadline=5)
+    await runner.start()
+    job = await runner.submit("k", "owner", {})
+    await asyncio.sleep(0.5)
+    assert await other.pending() == []  # the heartbeat kept the lease alive
+    while (await runner.get(job.id)).status != SUCCEEDED:
+        await asyncio.sleep(0.05)
+    await runner.stop()
+    assert calls == 1
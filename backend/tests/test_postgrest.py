@@ -0,0 +1,45 @@
+"""The async PostgREST layer: concurrent requests overlap instead of queueing."""
+import asyncio
+import time
+
+import httpx
+
+from app.services import singleflight
+from app.services.postgrest import PostgrestClient
+from app.services.registry import get_registry
+from tests.conftest import LATENCY_MS, overlapping
+
+
+async def test_concurrent_selects_overlap(supabase, dataset):
+    db = PostgrestClient(get_registry().http())
+    users = dataset.user_ids()
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(
+            db.select("daily_tracking", filters=[("user_id", f"eq.{user}")], limit=limit)
+            for user in users
+            for limit in (5, 10)
+        )
+    )
+    elapsed = time.perf_counter() - started
+
+    assert [len(rows) for rows in results] == [5, 10] * len(users)
+    assert len(supabase.calls) == 2 * len(users)
+    # Every request was in flight at the same time: the total is about one
+    # round-trip, not eight of them back to back
+    assert overlapping(supabase.calls)
+    assert elapsed < 3 * LATENCY_MS / 1000
+
+
+async def test_concurrent_route_requests_overlap(supabase):
+    from app.main import app
+
+    # Identical pings would share one select; here each must reach the stand-in
+    singleflight._groups["supabase_select"] = singleflight.SingleFlight("supabase_select", enabled=False)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://api.test") as client:
+        responses = await asyncio.gather(*(client.get("/api/v1/ping-db") for _ in range(6)))
+
+    assert [r.status_code for r in responses] == [200] * 6
+    assert supabase.count("GET", "/rest/v1/profiles") == 6
+    assert overlapping(supabase.calls)
@@ -0,0 +1,90 @@
+"""Request profiling: headers for admins, stored files, tasks the request starts."""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.core import profiling
+from app.core.profiling import Profile, ProfilingMiddleware, install_task_factory
+from app.main import app
+from tests.conftest import bearer
+
+TOKEN = "profile-me"
+
+
+@pytest.fixture
+def profiled(tmp_path):
+    """The app behind a ``ProfilingMiddleware`` keeping the newest 2 profiles."""
+    middleware = ProfilingMiddleware(app, admin_token=TOKEN, interval_ms=1, directory=str(tmp_path), max_profiles=2)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=middleware), base_url="http://api.test")
+
+
+async def test_header_selected_request_is_profiled_and_old_files_pruned(profiled, supabase, dataset, tmp_path):
+    user = dataset.user_ids()[0]
+    ids = []
+    async with profiled as client:
+        for _ in range(3):
+            resp = await client.get("/api/v1/analytics", headers={"X-Profile": TOKEN, **bearer(user)})
+            assert resp.status_code == 200
+            ids.append(resp.headers["x-profile-id"])
+            phases = {part.split(";")[0] for part in resp.headers["server-timing"].split(", ")}
+            assert {"auth", "db", "compute", "total"} <= phases
+
+    # Only the newest two profiles are kept, each as a .json and a .folded file
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+        f"{i}{ext}" for i in sorted(ids)[1:] for ext in (".folded", ".json")
+    )
+    summary = json.loads((tmp_path / f"{ids[-1]}.json").read_text())
+    assert (summary["route"], summary["status"], summary["reason"]) == ("/api/v1/analytics", 200, "header")
+    assert summary["phases"]["db"]["calls"] >= 1
+
+
+async def test_requests_without_the_token_are_not_profiled(profiled, supabase, tmp_path):
+    async with profiled as client:
+        plain = await client.get("/health")
+        wrong = await client.get("/health", headers={"X-Profile": "guess"})
+
+    for resp in (plain, wrong):
+        assert resp.status_code == 200
+        assert "server-timing" not in resp.headers
+        assert "x-profile-id" not in resp.headers
+    assert list(tmp_path.iterdir()) == []
+
+
+async def test_task_factory_adds_tasks_started_by_a_profiled_request():
+    loop = asyncio.get_running_loop()
+    previous = loop.get_task_factory()
+    install_task_factory(loop)
+    install_task_factory(loop)  # once is enough; twice does not wrap it again
+    factory = loop.get_task_factory()
+    try:
+        assert factory.profiling
+        profile = Profile("GET", "/test", "header")
+        token = profiling._profile.set(profile)
+        try:
+            inside = asyncio.create_task(asyncio.sleep(0))
+        finally:
+            profiling._profile.reset(token)
+        outside = asyncio.create_task(asyncio.sleep(0))
+        await asyncio.gather(inside, outside)
+
+        assert profile.tasks == [inside]
+    finally:
+        loop.set_task_factory(previous)
+
+
+@pytest.mark.parametrize("enabled", [True, False])
+async def test_startup_installs_the_task_factory_only_when_profiling_is_on(enabled, monkeypatch):
+    from app import main
+
+    monkeypatch.setattr(main.settings, "PROFILING_ENABLED", enabled)
+    loop = asyncio.get_running_loop()
+    previous = loop.get_task_factory()
+    try:
+        async with main.lifespan(app):
+            installed = getattr(loop.get_task_factory(), "profiling", False)
+    finally:
+        loop.set_task_factory(previous)
+
+    assert installed is enabled
@@ -0,0 +1,105 @@
+"""Rate limits: bucket arithmetic, admission, backends and the 429 response."""
+import sqlite3
+
+import pytest
+
+from app.core.config import get_settings
+from app.services import ratelimit
+from app.services.ratelimit import (
+    MemoryBuckets,
+    Rate,
+    RateLimitedError,
+    RateLimiter,
+    RouteLimit,
+    SQLiteBuckets,
+    take,
+)
+from tests.conftest import bearer
+
+
+def test_take_refills_up_to_capacity_then_spends():
+    rate = Rate(capacity=10, period=10)  # one token per second
+    assert take(0, updated_at=0, rate=rate, cost=3, now=5) == (2, 0.0)
+    assert take(0, updated_at=0, rate=rate, cost=3, now=100) == (7, 0.0)  # capped at 10
+
+
+def test_take_reports_the_wait_and_keeps_the_tokens():
+    rate = Rate(capacity=10, period=10)
+    assert take(1, updated_at=0, rate=rate, cost=4, now=0) == (1, 3.0)
+
+
+@pytest.mark.parametrize(("days", "cost"), [(0, 1), (30, 1), (31, 2), (365, 13)])
+def test_cost_grows_with_the_date_range(days, cost):
+    assert RouteLimit(Rate(60, 3600), Rate(3000, 60), days_per_token=30).cost(days) == cost
+
+
+def test_rate_parse_rejects_bad_text():
+    assert Rate.parse("20/3600") == Rate(20, 3600)
+    for text in ("20", "0/60", "a/b"):
+        with pytest.raises(ValueError):
+            Rate.parse(text)
+
+
+def _limiter(buckets, user="3/3600", everyone="100/3600") -> RateLimiter:
+    return RateLimiter(buckets, {"export": RouteLimit(Rate.parse(user), Rate.parse(everyone), 30)})
+
+
+async def test_a_range_larger_than_the_bucket_takes_the_whole_bucket():
+    limiter = _limiter(MemoryBuckets())
+    await limiter.admit("export", "u1", days=3650)  # costs 122, takes all 3
+    with pytest.raises(RateLimitedError) as rejected:
+        await limiter.admit("export", "u1", days=1)
+    assert rejected.value.scope == "user"
+
+
+async def test_global_rejection_refunds_the_user_bucket():
+    buckets = MemoryBuckets()
+    limiter = _limiter(buckets, user="5/3600", everyone="1/3600")
+    await limiter.admit("export", "u1")
+    with pytest.raises(RateLimitedError) as rejected:
+        await limiter.admit("export", "u2")
+    assert rejected.value.scope == "global"
+    tokens, _, _ = buckets._buckets["export:user:u2"]
+    assert tokens == pytest.approx(5)
+
+
+async def test_sqlite_buckets_are_shared_between_connections(tmp_path):
+    path = str(tmp_path / "buckets.sqlite3")
+    first, second = SQLiteBuckets(path), SQLiteBuckets(path)
+    try:
+        a, b = _limiter(first, user="2/3600"), _limiter(second, user="2/3600")
+        await a.admit("export", "u1")
+        await b.admit("export", "u1")
+        with pytest.raises(RateLimitedError):
+            await a.admit("export", "u1")
+    finally:
+        await first.close()
+        await second.close()
+
+
+async def test_a_failing_backend_admits_requests(caplog):
+    class Broken:
+        async def take(self, *args):
+            raise sqlite3.OperationalError("database is locked")
+
+    limiter = _limiter(Broken())
+    for _ in range(5):
+        await limiter.admit("export", "u1")
+    assert caplog.text.count("Rate limit backend unavailable") == 1
+
+
+async def test_exhausted_user_gets_429_with_retry_after(supabase, dataset, api, monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(settings, "RATE_LIMIT_EXPORT_USER", "2/3600")
+    user, other = dataset.user_ids()[:2]
+
+    statuses = [(await api.get("/api/v1/export/csv", headers=bearer(user))).status_code for _ in range(2)]
+    assert statuses == [200, 200]
+    resp = await api.get("/api/v1/export/csv", headers=bearer(user))
+    assert resp.status_code == 429
+    # 1800 s per token, rounded up to whole seconds (never early)
+    assert resp.headers["retry-after"] == "1800"
+    # Another user still has a full bucket
+    assert (await api.get("/api/v1/export/csv", headers=bearer(other))).status_code == 200
+    assert isinstance(ratelimit.get_rate_limiter().buckets, MemoryBuckets)
@@ -0,0 +1,39 @@
+"""Client registry: background warm-up."""
+import asyncio
+
+from app.core.config import get_settings
+from app.services.registry import ClientRegistry
+
+
+def _registry() -> ClientRegistry:
+    # No Supabase URL: warm-up only builds the OpenAI client (no network)
+    settings = get_settings().model_copy(update={"CLIENT_WARMUP_ENABLED": True, "SUPABASE_URL": None})
+    return ClientRegistry(settings)
+
+
+async def test_warmup_and_requests_share_one_openai_client():
+    registry = _registry()
+    # A request asks for the client while warm-up is building it
+    warmup = asyncio.create_task(registry.warm_up())
+    await asyncio.sleep(0)
+    early = registry.openai()
+    await warmup
+
+    assert early is not None and registry.openai() is early
+    await registry.aclose()
+
+
+async def test_warmup_failure_is_logged(monkeypatch, caplog):
+    registry = _registry()
+
+    async def broken() -> None:
+        raise RuntimeError("no route to host")
+
+    monkeypatch.setattr(registry, "warm_up", broken)
+    registry.start_warmup()
+    await asyncio.gather(registry._warmup, return_exceptions=True)
+    await asyncio.sleep(0)  # done callbacks run on the next loop iteration
+
+    assert "Client warm-up failed" in caplog.text
+    assert "no route to host" in caplog.text
+    await registry.aclose()
@@ -0,0 +1,118 @@
+"""Breakers, bulkheads and deadlines around Supabase and the model."""
+import asyncio
+
+import httpx
+import pytest
+
+from app.core.config import get_settings
+from app.core.deadlines import DeadlineMiddleware
+from app.main import app
+from app.services.postgrest import PostgrestError
+from app.services.repository import get_repositories
+from app.services.resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    Upstream,
+    UpstreamUnavailableError,
+    get_upstream,
+)
+from app.services.singleflight import get_flight_group
+from tests.conftest import bearer
+
+
+async def test_breaker_opens_after_failures_and_half_opens_later(supabase, monkeypatch):
+    monkeypatch.setattr(get_settings(), "BREAKER_FAILURE_THRESHOLD", 3)
+    monkeypatch.setattr(get_settings(), "BREAKER_RESET_SECONDS", 0.2)
+    repos = get_repositories()
+    breaker = get_upstream("supabase").breaker
+
+    # 1) Three 503s in a row open the breaker
+    supabase.fake.fail_with = 503
+    for _ in range(3):
+        with pytest.raises(PostgrestError):
+            await repos.profiles.sample(limit=1)
+    assert breaker.state == OPEN
+    sent = supabase.count("GET", "/rest/v1/profiles")
+
+    # 2) While open, calls fail fast without reaching Supabase
+    with pytest.raises(PostgrestError) as refused:
+        await repos.profiles.sample(limit=1)
+    assert refused.value.status_code == 503
+    assert supabase.count("GET", "/rest/v1/profiles") == sent
+
+    # 3) After the reset time one trial goes out and a success closes it again
+    await asyncio.sleep(0.25)
+    assert breaker.state == HALF_OPEN
+    supabase.fake.fail_with = None
+    await repos.profiles.sample(limit=1)
+    assert breaker.state == CLOSED
+    assert supabase.count("GET", "/rest/v1/profiles") == sent + 1
+
+
+async def test_failed_trial_opens_the_breaker_again():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=0.05)
+    breaker.record_failure()
+    await asyncio.sleep(0.06)
+
+    assert breaker.allow()
+    assert not breaker.allow()  # one trial at a time
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+
+async def test_full_bulkhead_rejects():
+    upstream = Upstream("test", 1, CircuitBreaker("test", 5, 30.0))
+    holding = asyncio.Event()
+    release = asyncio.Event()
+
+    async def hold_the_slot():
+        async with upstream.call(5.0):
+            holding.set()
+            await release.wait()
+
+    holder = asyncio.create_task(hold_the_slot())
+    await holding.wait()
+    with pytest.raises(UpstreamUnavailableError) as rejected:
+        async with upstream.call(0.05):
+            pass
+    release.set()
+    await holder
+
+    assert rejected.value.reason == "bulkhead_full"
+    assert rejected.value.status_code == 503
+    assert upstream.rejected == {"bulkhead_full": 1}
+    # Waiting for a slot says nothing about the upstream's health
+    assert upstream.breaker.state == CLOSED
+
+
+async def test_deadline_middleware_answers_504_for_a_stalled_database(supabase):
+    supabase.fake.latency.base = 0.5
+    # The tighter outer deadline wins over the app's own
+    tight = DeadlineMiddleware(app, seconds=0.1)
+    transport = httpx.ASGITransport(app=tight)
+    async with httpx.AsyncClient(transport=transport, base_url="http://api.test") as client:
+        resp = await client.get("/api/v1/ping-db")
+
+    assert resp.status_code == 504
+    # The request stopped waiting; the shared select finishes on its own
+    while get_flight_group("supabase_select").in_flight():
+        await asyncio.sleep(0.05)
+
+
+async def test_insights_fall_back_when_the_model_is_unavailable(api, supabase, openai, dataset, monkeypatch):
+    monkeypatch.setattr(get_settings(), "BREAKER_FAILURE_THRESHOLD", 1)
+    get_upstream("openai").breaker.record_failure()
+
+    user = dataset.user_ids()[0]
+    resp = await api.post("/api/v1/insights/generate", headers=bearer(user))
+
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["fallback"] is True
+    assert body["summary"] is not None
+    assert openai.calls == []
+    assert get_upstream("openai").rejected == {"circuit_open": 1}
+    # A fallback is never stored
+    assert supabase.tables["insights"].rows == []
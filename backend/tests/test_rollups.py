@@ -0,0 +1,81 @@
+"""Rollups: paged bucket reads, the settle lag, and what only a full rebuild fixes."""
+from datetime import UTC, date, datetime, timedelta
+
+from app.schemas.tracking import TrackingIn
+from app.services.repository import get_repositories
+from app.services.rollups import RollupService, summarize
+
+PAGE = 5
+
+
+async def test_buckets_are_read_past_the_max_rows_cap(supabase, dataset):
+    supabase.fake.max_rows = PAGE
+    rollups = RollupService(get_repositories(), page_size=PAGE)
+    user = dataset.user_ids()[0]
+
+    await rollups.refresh(user)
+    assert len(supabase.tables["tracking_rollups"].rows) > PAGE  # 60 days, ~9 weeks
+    assert summarize(await rollups.window(user, 90), 90) == summarize(await rollups.window_from_raw(user, 90), 90)
+
+
+async def test_deleted_rows_drop_out_on_the_next_full_rebuild(supabase, dataset):
+    repos = get_repositories()
+    user = dataset.user_ids()[1]
+    await RollupService(repos).refresh(user)
+    before = await RollupService(repos).window(user, 90)
+
+    tracking = supabase.tables["daily_tracking"]
+    for row in list(tracking.by_user[user])[-10:]:
+        tracking.remove(row)
+
+    # 1) Incremental refresh: nothing was written, so the deletes are missed
+    assert await RollupService(repos, rebuild_seconds=3600).refresh(user) == 0
+    assert await RollupService(repos).window(user, 90) == before
+
+    # 2) Once the last rebuild is old enough, buckets are re-derived
+    rollups = RollupService(repos, rebuild_seconds=0)
+    await rollups.refresh(user)
+    after = await rollups.window(user, 90)
+    assert after.entries == before.entries - 10
+    assert summarize(after, 90) == summarize(await rollups.window_from_raw(user, 90), 90)
+
+
+def entry(user: str, created_at: str, key: str | None = None) -> dict:
+    return dict(TrackingIn(created_at=created_at, weight_lbs=170, idempotency_key=key).to_row(user))
+
+
+async def test_late_commits_behind_the_watermark_are_not_skipped(supabase, dataset):
+    repos = get_repositories()
+    user = dataset.user_ids()[2]
+    rollups = RollupService(repos, settle_seconds=60)
+    await rollups.refresh(user)
+
+    # 1) A row written just now is folded in, but the watermark stays behind it
+    await repos.tracking.upsert_many([entry(user, "2031-01-01T08:00:00Z")])
+    assert await rollups.refresh(user) == 1
+
+    # 2) A transaction that started 30s ago commits its row only now
+    started = datetime.now(UTC) - timedelta(seconds=30)
+    late = {**entry(user, "2031-01-02T08:00:00Z"), "updated_at": started.strftime("%Y-%m-%dT%H:%M:%S+00:00")}
+    supabase.tables["daily_tracking"].add(late)
+
+    assert await rollups.refresh(user) == 2  # the recent row again, and the late one
+    assert (await rollups.window(user, 2, today=date(2031, 1, 2))).entries == 2
+
+
+async def test_moved_created_at_leaves_the_old_day_until_the_next_rebuild(supabase, dataset):
+    repos = get_repositories()
+    user = dataset.user_ids()[3]
+    rollups = RollupService(repos, rebuild_seconds=3600, settle_seconds=60)
+    await repos.tracking.upsert_many([entry(user, "2031-01-01T08:00:00Z", key="moved")])
+    await rollups.refresh(user)
+
+    # Same row (same idempotency key), now dated a day later
+    await repos.tracking.upsert_many([entry(user, "2031-01-02T08:00:00Z", key="moved")])
+    assert await rollups.refresh(user) == 1
+    assert (await rollups.window(user, 1, today=date(2031, 1, 1))).entries == 1  # stale
+    assert (await rollups.window(user, 1, today=date(2031, 1, 2))).entries == 1
+
+    await RollupService(repos, rebuild_seconds=0).refresh(user)
+    assert (await rollups.window(user, 1, today=date(2031, 1, 1))).entries == 0
+    assert (await rollups.window(user, 1, today=date(2031, 1, 2))).entries == 1
@@ -0,0 +1,35 @@
+"""Dose schedules: per-user reads, and a reminder worker that keeps its index."""
+import io
+import json
+from datetime import UTC, datetime, timedelta
+
+from app.jobs.dose_reminders import watch
+from app.services import schedules
+from app.services.repository import get_repositories
+from app.services.schedules import ScheduleService
+
+
+async def test_due_for_user_reads_only_that_users_rules(supabase, dataset):
+    user = dataset.user_ids()[0]
+    start = datetime.now(UTC)
+    doses = await ScheduleService(get_repositories()).due_for_user(user, start, start + timedelta(days=7))
+
+    assert doses and {d["user_id"] for d in doses} == {user}
+    assert len([d for d in doses if d["title"] == "Dose 0"]) == 7  # the daily rule
+    assert schedules._loaded is None  # no index of everyone's schedules
+
+
+async def test_watch_reads_only_new_schedules_after_the_first_window(supabase, dataset):
+    repos = get_repositories()
+    out = io.StringIO()
+    # Windows in the past run back to back; 24 hours covers every daily rule once
+    start = datetime.now(UTC).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=2)
+    reports = await watch(repos, start, 12 * 60, page_size=1000, out=out, windows=2)
+
+    assert [r["schedules"] for r in reports] == [8, 8]
+    # One full read, then one read of rows written since (none)
+    assert supabase.count("GET", "/rest/v1/dose_schedules") == 2
+    doses = [json.loads(line) for line in out.getvalue().splitlines()]
+    daily = [d for d in doses if d["title"] == "Dose 0"]
+    assert len(daily) == len(dataset.user_ids())  # 08:00 falls in the first window only
+    assert len({(d["schedule_id"], d["due_at"]) for d in doses}) == len(doses)
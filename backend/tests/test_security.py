@@ -0,0 +1,103 @@
+"""In-process token verification: HS256, JWKS, the remote fallback and the cache."""
+import asyncio
+import json
+import time
+import uuid
+
+import httpx
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from app.core import security
+from app.core.config import get_settings
+from app.core.security import TokenVerificationError, verify_access_token
+from tests.conftest import JWT_SECRET
+
+USER = str(uuid.uuid4())
+
+
+def _token(key=JWT_SECRET, algorithm="HS256", expires_in=3600, headers=None, **claims) -> str:
+    now = int(time.time())
+    payload = {"sub": USER, "aud": "authenticated", "iat": now, "exp": now + expires_in, **claims}
+    return jwt.encode(payload, key, algorithm=algorithm, headers=headers)
+
+
+async def test_hs256_token_is_accepted():
+    assert await verify_access_token(_token()) == USER
+
+
+@pytest.mark.parametrize(
+    "token",
+    [
+        _token(key="another-secret-with-enough-bytes-for-hs256"),  # bad signature
+        _token(expires_in=-120),  # expired beyond the clock skew
+        _token(aud="someone-else"),
+        "not.a.jwt",
+    ],
+    ids=["bad-signature", "expired", "wrong-audience", "malformed"],
+)
+async def test_untrusted_tokens_are_rejected(token):
+    with pytest.raises(TokenVerificationError):
+        await verify_access_token(token)
+
+
+async def test_cached_token_is_rejected_once_it_expires(monkeypatch):
+    monkeypatch.setattr(security, "CLOCK_SKEW_SECONDS", 0)
+    token = _token(expires_in=1)
+    assert await verify_access_token(token) == USER
+    assert await verify_access_token(token) == USER  # served from the cache
+
+    await asyncio.sleep(1.2)
+    with pytest.raises(TokenVerificationError):
+        await verify_access_token(token)
+
+
+@pytest.fixture
+def jwks(monkeypatch):
+    """Serve a one-key JWKS from a stand-in; returns (private key, fetch counter)."""
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    public = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private.public_key()))
+    fetches = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        fetches.append(request.url)
+        return httpx.Response(200, json={"keys": [{**public, "kid": "k1", "alg": "RS256"}]})
+
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(
+        security.httpx, "AsyncClient", lambda **kw: real_client(transport=httpx.MockTransport(handler), **kw)
+    )
+    monkeypatch.setattr(get_settings(), "JWT_JWKS_URL", "http://auth.test/jwks.json")
+    monkeypatch.setattr(security, "_jwks", security._JWKSCache())
+    return private, fetches
+
+
+async def test_jwks_token_is_accepted_with_one_fetch(jwks):
+    private, fetches = jwks
+    assert await verify_access_token(_token(private, "RS256", headers={"kid": "k1"})) == USER
+    assert await verify_access_token(_token(private, "RS256", headers={"kid": "k1"}, jti="2")) == USER
+    assert len(fetches) == 1
+
+
+async def test_unknown_key_ids_are_refetched_at_most_every_few_seconds(jwks, monkeypatch):
+    private, fetches = jwks
+    await verify_access_token(_token(private, "RS256", headers={"kid": "k1"}))
+    monkeypatch.setattr(security, "JWKS_MIN_REFETCH_SECONDS", 0)
+    with pytest.raises(TokenVerificationError):
+        await verify_access_token(_token(private, "RS256", headers={"kid": "rotated"}))
+    assert len(fetches) == 2  # an unknown kid triggers one refetch
+
+    monkeypatch.setattr(security, "JWKS_MIN_REFETCH_SECONDS", 60)
+    for n in range(3):
+        with pytest.raises(TokenVerificationError):
+            await verify_access_token(_token(private, "RS256", headers={"kid": f"bogus-{n}"}))
+    assert len(fetches) == 2  # throttled
+
+
+async def test_without_a_secret_supabase_auth_is_asked_once(supabase, monkeypatch):
+    monkeypatch.setattr(get_settings(), "JWT_SECRET_KEY", None)
+    token = _token(key="any-secret-supabase-would-check-with-enough-bytes")
+    assert await verify_access_token(token) == USER
+    assert await verify_access_token(token) == USER
+    assert supabase.count("GET", "/auth/v1/user") == 1
@@ -0,0 +1,119 @@
+"""Single-flight: bursts of identical calls reach the upstream once, in their own context."""
+import asyncio
+import contextvars
+
+from app.core import profiling
+from app.core.deadlines import DeadlineExceededError, call_timeout, deadline_scope
+from app.services.insights import build_insight
+from app.services.postgrest import PostgrestClient
+from app.services.registry import get_registry
+from app.services.repository import get_repositories
+from app.services.singleflight import SingleFlight, get_flight_group
+
+BURST = 8
+
+
+async def test_identical_selects_share_one_request(supabase, dataset):
+    db = PostgrestClient(get_registry().http())
+    user = dataset.user_ids()[0]
+    results = await asyncio.gather(
+        *(db.select("daily_tracking", filters=[("user_id", f"eq.{user}")], limit=5) for _ in range(BURST))
+    )
+
+    assert supabase.count("GET", "/rest/v1/daily_tracking") == 1
+    stats = get_flight_group("supabase_select").stats
+    assert (stats.leaders, stats.followers) == (1, BURST - 1)
+    assert all(rows == results[0] for rows in results)
+    # Each caller decoded its own copy
+    results[0][0]["energy"] = -1
+    assert results[1][0]["energy"] != -1
+
+
+async def test_identical_insight_burst_calls_model_and_stores_once(supabase, openai, dataset):
+    repos = get_repositories()
+    user = dataset.user_ids()[1]
+    results = await asyncio.gather(*(build_insight(repos, user, 7) for _ in range(BURST)))
+
+    assert len(openai.calls) == 1
+    assert supabase.count("POST", "/rest/v1/insights") == 1
+    assert len([r for r in supabase.tables["insights"].rows if r["user_id"] == user]) == 1
+    stats = get_flight_group("insights").stats
+    assert (stats.leaders, stats.followers) == (1, BURST - 1)
+    assert all(r["tips"] == results[0]["tips"] and not r["cached"] for r in results)
+
+
+async def test_read_after_write_does_not_join_an_older_read(supabase, dataset):
+    db = PostgrestClient(get_registry().http())
+    user = dataset.user_ids()[2]
+    filters = [("user_id", f"eq.{user}")]
+
+    # 1) A slow read is in flight...
+    supabase.latency.base = 0.3
+    older = asyncio.create_task(db.select("insights", filters=filters))
+    await asyncio.sleep(0.05)
+    supabase.latency.base = 0.0
+    # 2) ...a write to the same table completes...
+    await db.insert("insights", {"user_id": user, "summary": {}, "tips": ["new"]})
+    # 3) ...and the next identical read runs on its own and sees the write
+    newer = await db.select("insights", filters=filters)
+    await older
+
+    assert [r["tips"] for r in newer] == [["new"]]
+    assert supabase.count("GET", "/rest/v1/insights") == 2
+    stats = get_flight_group("supabase_select").stats
+    assert (stats.leaders, stats.followers) == (2, 0)
+
+
+def in_context(coro, **values):
+    """Run ``coro`` as a task whose context has ``values`` set (var -> value)."""
+    context = contextvars.copy_context()
+    for var, value in values.values():
+        context.run(var.set, value)
+    return asyncio.create_task(coro, context=context)
+
+
+async def test_shared_work_has_its_own_deadline_and_no_profile():
+    group = SingleFlight("test", deadline=30.0)
+    seen = {}
+
+    async def work():
+        await asyncio.sleep(0.1)
+        seen["profile"] = profiling._profile.get()
+        return call_timeout(10.0)  # raises once a deadline has passed
+
+    async def leader():
+        with deadline_scope(0.05):
+            return await group.do("key", work)
+
+    profile = profiling.Profile("GET", "/leader", "header")
+    led, followed = await asyncio.gather(
+        in_context(leader(), profile=(profiling._profile, profile)),
+        in_context(group.do("key", work)),
+        return_exceptions=True,
+    )
+
+    # The leader stopped waiting at its own deadline; the work went on with
+    # a deadline of its own for the follower
+    assert isinstance(led, DeadlineExceededError)
+    assert followed == 10.0
+    assert seen["profile"] is None
+    assert (group.stats.leaders, group.stats.followers) == (1, 1)
+
+
+async def test_every_profiled_caller_gets_the_shared_phase_times():
+    group = SingleFlight("test")
+
+    async def work():
+        with profiling.timed("db"):
+            await asyncio.sleep(0.05)
+        return "done"
+
+    leader_timings, follower_timings = {}, {}
+    await asyncio.gather(
+        in_context(group.do("key", work), timing=(profiling._timing, (leader_timings, None))),
+        in_context(group.do("key", work), timing=(profiling._timing, (follower_timings, None))),
+    )
+
+    for timings in (leader_timings, follower_timings):
+        assert timings["db"][1] == 1
+        assert timings["db"][0] >= 0.04
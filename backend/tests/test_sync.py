@@ -0,0 +1,116 @@
+"""Delta sync: cursors, ETags and 304s."""
+import base64
+import json
+
+import pytest
+
+from app.services.sync import SyncCursorError, decode_cursor, encode_cursor
+from tests.conftest import bearer, table_rows
+
+URL = "/api/v1/sync"
+
+
+def forged(payload: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    positions = {
+        "tracking": ("2030-01-02T03:04:05+00:00", "6f1c2b1e-8f3a-4a57-9a0e-6a8d4f1f2b3c"),
+        "insights": None,  # nothing delivered yet
+    }
+
+    cursor = encode_cursor(positions)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == {"tracking": positions["tracking"]}
+    assert decode_cursor(None) == decode_cursor("") == {}
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not a cursor!",
+        forged({"v": 1, "p": {"tracking": ["2030-01-01T00:00:00", "1,user_id.neq.x"]}}),
+        forged({"v": 1, "p": {"tracking": ["2030-01-01)", "6f1c2b1e-8f3a-4a57-9a0e-6a8d4f1f2b3c"]}}),
+        forged({"v": 1, "p": {"tracking": ["2030-01-01T00:00:00"]}}),
+        forged({"v": 1}),
+        forged({"v": 0, "p": {}}),
+    ],
+    ids=["garbage", "bad-id", "bad-timestamp", "short-position", "no-positions", "old-version"],
+)
+def test_tampered_cursor_is_rejected(cursor):
+    with pytest.raises(SyncCursorError):
+        decode_cursor(cursor)
+
+
+async def test_tampered_cursor_answers_400(api, supabase, dataset):
+    cursor = encode_cursor({"tracking": ("2030-01-01T00:00:00+00:00", "6f1c2b1e-8f3a-4a57-9a0e-6a8d4f1f2b3c")})
+    tampered = cursor[:-4] + ("AAAA" if not cursor.endswith("AAAA") else "BBBB")
+
+    resp = await api.get(URL, params={"cursor": tampered}, headers=bearer(dataset.user_ids()[0]))
+
+    assert resp.status_code == 400
+    assert supabase.calls == []
+
+
+async def test_paging_with_the_cursor_delivers_every_row_once(api, supabase, dataset):
+    user = dataset.user_ids()[0]
+    cursor, seen, pages = None, [], 0
+    while True:
+        params = {"limit": 25, **({"cursor": cursor} if cursor else {})}
+        resp = await api.get(URL, params=params, headers=bearer(user))
+        assert resp.status_code == 200
+        body = resp.json()
+        seen.extend(row["id"] for row in body["changes"]["tracking"])
+        cursor, pages = body["cursor"], pages + 1
+        if not body["has_more"]:
+            break
+
+    expected = {row["id"] for row in table_rows(supabase, "daily_tracking") if row["user_id"] == user}
+    assert sorted(seen) == sorted(expected)
+    assert pages > 1
+    # Caught up: the next sync is empty
+    resp = await api.get(URL, params={"cursor": cursor}, headers=bearer(user))
+    assert resp.json()["changes"]["tracking"] == []
+
+
+async def test_etag_is_stable_and_if_none_match_answers_304(api, supabase, dataset):
+    user = dataset.user_ids()[0]
+    first = await api.get(URL, headers=bearer(user))
+    again = await api.get(URL, headers=bearer(user))
+    etag = first.headers["etag"]
+
+    assert again.headers["etag"] == etag
+    # A compressed answer carries the weak form of the same tag
+    strong = etag.removeprefix("W/")
+    for tag in (strong, f"W/{strong}", f'"other", {strong}'):
+        resp = await api.get(URL, headers={"If-None-Match": tag, **bearer(user)})
+        assert resp.status_code == 304
+        assert resp.content == b""
+        assert resp.headers["etag"] == strong
+    # Another user's answer differs
+    other = await api.get(URL, headers={"If-None-Match": etag, **bearer(dataset.user_ids()[1])})
+    assert other.status_code == 200
+
+
+async def test_new_row_changes_the_etag_and_is_resent_until_settled(api, supabase, dataset):
+    user = dataset.user_ids()[0]
+    caught_up = (await api.get(URL, headers=bearer(user))).json()["cursor"]
+    before = await api.get(URL, params={"cursor": caught_up}, headers=bearer(user))
+
+    await api.post(
+        "/api/v1/tracking/bulk",
+        json=[{"created_at": "2031-01-01T08:00:00Z", "weight_lbs": 170}],
+        headers=bearer(user),
+    )
+    after = await api.get(
+        URL, params={"cursor": caught_up}, headers={"If-None-Match": before.headers["etag"], **bearer(user)}
+    )
+
+    assert after.status_code == 200
+    assert after.headers["etag"] != before.headers["etag"]
+    [row] = after.json()["changes"]["tracking"]
+    # Written just now, so the cursor does not move past it yet
+    repeat = await api.get(URL, params={"cursor": after.json()["cursor"]}, headers=bearer(user))
+    assert [r["id"] for r in repeat.json()["changes"]["tracking"]] == [row["id"]]